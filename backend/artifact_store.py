@@ -0,0 +1,283 @@
+"""
+Model artifact store
+Checkpoints are written atomically next to a small manifest holding their
+SHA-256, and loaded with torch.load(mmap=True): tensors stay backed by the
+file's page cache, so forked or separately started workers share one copy
+of the weights instead of each reading them into private memory.
+
+Third-party weights (yolov8s.pt) are fetched once into ARTIFACT_DIR and
+verified against their manifest on every start instead of being
+re-downloaded or trusted blindly.
+
+Usage:
+    python artifact_store.py verify weight_model.pth artifacts/yolov8s.pt
+    python artifact_store.py bench weight_model.pth      # cold start + RSS, eager vs mmap
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import torch
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "artifacts")
+# Hash every artifact when it is loaded; 0 = trust the manifest's size only
+ARTIFACT_VERIFY = os.environ.get("ARTIFACT_VERIFY", "1") == "1"
+CHUNK_SIZE = 1024 * 1024
+
+
+class IntegrityError(RuntimeError):
+    """Artifact content does not match its manifest"""
+
+
+def manifest_path(path):
+    return f"{path}.manifest.json"
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    try:
+        with open(manifest_path(path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, source=None):
+    manifest = {
+        "sha256": sha256_file(path),
+        "size": os.path.getsize(path),
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+    if source:
+        manifest["source"] = source
+    tmp_path = manifest_path(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(path))
+    return manifest
+
+
+def verify(path, full=None):
+    """
+    Check an artifact against its manifest.
+
+    A file without a manifest (written before the store existed) is adopted:
+    its current hash is recorded and used from then on.
+
+    Raises:
+        IntegrityError: Size or hash differs from the manifest
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        print(f"[Artifacts] No manifest for {path}, recording its current hash")
+        return write_manifest(path)
+    if os.path.getsize(path) != manifest["size"]:
+        raise IntegrityError(f"{path}: size {os.path.getsize(path)} != manifest {manifest['size']}")
+    if (ARTIFACT_VERIFY if full is None else full) and sha256_file(path) != manifest["sha256"]:
+        raise IntegrityError(f"{path}: SHA-256 does not match its manifest")
+    return manifest
+
+
+def _atomic_write(path, write):
+    """
+    write(tmp_path), then rename over path. Workers that have the old file
+    mapped keep reading the old inode; truncating it in place would make
+    their mapped pages vanish (SIGBUS).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ============================================================================
+# CHECKPOINTS
+# ============================================================================
+
+def save_state_dict(state_dict, path):
+    """Save a state dict in torch's zip format (mmap-able) plus its manifest"""
+    # Detached CPU copies: the file must not depend on the device it was trained on
+    state_dict = {key: value.detach().cpu() for key, value in state_dict.items()}
+    _atomic_write(path, lambda tmp_path: torch.save(state_dict, tmp_path))
+    return write_manifest(path)
+
+
+def load_state_dict(path, verify_hash=None):
+    """
+    Verify and memory-map a checkpoint.
+
+    Returns:
+        dict: Tensors backed by the file's pages (private copy-on-write mapping)
+    """
+    verify(path, full=verify_hash)
+    return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+
+def load_into(build, path, verify_hash=None):
+    """
+    Build a module without allocating its parameters and attach the
+    mmapped checkpoint tensors to it directly (no copy).
+
+    Args:
+        build: Callable returning the (randomly initialised) module
+        path: Checkpoint path
+    """
+    state_dict = load_state_dict(path, verify_hash)
+    with torch.device("meta"):
+        module = build()
+    module.load_state_dict(state_dict, assign=True)
+    leftover = [name for name, tensor in list(module.named_parameters()) + list(module.named_buffers()) if tensor.is_meta]
+    if leftover:
+        raise RuntimeError(f"{path} does not cover {leftover[:3]}")
+    return module
+
+
+# ============================================================================
+# THIRD-PARTY WEIGHTS
+# ============================================================================
+
+def _download_ultralytics(name):
+    from ultralytics.utils.downloads import attempt_download_asset
+    return str(attempt_download_asset(name))
+
+
+def cached_file(name, fetch=None):
+    """
+    Verified local copy of a weights file in ARTIFACT_DIR.
+
+    Args:
+        name: File name, e.g. "yolov8s.pt"
+        fetch: Callable(name) -> path of a fresh copy; defaults to an existing
+               file in the working directory, then the ultralytics download
+
+    Returns:
+        str: Path inside ARTIFACT_DIR
+    """
+    target = os.path.join(ARTIFACT_DIR, name)
+    if os.path.exists(target):
+        try:
+            verify(target)
+            return target
+        except IntegrityError as e:
+            print(f"[Artifacts] {e}; fetching it again")
+
+    if fetch is not None:
+        source = fetch(name)
+    elif os.path.exists(name):
+        source = name
+    else:
+        source = _download_ultralytics(name)
+
+    _atomic_write(target, lambda tmp_path: shutil.copyfile(source, tmp_path))
+    manifest = write_manifest(target, source=os.path.basename(str(source)))
+    print(f"[Artifacts] Cached {name} ({manifest['size'] / 1e6:.1f} MB, sha256 {manifest['sha256'][:12]})")
+    return target
+
+
+# ============================================================================
+# COLD START / MEMORY REPORT
+# ============================================================================
+
+def memory_usage():
+    """RSS and its private (anonymous) part in bytes; file-backed pages are shared between workers"""
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    usage[key] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        usage["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {"rss": usage.get("VmRSS"), "private": usage.get("RssAnon"), "shared_file": usage.get("RssFile")}
+
+
+def _measure(path, mode):
+    """Load the weight model once in this process; run in a fresh interpreter per mode"""
+    from weight_model import WeightEstimator
+
+    before = memory_usage()
+    start = time.perf_counter()
+    if mode == "mmap":
+        model = load_into(lambda: WeightEstimator(pretrained=False), path)
+    else:
+        # What WeightPredictor did before the store: allocate, read, copy
+        model = WeightEstimator(pretrained=False)
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 224, 224), torch.zeros(1, dtype=torch.long))
+    seconds = time.perf_counter() - start
+    after = memory_usage()
+    return {
+        "mode": mode,
+        "load_and_first_inference_ms": round(seconds * 1000, 1),
+        "rss_delta_mb": round((after["rss"] - before["rss"]) / 1e6, 1) if after["rss"] else None,
+        "private_delta_mb": round((after["private"] - before["private"]) / 1e6, 1) if after["private"] else None,
+    }
+
+
+def bench(path):
+    results = []
+    for mode in ("eager", "mmap"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_measure", mode, path],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify model artifacts or measure their cold start")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("verify", help="Hash files against their manifests")
+    check.add_argument("paths", nargs="+")
+    report = sub.add_parser("bench", help="Cold start and RSS: eager load vs mmap")
+    report.add_argument("path")
+    measure = sub.add_parser("_measure")
+    measure.add_argument("mode", choices=["eager", "mmap"])
+    measure.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        failed = False
+        for path in args.paths:
+            try:
+                manifest = verify(path, full=True)
+                print(f"✓ {path} ({manifest['sha256'][:12]})")
+            except (IntegrityError, OSError) as e:
+                failed = True
+                print(f"✗ {e}")
+        sys.exit(1 if failed else 0)
+    elif args.command == "bench":
+        print(json.dumps(bench(args.path), indent=2))
+    else:
+        print(json.dumps(_measure(args.path, args.mode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Embedding backfill job
+Recomputes embeddings that are missing, failed or from another version
+(backbone plus optional projection, see embedding_projection.py), so the
+k-NN fallback always sees a complete and consistent set.
+
+Images are decoded and resized in a process pool, embedded in batches and
+written back with one bulk UPDATE per batch. Progress is committed per
+batch and selection is by id, so the job can be stopped and resumed.
+
+Usage:
+    python backfill_embeddings.py                # everything not at the current version
+    python backfill_embeddings.py --workers 4 --batch-size 64
+    python backfill_embeddings.py --dry-run
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import or_, update
+
+import blob_store
+from database import SessionLocal, ScanResult, init_db
+from embedding_projection import current_version, for_storage_batch
+from feature_extractor import load_for_embedding
+
+
+def needs_backfill(retry_missing=False):
+    """Filter for scans whose embedding is absent or not at the current version"""
+    condition = or_(
+        ScanResult.embedding.is_(None),
+        ScanResult.embedding_version.is_(None),
+        ScanResult.embedding_version != current_version(),
+    )
+    if retry_missing:
+        return condition
+    # Originals that were not found last time are skipped unless asked
+    return condition & or_(ScanResult.embedding_status.is_(None), ScanResult.embedding_status != "missing")
+
+
+def warn_stale(db):
+    """
+    Count stored embeddings the k-NN fallback ignores (another version, or
+    NULL from before versioning) and print a warning when there are any.
+    Run at server start: after an upgrade they silently drop out of k-NN.
+    """
+    stale = (
+        db.query(ScanResult.id)
+        .filter(
+            ScanResult.embedding.isnot(None),
+            or_(ScanResult.embedding_version.is_(None), ScanResult.embedding_version != current_version()),
+        )
+        .count()
+    )
+    if stale:
+        print(f"[Embeddings] WARNING: {stale} stored embeddings are not at version {current_version()} "
+              f"and are ignored by k-NN until `python backfill_embeddings.py` runs")
+    return stale
+
+
+def _load(path):
+    """Worker: decode + resize one image; None when it is gone or unreadable"""
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return load_for_embedding(path)
+    except Exception as e:
+        print(f"[Backfill] Cannot decode {path}: {e}")
+        return None
+
+
+def iter_batches(db, batch_size, retry_missing=False, limit=None):
+    """Yield lists of (scan_id, image_path) in id order (keyset pagination)"""
+    last_id = 0
+    yielded = 0
+    while limit is None or yielded < limit:
+        size = batch_size if limit is None else min(batch_size, limit - yielded)
+        rows = (
+            db.query(ScanResult.id, ScanResult.blob_hash, ScanResult.filename)
+            .filter(needs_backfill(retry_missing), ScanResult.id > last_id)
+            .order_by(ScanResult.id)
+            .limit(size)
+            .all()
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yielded += len(rows)
+        yield [(scan_id, blob_store.original_path(blob_hash, filename)) for scan_id, blob_hash, filename in rows]
+
+
+def backfill(workers=None, batch_size=32, retry_missing=False, limit=None, dry_run=False):
+    """
+    Returns:
+        dict: Counts of updated, missing and total scans and the throughput
+    """
+    db = SessionLocal()
+    pending = db.query(ScanResult.id).filter(needs_backfill(retry_missing)).count()
+    print(f"[Backfill] {pending} scans need an embedding at version {current_version()}")
+    if dry_run or pending == 0:
+        db.close()
+        return {"pending": pending, "updated": 0, "missing": 0}
+
+    from feature_extractor import FeatureExtractor
+    extractor = FeatureExtractor()
+
+    updated = missing = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch in iter_batches(db, batch_size, retry_missing, limit):
+                ids = [scan_id for scan_id, _ in batch]
+                arrays = list(pool.map(_load, [path for _, path in batch]))
+
+                found = [(scan_id, array) for scan_id, array in zip(ids, arrays) if array is not None]
+                embeddings = extractor.get_embeddings_batch([array for _, array in found])
+                embeddings, version = for_storage_batch(embeddings)
+
+                params = [
+                    {
+                        "id": scan_id,
+                        "embedding": json.dumps(embedding),
+                        "embedding_status": "ready",
+                        "embedding_version": version,
+                    }
+                    for (scan_id, _), embedding in zip(found, embeddings)
+                ]
+                found_ids = {scan_id for scan_id, _ in found}
+                lost = [{"id": scan_id, "embedding_status": "missing"} for scan_id in ids if scan_id not in found_ids]
+
+                if params:
+                    db.execute(update(ScanResult), params)
+                if lost:
+                    db.execute(update(ScanResult), lost)
+                db.commit()
+
+                updated += len(params)
+                missing += len(lost)
+                rate = (updated + missing) / (time.perf_counter() - start)
+                print(f"[Backfill] {updated + missing}/{pending} done ({updated} embedded, {missing} missing, {rate:.1f} img/s)")
+    finally:
+        db.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "pending": pending,
+        "updated": updated,
+        "missing": missing,
+        "seconds": round(seconds, 1),
+        "images_per_second": round((updated + missing) / seconds, 1) if seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute missing or outdated scan embeddings")
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per forward pass and per commit")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many scans")
+    parser.add_argument("--retry-missing", action="store_true", help="Retry scans whose original was not found")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the scans to backfill")
+    args = parser.parse_args()
+
+    init_db()
+    report = backfill(args.workers, args.batch_size, args.retry_missing, args.limit, args.dry_run)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Background worker pool for work that does not need to block a response
+Currently: computing image embeddings after /analyze has answered,
+rendering thumbnails of new uploads, evicting old uploads when the
+upload store is over its quota and re-running scans answered at degraded
+quality under overload.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from database import SessionLocal, ScanResult
+
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", "1"))
+
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="waste-bg")
+
+metrics.registry.describe("waste_background_queue_depth", "Background jobs submitted but not finished")
+
+
+def _submit(fn, *args):
+    metrics.registry.add_gauge("waste_background_queue_depth", 1)
+
+    def _run():
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[Background] {fn.__name__} failed: {e}")
+        finally:
+            metrics.registry.add_gauge("waste_background_queue_depth", -1)
+
+    return _executor.submit(_run)
+
+
+# ============================================================================
+# EMBEDDINGS
+# ============================================================================
+
+def _compute_embedding(scan_id, image_path):
+    from model import embedding_model  # the model module is already loaded by main
+    import embedding_projection
+
+    with metrics.stage("embedding_background"), embedding_model() as feature_extractor:
+        embedding = feature_extractor.get_embedding(image_path)
+        embedding, embedding_version = embedding_projection.for_storage(embedding)
+
+    db = SessionLocal()
+    try:
+        scan = db.query(ScanResult).filter(ScanResult.id == scan_id).first()
+        if scan is None:
+            return
+        if embedding:
+            scan.embedding = json.dumps(embedding)
+            scan.embedding_status = "ready"
+            scan.embedding_version = embedding_version
+        else:
+            scan.embedding_status = "failed"
+        db.commit()
+    finally:
+        db.close()
+
+
+def submit_embedding(scan_id, image_path):
+    """Compute and store the embedding of a saved scan in the background"""
+    return _submit(_compute_embedding, scan_id, image_path)
+
+
+# ============================================================================
+# THUMBNAILS
+# ============================================================================
+
+def _render_thumbnails(blob_hash, image_path):
+    import thumbnails
+
+    with metrics.stage("thumbnail_background"):
+        thumbnails.render_all(image_path, blob_hash)
+
+
+def submit_thumbnails(blob_hash, image_path):
+    """Pre-render the history/preview renditions of a new upload"""
+    return _submit(_render_thumbnails, blob_hash, image_path)
+
+
+# ============================================================================
+# UPLOAD QUOTA
+# ============================================================================
+
+def _enforce_upload_quota():
+    import blob_store
+
+    db = SessionLocal()
+    try:
+        blob_store.evict_to_quota(db)
+    finally:
+        db.close()
+
+
+def submit_quota_check():
+    """Evict verified originals in the background when the upload store is over quota"""
+    import blob_store
+
+    if blob_store.over_quota():
+        return _submit(_enforce_upload_quota)
+    return None
+
+
+# ============================================================================
+# QOS RE-RUN
+# ============================================================================
+
+def _rerun_degraded():
+    import qos
+
+    db = SessionLocal()
+    try:
+        # Batch after batch while the router stays idle
+        while qos.rerun_degraded(db) and qos.router.idle():
+            pass
+    finally:
+        db.close()
+        qos.finish_rerun()
+
+
+def submit_qos_rerun():
+    """Re-run scans answered at degraded quality once the load has dropped"""
+    import qos
+
+    if qos.should_rerun():
+        return _submit(_rerun_degraded)
+    return None
+
+
+def shutdown(wait=False):
+    _executor.shutdown(wait=wait)
@@ -0,0 +1,198 @@
+"""
+Content-addressed upload storage
+Uploads are hashed (SHA-256) while they are streamed to disk and stored as
+uploads/ab/cd/<hash>, so identical images are kept once and concurrent
+uploads with the same filename never overwrite each other.
+
+When UPLOAD_QUOTA_MB is set, the least recently used originals are deleted
+once the store exceeds the quota - but only blobs whose scans have all been
+verified (actual weight entered), so nothing awaiting review is lost.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+
+import metrics
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+UPLOAD_QUOTA_MB = float(os.environ.get("UPLOAD_QUOTA_MB", "0"))   # 0 = unlimited
+# Evict down to this fraction of the quota so eviction does not run on every upload
+UPLOAD_QUOTA_LOW_WATERMARK = float(os.environ.get("UPLOAD_QUOTA_LOW_WATERMARK", "0.9"))
+CHUNK_SIZE = 1024 * 1024
+
+metrics.registry.describe("waste_blob_store_bytes", "Bytes used by stored uploads")
+metrics.registry.describe("waste_blob_evictions_total", "Uploaded originals deleted by quota eviction")
+
+_usage_lock = threading.Lock()
+_usage_bytes = None   # computed lazily, then maintained incrementally
+
+
+class StoredBlob:
+    __slots__ = ("sha256", "path", "size", "created")
+
+    def __init__(self, sha256, path, size, created):
+        self.sha256 = sha256
+        self.path = path
+        self.size = size
+        self.created = created   # False when identical content was already stored
+
+
+def blob_path(sha256):
+    return os.path.join(UPLOAD_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def original_path(blob_hash, filename=None):
+    """Stored original of a scan; scans from before content addressing used uploads/<filename>"""
+    if blob_hash:
+        return blob_path(blob_hash)
+    if filename:
+        return os.path.join(UPLOAD_DIR, os.path.basename(filename))
+    return None
+
+
+def touch(path):
+    """Mark a blob as recently used (LRU order is the file mtime)"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def save_stream(fileobj):
+    """
+    Stream an upload to the store, hashing it on the way.
+
+    Args:
+        fileobj: Readable binary file object (e.g. UploadFile.file)
+
+    Returns:
+        StoredBlob
+    """
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            touch(path)
+            metrics.record_cache("blob_dedup", True)
+            return StoredBlob(sha256, path, size, created=False)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)   # atomic: readers never see a partial file
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    metrics.record_cache("blob_dedup", False)
+    _add_usage(size)
+    return StoredBlob(sha256, path, size, created=True)
+
+
+# ============================================================================
+# QUOTA
+# ============================================================================
+
+def _iter_blobs():
+    for root, dirs, files in os.walk(UPLOAD_DIR):
+        if root == UPLOAD_DIR:
+            # Only the shard tree; legacy flat uploads and temp files are not managed here
+            dirs[:] = [d for d in dirs if len(d) == 2]
+            continue
+        for name in files:
+            if len(name) == 64:
+                yield name, os.path.join(root, name)
+
+
+def usage_bytes():
+    global _usage_bytes
+    with _usage_lock:
+        if _usage_bytes is None:
+            _usage_bytes = sum(os.path.getsize(path) for _, path in _iter_blobs())
+            metrics.registry.set_gauge("waste_blob_store_bytes", _usage_bytes)
+        return _usage_bytes
+
+
+def _add_usage(delta):
+    global _usage_bytes
+    with _usage_lock:
+        if _usage_bytes is not None:
+            _usage_bytes += delta
+            metrics.registry.set_gauge("waste_blob_store_bytes", _usage_bytes)
+
+
+def over_quota():
+    return UPLOAD_QUOTA_MB > 0 and usage_bytes() > UPLOAD_QUOTA_MB * 1024 * 1024
+
+
+def evictable_hashes(db):
+    """Blob hashes whose scans are all verified and no longer need the original"""
+    from sqlalchemy import func, case
+    from database import ScanResult
+
+    unverified = func.sum(case(
+        (ScanResult.actual_weight.is_(None), 1),
+        (ScanResult.embedding_status == "pending", 1),
+        else_=0,
+    ))
+    rows = (
+        db.query(ScanResult.blob_hash)
+        .filter(ScanResult.blob_hash.isnot(None))
+        .group_by(ScanResult.blob_hash)
+        .having(unverified == 0)
+        .all()
+    )
+    return {row[0] for row in rows}
+
+
+def evict_to_quota(db):
+    """
+    Delete least recently used, verified originals until usage is below the
+    low watermark. Returns the number of blobs deleted.
+    """
+    if not over_quota():
+        return 0
+
+    target = UPLOAD_QUOTA_MB * 1024 * 1024 * UPLOAD_QUOTA_LOW_WATERMARK
+    evictable = evictable_hashes(db)
+    candidates = []
+    for sha256, path in _iter_blobs():
+        if sha256 in evictable:
+            stat = os.stat(path)
+            candidates.append((stat.st_mtime, stat.st_size, path))
+    candidates.sort()
+
+    evicted = 0
+    for _, size, path in candidates:
+        if usage_bytes() <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        _add_usage(-size)
+        evicted += 1
+
+    if evicted:
+        metrics.registry.inc("waste_blob_evictions_total", evicted)
+        print(f"[BlobStore] Evicted {evicted} originals, {usage_bytes() / 1024 / 1024:.1f} MB in use")
+    if usage_bytes() > target:
+        print("[BlobStore] Still over quota: remaining uploads are not verified yet")
+    return evicted
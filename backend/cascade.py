@@ -0,0 +1,107 @@
+"""
+Cascaded detection policy
+A cheap first pass (YOLOv8n and/or a low imgsz) answers easy photos; the full
+YOLOv8s pass runs only when the cheap detections are ambiguous.
+"""
+
+import os
+import threading
+
+CASCADE_MODE = os.environ.get("CASCADE_MODE", "0") == "1"
+CASCADE_MODEL = os.environ.get("CASCADE_MODEL", "yolov8n.pt")
+CASCADE_IMGSZ = int(os.environ.get("CASCADE_IMGSZ", "320"))
+
+# Escalate when the cheap pass finds at least this many low-confidence bottles...
+CASCADE_MAX_LOW_CONF = int(os.environ.get("CASCADE_MAX_LOW_CONF", "2"))
+# ...or any kept/dropped detection within this margin of the high-confidence cut-off
+CASCADE_BORDERLINE_MARGIN = float(os.environ.get("CASCADE_BORDERLINE_MARGIN", "0.08"))
+# ...or the mean confidence of the kept detections is below this
+CASCADE_MIN_MEAN_CONF = float(os.environ.get("CASCADE_MIN_MEAN_CONF", "0.45"))
+
+
+def escalation_reason(detections, high_conf_thresh):
+    """
+    Decide whether the cheap pass is good enough.
+
+    Args:
+        detections: List of {"name", "conf", ...} from the cheap model (blocked classes removed)
+        high_conf_thresh: Confidence above which a detection is counted
+
+    Returns:
+        str or None: Why the full model must run, or None to accept the cheap result
+    """
+    kept = [d for d in detections if d["conf"] >= high_conf_thresh]
+    if not kept:
+        return "empty"
+
+    low_conf_bottles = sum(1 for d in detections if d["conf"] < high_conf_thresh and d["name"] == "bottle")
+    if low_conf_bottles >= CASCADE_MAX_LOW_CONF:
+        return "low_conf_bottles"
+
+    # Detections this close to the cut-off could flip the count either way
+    if any(abs(d["conf"] - high_conf_thresh) < CASCADE_BORDERLINE_MARGIN for d in detections):
+        return "borderline_count"
+
+    if sum(d["conf"] for d in kept) / len(kept) < CASCADE_MIN_MEAN_CONF:
+        return "low_mean_conf"
+
+    return None
+
+
+class CascadeStats:
+    """
+    Escalation rate and latency saved by the cascade.
+    Saved time is estimated against a running average of full-model latency.
+    """
+
+    def __init__(self, smoothing=0.1):
+        self._lock = threading.Lock()
+        self.smoothing = smoothing
+        self.accepted = 0
+        self.escalated = 0
+        self.reasons = {}
+        self.full_latency_avg = None
+        self.saved_seconds = 0.0
+        self.overhead_seconds = 0.0
+
+    def record_full(self, seconds):
+        """Update the running full-model latency estimate"""
+        with self._lock:
+            if self.full_latency_avg is None:
+                self.full_latency_avg = seconds
+            else:
+                self.full_latency_avg += self.smoothing * (seconds - self.full_latency_avg)
+
+    def record_accepted(self, fast_seconds):
+        """Cheap result accepted; returns the estimated seconds saved"""
+        with self._lock:
+            self.accepted += 1
+            saved = max((self.full_latency_avg or 0.0) - fast_seconds, 0.0)
+            self.saved_seconds += saved
+            return saved
+
+    def record_escalated(self, reason, fast_seconds):
+        """Cheap pass was wasted work"""
+        with self._lock:
+            self.escalated += 1
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            self.overhead_seconds += fast_seconds
+
+    def report(self):
+        with self._lock:
+            total = self.accepted + self.escalated
+            return {
+                "enabled": CASCADE_MODE,
+                "requests": total,
+                "accepted": self.accepted,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / total, 4) if total else 0.0,
+                "escalation_reasons": dict(self.reasons),
+                "full_latency_avg_ms": round((self.full_latency_avg or 0.0) * 1000, 1),
+                "saved_seconds": round(self.saved_seconds, 3),
+                "overhead_seconds": round(self.overhead_seconds, 3),
+                "net_saved_seconds": round(self.saved_seconds - self.overhead_seconds, 3),
+            }
+
+
+stats = CascadeStats()
@@ -0,0 +1,139 @@
+"""
+Static-camera change gating
+Compares a downscaled greyscale frame with the last processed frame of the
+same camera/source. Unchanged scenes reuse the previous result without
+running YOLO; small localized changes are re-detected only in that region.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+import tiling
+
+GATE_SIZE = (64, 48)
+# Per-pixel grey-level change (0-255) that counts as "changed" rather than sensor noise
+GATE_PIXEL_DIFF = int(os.environ.get("GATE_PIXEL_DIFF", "18"))
+# Scene is unchanged when fewer than this fraction of thumbnail pixels changed
+GATE_CHANGED_FRACTION = float(os.environ.get("GATE_CHANGED_FRACTION", "0.01"))
+# Changes covering less than this fraction of the frame are re-analyzed as a region
+GATE_REGION_MAX_FRACTION = float(os.environ.get("GATE_REGION_MAX_FRACTION", "0.25"))
+GATE_MAX_SOURCES = int(os.environ.get("GATE_MAX_SOURCES", "256"))
+
+
+def signature(image):
+    """Downscaled greyscale frame as a uint8 array (path or PIL image)"""
+    if isinstance(image, Image.Image):
+        img = image
+    else:
+        img = Image.open(image)
+        # JPEG: decode at reduced size directly
+        img.draft("L", (GATE_SIZE[0] * 4, GATE_SIZE[1] * 4))
+    return np.asarray(img.convert("L").resize(GATE_SIZE, Image.BILINEAR), dtype=np.uint8)
+
+
+def mean_abs_diff(a, b):
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+
+
+def change_mask(a, b, pixel_diff=GATE_PIXEL_DIFF):
+    return np.abs(a.astype(np.int16) - b.astype(np.int16)) > pixel_diff
+
+
+class GateDecision:
+    """
+    unchanged: previous result can be returned as-is
+    region: (x0, y0, x1, y1) in full-image pixels to re-detect, or None for a full pass
+    """
+
+    __slots__ = ("unchanged", "region", "changed_fraction", "previous")
+
+    def __init__(self, unchanged=False, region=None, changed_fraction=1.0, previous=None):
+        self.unchanged = unchanged
+        self.region = region
+        self.changed_fraction = changed_fraction
+        self.previous = previous
+
+
+class SceneState:
+    __slots__ = ("signature", "result", "detections", "image_size")
+
+    def __init__(self, signature, result, detections, image_size):
+        self.signature = signature
+        self.result = result
+        self.detections = detections
+        self.image_size = image_size
+
+
+class ChangeGate:
+    """Last processed frame per source, bounded LRU"""
+
+    def __init__(self, max_sources=GATE_MAX_SOURCES):
+        self.max_sources = max_sources
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, source_id, frame_signature, image_size):
+        with self._lock:
+            state = self._states.get(source_id)
+            if state is not None:
+                self._states.move_to_end(source_id)
+
+        if state is None or state.image_size != image_size:
+            return GateDecision()
+
+        mask = change_mask(frame_signature, state.signature)
+        fraction = float(mask.mean())
+        if fraction < GATE_CHANGED_FRACTION:
+            return GateDecision(unchanged=True, changed_fraction=fraction, previous=state)
+
+        if fraction <= GATE_REGION_MAX_FRACTION:
+            return GateDecision(region=_mask_region(mask, image_size), changed_fraction=fraction, previous=state)
+
+        return GateDecision(changed_fraction=fraction, previous=state)
+
+    def update(self, source_id, frame_signature, image_size, result, detections):
+        with self._lock:
+            self._states[source_id] = SceneState(frame_signature, result, detections, image_size)
+            self._states.move_to_end(source_id)
+            while len(self._states) > self.max_sources:
+                self._states.popitem(last=False)
+
+
+def _mask_region(mask, image_size, pad_cells=2):
+    """Bounding box of the changed thumbnail cells, padded and scaled to image pixels"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    height_cells, width_cells = mask.shape
+    x0 = max(int(cols[0]) - pad_cells, 0)
+    x1 = min(int(cols[-1]) + 1 + pad_cells, width_cells)
+    y0 = max(int(rows[0]) - pad_cells, 0)
+    y1 = min(int(rows[-1]) + 1 + pad_cells, height_cells)
+
+    scale_x = image_size[0] / width_cells
+    scale_y = image_size[1] / height_cells
+    return (int(x0 * scale_x), int(y0 * scale_y), int(round(x1 * scale_x)), int(round(y1 * scale_y)))
+
+
+def merge_region_detections(previous, fresh, region):
+    """
+    Previous detections outside the changed region plus fresh detections
+    from inside it. A previous box belongs to the region when its centre does.
+    Both sets go through one NMS pass: an object straddling the region edge
+    is kept from the previous frame and cut by the region crop, and must not
+    count twice.
+    """
+    x0, y0, x1, y1 = region
+    kept = []
+    for det in previous:
+        cx = (det["box"][0] + det["box"][2]) / 2
+        cy = (det["box"][1] + det["box"][3]) / 2
+        if not (x0 <= cx <= x1 and y0 <= cy <= y1):
+            kept.append(det)
+    return tiling.merge_detections(kept + fresh)
+
+
+gate = ChangeGate()
@@ -0,0 +1,178 @@
+"""
+Bulk ground-truth corrections (weighbridge / scale exports)
+Parses CSV or NDJSON rows of (scan_id, actual_weight, category) and applies
+them in one transaction with executemany. The V2 Lite material database is
+updated once per batch with a single save.
+
+Usage:
+    python corrections.py readings.csv
+    python corrections.py readings.ndjson --dry-run
+
+CSV needs a header row with scan_id and actual_weight; category is optional.
+"""
+
+import argparse
+import csv
+import io
+import json
+
+from sqlalchemy import update
+
+import metrics
+from database import ScanResult
+
+# SQLite limits the number of bound parameters per statement
+ID_QUERY_CHUNK = 500
+
+metrics.registry.describe("waste_corrections_total", "Ground-truth weights applied through bulk import")
+
+
+def detect_format(text):
+    """NDJSON when the first non-blank character opens a JSON object, CSV otherwise"""
+    stripped = text.lstrip()
+    return "ndjson" if stripped.startswith("{") else "csv"
+
+
+def _parse_row(raw):
+    scan_id = int(str(raw["scan_id"]).strip())
+    actual_weight = float(str(raw["actual_weight"]).strip())
+    if actual_weight <= 0:
+        raise ValueError("actual_weight must be positive")
+    category = raw.get("category")
+    category = str(category).strip() if category not in (None, "") else None
+    return {"scan_id": scan_id, "actual_weight": actual_weight, "category": category}
+
+
+def parse_corrections(text, fmt=None):
+    """
+    Parse CSV or NDJSON text.
+
+    Returns:
+        (rows, errors): valid rows as dicts, and {"line", "error"} entries for
+        rows that could not be parsed
+    """
+    fmt = fmt or detect_format(text)
+    rows, errors = [], []
+
+    if fmt == "ndjson":
+        records = ((line_no, line) for line_no, line in enumerate(text.splitlines(), start=1) if line.strip())
+        for line_no, line in records:
+            try:
+                rows.append(_parse_row(json.loads(line)))
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append({"line": line_no, "error": str(e)})
+    elif fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        missing = {"scan_id", "actual_weight"} - set(reader.fieldnames or [])
+        if missing:
+            return [], [{"line": 1, "error": f"missing columns: {', '.join(sorted(missing))}"}]
+        for raw in reader:
+            try:
+                rows.append(_parse_row(raw))
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append({"line": reader.line_num, "error": str(e)})
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    return rows, errors
+
+
+def apply_corrections(db, rows, update_v2_lite=True, dry_run=False):
+    """
+    Apply parsed corrections in a single transaction.
+
+    Later rows for the same scan_id win. Unknown scan ids are skipped and
+    reported. Learned averages and k-NN read verified scans at query time, so
+    they see the whole batch after the one commit.
+
+    Returns:
+        dict: Counts and the unknown scan ids
+    """
+    latest = {}
+    for row in rows:
+        latest[row["scan_id"]] = row
+
+    existing = {}
+    ids = list(latest)
+    for start in range(0, len(ids), ID_QUERY_CHUNK):
+        chunk = ids[start:start + ID_QUERY_CHUNK]
+        query = db.query(ScanResult.id, ScanResult.material, ScanResult.object_count).filter(ScanResult.id.in_(chunk))
+        for scan_id, material, object_count in query:
+            existing[scan_id] = (material, object_count)
+
+    weight_only, with_category, material_updates = [], [], []
+    for scan_id, row in latest.items():
+        if scan_id not in existing:
+            continue
+        if row["category"]:
+            # Same rule as update_weight: the category also becomes the material
+            with_category.append({
+                "id": scan_id,
+                "actual_weight": row["actual_weight"],
+                "category": row["category"],
+                "material": row["category"],
+            })
+        else:
+            weight_only.append({"id": scan_id, "actual_weight": row["actual_weight"]})
+        material, object_count = existing[scan_id]
+        material = row["category"] or material
+        material_updates.append((material, "default", row["actual_weight"] / max(object_count or 1, 1)))
+
+    applied = len(weight_only) + len(with_category)
+    report = {
+        "received": len(rows),
+        "applied": applied,
+        "duplicates": len(rows) - len(latest),
+        "unknown_scan_ids": sorted(set(ids) - set(existing)),
+        "dry_run": dry_run,
+    }
+    if dry_run or not applied:
+        return report
+
+    # ORM bulk UPDATE by primary key: one executemany per parameter shape
+    with metrics.stage("bulk_corrections"):
+        try:
+            if weight_only:
+                db.execute(update(ScanResult), weight_only)
+            if with_category:
+                db.execute(update(ScanResult), with_category)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    metrics.registry.inc("waste_corrections_total", applied)
+
+    if update_v2_lite:
+        from weight_model_v2_lite import get_estimator_v2_lite
+        get_estimator_v2_lite().db.update_many(material_updates)
+
+    print(f"[Corrections] Applied {applied} ground-truth weights")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import ground-truth weights from a CSV or NDJSON file")
+    parser.add_argument("file", help="CSV (scan_id,actual_weight[,category]) or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="Override format detection")
+    parser.add_argument("--dry-run", action="store_true", help="Validate without writing")
+    parser.add_argument("--skip-v2-lite", action="store_true", help="Do not update material_weights.json")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    with open(args.file, encoding="utf-8-sig") as f:
+        rows, errors = parse_corrections(f.read(), args.format)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        report = apply_corrections(db, rows, update_v2_lite=not args.skip_v2_lite, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    report["errors"] = errors
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
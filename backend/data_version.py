@@ -0,0 +1,119 @@
+"""
+Conditional-request caching for read endpoints
+The scans table has triggers (database.ensure_version_triggers) that bump a
+single data_version counter on every insert, update and delete, whichever
+process or session made it. Read endpoints derive their ETag from that
+counter, answer If-None-Match with 304 and keep their encoded body per
+version, so a dashboard polling /history costs one single-row SELECT.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import Response
+from sqlalchemy import text
+
+import metrics
+import serialization
+
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "64"))
+
+_VERSION_QUERY = text("SELECT version FROM data_version WHERE id = 1")
+
+
+def current(db):
+    """Current data version (sync session)"""
+    return db.execute(_VERSION_QUERY).scalar() or 0
+
+
+async def current_async(db):
+    """Current data version (async session)"""
+    return (await db.execute(_VERSION_QUERY)).scalar() or 0
+
+
+def etag(version, key):
+    """Weak ETag: the encoded body may differ by compression, the data does not"""
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:8]
+    return f'W/"{version}-{digest}"'
+
+
+def matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" match
+    wanted = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == wanted:
+            return True
+    return False
+
+
+class VersionedCache:
+    """Encoded responses keyed by (route, params); an entry is valid only for its data version"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and existing[0] > version:
+                return   # a newer body was stored meanwhile
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = VersionedCache()
+
+
+async def versioned_response(request, db, key, build):
+    """
+    ETag / If-None-Match handling plus the per-version body cache.
+
+    Args:
+        request: Incoming request (Accept and If-None-Match headers)
+        db: Async session
+        key: Hashable description of the representation (route and params)
+        build: Async callable returning the content, only awaited on a cache miss
+
+    Returns:
+        Response: 304, a cached body or a freshly encoded one
+    """
+    accept = request.headers.get("accept")
+    key = (key, "msgpack" if serialization.wants_msgpack(accept) else "json")
+    version = await current_async(db)
+    tag = etag(version, key)
+    headers = {"ETag": tag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+    if matches(request.headers.get("if-none-match"), tag):
+        metrics.record_cache("response", True)
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key, version)
+    metrics.record_cache("response", cached is not None)
+    if cached is None:
+        cached = serialization.encode(await build(), accept)
+        response_cache.put(key, version, cached)
+    body, media_type = cached
+    return Response(content=body, media_type=media_type, headers=headers)
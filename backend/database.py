@@ -1,16 +1,36 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, event, Column, ForeignKey, Integer, String, Float, DateTime, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import os
 
-# Local SQLite database file
-SQLALCHEMY_DATABASE_URL = "sqlite:///./waste.db"
+# Local SQLite database file (load_test.py points it at a scratch copy)
+WASTE_DB_PATH = os.environ.get("WASTE_DB_PATH", "./waste.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{WASTE_DB_PATH}"
+# Same file through aiosqlite, for async endpoints (queries do not block the event loop)
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{WASTE_DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+# expire_on_commit=False: attributes stay loaded after commit (no implicit lazy IO in async code)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run while another connection (sync or async) writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+event.listen(engine, "connect", _set_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
 class ScanResult(Base):
@@ -26,6 +46,69 @@ class ScanResult(Base):
     actual_weight = Column(Float, nullable=True) # User provided weight
     object_count = Column(Integer, default=1)   # Number of items detected
     embedding = Column(String, nullable=True)   # JSON string of the image embedding
+    embedding_status = Column(String, nullable=True)  # ready / pending / failed / missing (computed in background)
+    embedding_version = Column(String, nullable=True, index=True)  # backbone (+ projection) version, see embedding_projection.py
+    phash = Column(String, nullable=True, index=True)  # 64-bit dHash as hex, for near-duplicate lookup
+    detected_objects = Column(String, nullable=True)  # JSON list of detected object names
+    prediction_method = Column(String, nullable=True)  # How the weight was produced
+    blob_hash = Column(String, nullable=True, index=True)  # SHA-256 of the upload, see blob_store.py
+    qos_level = Column(String, nullable=True, index=True)  # reduced / lite when degraded under load, rerun afterwards, see qos.py
+
+class ScanObject(Base):
+    # One detected object of a scan with its crop embedding (PER_OBJECT_MODE=1), see object_weights.py
+    __tablename__ = "scan_objects"
+
+    id = Column(Integer, primary_key=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), index=True, nullable=False)
+    name = Column(String)
+    conf = Column(Float)
+    box = Column(String)  # JSON [x0, y0, x1, y1] in image pixels
+    weight = Column(Float)  # Estimated weight of this object
+    embedding = Column(String, nullable=True)  # JSON crop embedding
+    embedding_version = Column(String, nullable=True, index=True)
+
+class DataVersion(Base):
+    # Single row (id=1) bumped by triggers on every scan insert, update and delete, see data_version.py
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+_VERSION_TRIGGERS = {
+    "scans_version_insert": "AFTER INSERT ON scans",
+    # Any column: /history also shows embedding status, prediction method and QoS level,
+    # which background writers (embeddings, QoS reruns) change without touching the weight
+    "scans_version_update": "AFTER UPDATE ON scans",
+    "scans_version_delete": "AFTER DELETE ON scans",
+}
+# Replaced triggers, dropped from existing databases
+_OBSOLETE_TRIGGERS = ("scans_version_correction",)
+
+def ensure_version_triggers(bind=None):
+    # Triggers fire for every writer (sync/async sessions, CLI tools, other worker processes)
+    with (bind or engine).begin() as conn:
+        conn.execute(text("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)"))
+        for name in _OBSOLETE_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for name, timing in _VERSION_TRIGGERS.items():
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {name} {timing} "
+                "BEGIN UPDATE data_version SET version = version + 1 WHERE id = 1; END"
+            ))
+
+def _ensure_columns():
+    # create_all() never alters existing tables: add columns introduced after the DB was created
+    existing = {col["name"] for col in inspect(engine).get_columns(ScanResult.__tablename__)}
+    with engine.begin() as conn:
+        for column in ScanResult.__table__.columns:
+            if column.name not in existing:
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {ScanResult.__tablename__} ADD COLUMN {column.name} {col_type}"))
+                print(f"[Database] Added column {column.name}")
+        for index in ScanResult.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _ensure_columns()
+    ensure_version_triggers()
@@ -0,0 +1,248 @@
+"""
+Optional compression of image embeddings before storage and k-NN search
+A PCA (or Gaussian random) projection is fitted offline on stored
+embeddings and saved as a versioned .npz. When EMBEDDING_PROJECTION points
+to that file, new embeddings are projected to its dimension (e.g. 64 instead
+of 1024) and stored with a combined version, so backfill_embeddings.py
+re-projects old rows and k-NN never mixes spaces.
+
+Usage:
+    python embedding_projection.py fit --dim 64                 # PCA on stored embeddings + report
+    python embedding_projection.py fit --dim 64 --method random
+    python embedding_projection.py report embedding_projection.npz
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from feature_extractor import EMBEDDING_VERSION
+
+# Path of the fitted projection; unset = store full-dimension embeddings
+EMBEDDING_PROJECTION = os.environ.get("EMBEDDING_PROJECTION", "")
+
+
+class Projection:
+    """x -> (x - mean) @ components.T"""
+
+    def __init__(self, mean, components, method, backbone_version, explained_variance=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.method = method
+        self.backbone_version = backbone_version
+        self.explained_variance = explained_variance
+        digest = hashlib.sha256(self.mean.tobytes() + self.components.tobytes()).hexdigest()[:10]
+        self.version = f"{method}{self.dim}-{digest}"
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    def project(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return (vectors - self.mean) @ self.components.T
+
+    def save(self, path):
+        np.savez(
+            path,
+            mean=self.mean,
+            components=self.components,
+            method=self.method,
+            backbone_version=self.backbone_version,
+            explained_variance=np.float32(self.explained_variance if self.explained_variance is not None else np.nan),
+            created=datetime.now().isoformat(timespec="seconds"),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            explained = float(data["explained_variance"])
+            return cls(
+                data["mean"],
+                data["components"],
+                str(data["method"]),
+                str(data["backbone_version"]),
+                None if np.isnan(explained) else explained,
+            )
+
+
+def fit_pca(X, dim):
+    X = np.asarray(X, dtype=np.float64)
+    mean = X.mean(axis=0)
+    # Rows of vt are the principal axes, ordered by singular value
+    _, s, vt = np.linalg.svd(X - mean, full_matrices=False)
+    variance = s ** 2
+    explained = float(variance[:dim].sum() / variance.sum()) if variance.sum() > 0 else 1.0
+    return Projection(mean, vt[:dim], "pca", EMBEDDING_VERSION, explained)
+
+
+def fit_random(input_dim, dim, seed=0):
+    """Gaussian random projection (Johnson-Lindenstrauss); needs no training data"""
+    rng = np.random.default_rng(seed)
+    components = rng.standard_normal((dim, input_dim)) / np.sqrt(dim)
+    return Projection(np.zeros(input_dim), components, "random", EMBEDDING_VERSION)
+
+
+# ============================================================================
+# ACTIVE PROJECTION
+# ============================================================================
+
+_active = None
+_active_loaded = False
+
+
+def active_projection():
+    """The configured projection, loaded once; None when disabled"""
+    global _active, _active_loaded
+    if not _active_loaded:
+        _active_loaded = True
+        if EMBEDDING_PROJECTION and os.path.exists(EMBEDDING_PROJECTION):
+            projection = Projection.load(EMBEDDING_PROJECTION)
+            if projection.backbone_version != EMBEDDING_VERSION:
+                print(f"[Projection] {EMBEDDING_PROJECTION} was fitted for {projection.backbone_version}, "
+                      f"backbone is {EMBEDDING_VERSION}; refit it. Using full embeddings.")
+            else:
+                _active = projection
+                print(f"[Projection] {projection.input_dim} -> {projection.dim} dims ({projection.version})")
+        elif EMBEDDING_PROJECTION:
+            print(f"[Projection] {EMBEDDING_PROJECTION} not found, using full embeddings")
+    return _active
+
+
+def current_version():
+    """Version stored with (and required of) embeddings used for k-NN"""
+    projection = active_projection()
+    return f"{EMBEDDING_VERSION}+{projection.version}" if projection else EMBEDDING_VERSION
+
+
+def for_storage(embedding):
+    """Backbone embedding -> (stored embedding, version); passes None through"""
+    if embedding is None:
+        return None, None
+    projection = active_projection()
+    if projection is None:
+        return embedding, EMBEDDING_VERSION
+    return projection.project(embedding).tolist(), current_version()
+
+
+def for_storage_batch(embeddings):
+    projection = active_projection()
+    if projection is None or not embeddings:
+        return embeddings, EMBEDDING_VERSION
+    return projection.project(np.asarray(embeddings)).tolist(), current_version()
+
+
+# ============================================================================
+# EVALUATION
+# ============================================================================
+
+def _knn_indices(index, queries, k):
+    # Squared L2 via the dot-product expansion; same neighbours as sklearn brute force
+    distances = (
+        (queries ** 2).sum(axis=1)[:, None]
+        - 2.0 * queries @ index.T
+        + (index ** 2).sum(axis=1)[None, :]
+    )
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def evaluate(projection, X, k=5, query_fraction=0.2, seed=0):
+    """
+    Recall@k of projected k-NN against full-dimension k-NN, plus storage size
+    and brute-force search latency for both spaces.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(X))
+    n_query = max(1, int(len(X) * query_fraction))
+    queries, index = X[order[:n_query]], X[order[n_query:]]
+    k = min(k, len(index))
+
+    def timed_search(idx, q):
+        start = time.perf_counter()
+        result = _knn_indices(idx, q, k)
+        return result, (time.perf_counter() - start) / len(q)
+
+    full, full_seconds = timed_search(index, queries)
+    projected, projected_seconds = timed_search(projection.project(index), projection.project(queries))
+    recall = float(np.mean([len(set(f) & set(p)) / k for f, p in zip(full, projected)]))
+
+    full_json = len(json.dumps(X[0].tolist()))
+    projected_json = len(json.dumps(projection.project(X[:1])[0].tolist()))
+    return {
+        "method": projection.method,
+        "version": projection.version,
+        "input_dim": projection.input_dim,
+        "dim": projection.dim,
+        "explained_variance": projection.explained_variance,
+        "samples": len(X),
+        "k": k,
+        f"recall_at_{k}": round(recall, 4),
+        "bytes_per_row_json": {"full": full_json, "projected": projected_json},
+        "bytes_per_row_float32": {"full": projection.input_dim * 4, "projected": projection.dim * 4},
+        "search_ms_per_query": {
+            "full": round(full_seconds * 1000, 4),
+            "projected": round(projected_seconds * 1000, 4),
+        },
+    }
+
+
+def load_stored_embeddings(db):
+    """Full-dimension embeddings of the current backbone from the scans table"""
+    from database import ScanResult
+
+    rows = db.query(ScanResult.embedding).filter(
+        ScanResult.embedding.isnot(None),
+        ScanResult.embedding_version == EMBEDDING_VERSION,
+    ).all()
+    return np.array([json.loads(row[0]) for row in rows], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or evaluate the embedding projection")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit", help="Fit on stored embeddings, save and report")
+    fit.add_argument("--dim", type=int, default=64)
+    fit.add_argument("--method", choices=["pca", "random"], default="pca")
+    fit.add_argument("--out", default=EMBEDDING_PROJECTION or "embedding_projection.npz")
+    fit.add_argument("--k", type=int, default=5)
+    report = sub.add_parser("report", help="Evaluate an existing projection on stored embeddings")
+    report.add_argument("path")
+    report.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        X = load_stored_embeddings(db)
+    finally:
+        db.close()
+    if len(X) < 2:
+        raise SystemExit(f"Need full-dimension {EMBEDDING_VERSION} embeddings in waste.db "
+                         "(run backfill_embeddings.py with EMBEDDING_PROJECTION unset)")
+
+    if args.command == "fit":
+        if args.method == "pca" and args.dim > min(X.shape):
+            raise SystemExit(f"PCA to {args.dim} dims needs at least {args.dim} stored embeddings, have {len(X)}")
+        projection = fit_pca(X, args.dim) if args.method == "pca" else fit_random(X.shape[1], args.dim)
+        projection.save(args.out)
+        print(f"[Projection] Saved {args.out} ({projection.version})")
+    else:
+        projection = Projection.load(args.path)
+
+    print(json.dumps(evaluate(projection, X, k=args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
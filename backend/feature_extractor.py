@@ -1,9 +1,50 @@
 import torch
 import torch.nn as nn
 from torchvision import models, transforms
-from PIL import Image
+from torchvision.ops import roi_align
+from PIL import Image, ImageOps
 import numpy as np
 
+import model_manager
+
+# Stored with every embedding. Bump when the backbone, weights or preprocessing
+# change: rows with another version are excluded from k-NN and recomputed by
+# backfill_embeddings.py
+EMBEDDING_VERSION = "mobilenet_v3_small-1"
+
+INPUT_RESIZE = 256
+INPUT_CROP = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Per-object crops: context added around each box, and the longest image side
+# the crops are taken from (bounds the float tensor of large photos)
+CROP_MARGIN = 0.1
+CROP_SOURCE_MAX = 1280
+
+def open_upright(path):
+    """Open an image file with its EXIF orientation applied (like the detector input)"""
+    return ImageOps.exif_transpose(Image.open(path))
+
+def load_for_embedding(image):
+    """
+    Decode and resize/centre-crop to the network input as a uint8 HxWx3 array.
+    Pure PIL (no torch), so it can run in worker processes; matches
+    transforms.Resize(256) + CenterCrop(224).
+    """
+    img = image if isinstance(image, Image.Image) else open_upright(image)
+    img = img.convert('RGB')
+    width, height = img.size
+    if width <= height:
+        new_size = (INPUT_RESIZE, int(INPUT_RESIZE * height / width))
+    else:
+        new_size = (int(INPUT_RESIZE * width / height), INPUT_RESIZE)
+    img = img.resize(new_size, Image.BILINEAR)
+    left = int(round((new_size[0] - INPUT_CROP) / 2.0))
+    top = int(round((new_size[1] - INPUT_CROP) / 2.0))
+    img = img.crop((left, top, left + INPUT_CROP, top + INPUT_CROP))
+    return np.asarray(img, dtype=np.uint8)
+
 class FeatureExtractor:
     def __init__(self):
         # Load pre-trained MobileNetV3 Small (lighter/faster)
@@ -20,15 +61,21 @@ class FeatureExtractor:
         
         # Standard ImageNet normalization
         self.preprocess = transforms.Compose([
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
+            transforms.Resize(INPUT_RESIZE),
+            transforms.CenterCrop(INPUT_CROP),
             transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
         ])
+        self._mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+        self._std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
 
     def get_embedding(self, image_path):
+        # Accepts a file path or an already decoded PIL image (live camera frames)
         try:
-            input_image = Image.open(image_path).convert('RGB')
+            if isinstance(image_path, Image.Image):
+                input_image = image_path.convert('RGB')
+            else:
+                input_image = open_upright(image_path).convert('RGB')
             input_tensor = self.preprocess(input_image)
             input_batch = input_tensor.unsqueeze(0) # create a mini-batch as expected by the model
 
@@ -41,3 +88,56 @@ class FeatureExtractor:
         except Exception as e:
             print(f"Error extracting features: {e}")
             return None
+
+    def get_embeddings_batch(self, arrays):
+        """
+        Embeddings for a batch of uint8 HxWx3 arrays from load_for_embedding()
+        in one forward pass. Returns a list of lists.
+        """
+        if not arrays:
+            return []
+        batch = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).float().div_(255.0)
+        batch = (batch - self._mean) / self._std
+        with torch.no_grad():
+            embeddings = self.model(batch)
+        return [row.tolist() for row in embeddings]
+
+    def get_crop_embeddings(self, image, boxes, margin=CROP_MARGIN):
+        """
+        Embeddings of several boxes (x0, y0, x1, y1) of one image in one
+        forward pass. The image becomes a tensor once; every box is widened
+        to a square and cropped + resized to the network input by a single
+        roi_align call. Returns a list of lists, one per box.
+        """
+        if not boxes:
+            return []
+        img = image.convert('RGB') if isinstance(image, Image.Image) else open_upright(image).convert('RGB')
+        width, height = img.size
+        scale = min(1.0, CROP_SOURCE_MAX / max(width, height))
+        if scale < 1.0:
+            img = img.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+        tensor = transforms.functional.pil_to_tensor(img).unsqueeze(0).float().div_(255.0)
+
+        squares = torch.tensor(
+            [[v * scale for v in square_box(box, width, height, margin)] for box in boxes],
+            dtype=torch.float32,
+        )
+        # sampling_ratio=-1: adaptive, averages every source pixel of a bin (no aliasing on large boxes)
+        crops = roi_align(tensor, [squares], output_size=(INPUT_CROP, INPUT_CROP), sampling_ratio=-1, aligned=True)
+        batch = (crops - self._mean) / self._std
+        with torch.no_grad():
+            embeddings = self.model(batch)
+        return [row.tolist() for row in embeddings]
+
+def square_box(box, width, height, margin=CROP_MARGIN):
+    """Square around the box centre (longest side plus margin), shifted to stay inside the image"""
+    x0, y0, x1, y1 = box
+    side = min(max(x1 - x0, y1 - y0) * (1 + 2 * margin), width, height)
+    side = max(side, 1.0)
+    left = min(max((x0 + x1 - side) / 2.0, 0.0), width - side)
+    top = min(max((y0 + y1 - side) / 2.0, 0.0), height - side)
+    return [left, top, left + side, top + side]
+
+
+# Shared instance, loaded on first use (see model_manager.py)
+model_manager.manager.register("embedding", FeatureExtractor)
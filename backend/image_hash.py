@@ -0,0 +1,195 @@
+"""
+Perceptual hashing and near-duplicate lookup
+dHash fingerprints let fixed-camera frames that are almost (but not byte-)
+identical reuse the result of a recent scan instead of paying full inference.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+NEAR_DUP_ENABLED = os.environ.get("NEAR_DUP_ENABLED", "0") == "1"
+# Max Hamming distance (out of 64 bits) for two frames to count as the same scene
+NEAR_DUP_RADIUS = int(os.environ.get("NEAR_DUP_RADIUS", "4"))
+# Only scans newer than this are reused
+NEAR_DUP_WINDOW_SECONDS = int(os.environ.get("NEAR_DUP_WINDOW_SECONDS", "600"))
+# Upper bound on hashes kept in memory
+NEAR_DUP_MAX_ENTRIES = int(os.environ.get("NEAR_DUP_MAX_ENTRIES", "5000"))
+
+
+# ============================================================================
+# HASHING
+# ============================================================================
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash of an image.
+
+    Args:
+        image: Path or PIL image
+        hash_size: Hash is hash_size * hash_size bits (default 64)
+
+    Returns:
+        int: The hash
+    """
+    if isinstance(image, Image.Image):
+        img = image
+    else:
+        img = Image.open(image)
+        # JPEG: let the decoder downscale by up to 8x, we only need 9x8 pixels
+        img.draft("L", (hash_size * 8, hash_size * 8))
+
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hash_to_hex(value):
+    return f"{value:016x}"
+
+
+def hex_to_hash(text):
+    return int(text, 16)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# ============================================================================
+# BK-TREE
+# ============================================================================
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+    Radius queries only visit children whose edge distance is within
+    [d - radius, d + radius] of the query's distance to the node.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Return [(distance, item)] for all items within `radius`"""
+        if self.root is None:
+            return []
+
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+# ============================================================================
+# NEAR-DUPLICATE INDEX
+# ============================================================================
+
+class NearDuplicateIndex:
+    """
+    In-memory BK-tree of recent scan hashes, kept in sync with the database.
+    Each sync only reads rows with an id above the last one seen, so scans
+    written by other worker processes are picked up cheaply.
+    """
+
+    def __init__(self, window_seconds=NEAR_DUP_WINDOW_SECONDS, max_entries=NEAR_DUP_MAX_ENTRIES):
+        self.window = timedelta(seconds=window_seconds)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._entries = []  # (hash, scan_id, material, timestamp), in insertion order
+        self._last_id = 0
+
+    def add(self, value, scan_id, material, timestamp):
+        with self._lock:
+            self._add(value, scan_id, material, timestamp)
+
+    def _add(self, value, scan_id, material, timestamp):
+        entry = (value, scan_id, material, timestamp)
+        self._entries.append(entry)
+        self._tree.add(value, entry)
+        self._last_id = max(self._last_id, scan_id)
+        if len(self._entries) > 2 * self.max_entries:
+            self._rebuild()
+
+    def _rebuild(self):
+        # BK-trees cannot delete; rebuild from the entries still inside the window
+        cutoff = datetime.now() - self.window
+        self._entries = [e for e in self._entries if e[3] >= cutoff][-self.max_entries:]
+        self._tree = BKTree()
+        for entry in self._entries:
+            self._tree.add(entry[0], entry)
+
+    def sync(self, db):
+        """Load scans added since the last sync (by this or any other process)"""
+        from database import ScanResult
+
+        cutoff = datetime.now() - self.window
+        rows = db.query(
+            ScanResult.id, ScanResult.phash, ScanResult.material, ScanResult.timestamp
+        ).filter(
+            ScanResult.id > self._last_id,
+            ScanResult.phash != None,
+            ScanResult.timestamp >= cutoff,
+        ).order_by(ScanResult.id).limit(self.max_entries).all()
+
+        with self._lock:
+            for scan_id, phash, material, timestamp in rows:
+                self._add(hex_to_hash(phash), scan_id, material, timestamp)
+
+    def find(self, value, material, radius=NEAR_DUP_RADIUS):
+        """
+        Closest recent scan of the same material within `radius`.
+
+        Returns:
+            (scan_id, distance) or None
+        """
+        cutoff = datetime.now() - self.window
+        with self._lock:
+            matches = self._tree.search(value, radius)
+
+        best = None
+        for distance, (_, scan_id, entry_material, timestamp) in matches:
+            if entry_material != material or timestamp < cutoff:
+                continue
+            # Prefer the closest, then the most recent
+            if best is None or (distance, -scan_id) < (best[1], -best[0]):
+                best = (scan_id, distance)
+        return best
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,76 @@
+"""
+Live camera streaming helpers
+A single-slot "latest frame wins" buffer: when inference falls behind, stale
+frames are dropped instead of queueing, so the server always works on the
+newest frame and memory stays bounded.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+
+class LatestFrameSlot:
+    """
+    Holds at most one pending frame.
+    put() never blocks; a frame that was not picked up in time is dropped.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    async def get(self):
+        """Wait for the newest frame; returns None once closed and drained"""
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class StreamStats:
+    """Processing FPS over a sliding window and the dropped-frame ratio"""
+
+    def __init__(self, window_seconds=5.0):
+        self.window = window_seconds
+        self._done = deque()
+        self.processed = 0
+
+    def record_processed(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.processed += 1
+        self._done.append(now)
+        while self._done and now - self._done[0] > self.window:
+            self._done.popleft()
+
+    def fps(self):
+        if len(self._done) < 2:
+            return 0.0
+        span = self._done[-1] - self._done[0]
+        return (len(self._done) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self, slot):
+        return {
+            "received": slot.received,
+            "processed": self.processed,
+            "dropped": slot.dropped,
+            "dropped_ratio": round(slot.dropped / slot.received, 4) if slot.received else 0.0,
+            "processing_fps": round(self.fps(), 2),
+        }
@@ -0,0 +1,323 @@
+"""
+Load-testing harness for the WasteVisionAI backend
+Drives a configurable mix of /analyze, /update_weight and /history traffic
+at increasing concurrency and reports throughput, tail latency and errors.
+
+In-process runs use a scratch database and upload store in a temporary
+directory, never ./waste.db. Random /update_weight corrections change the
+learned averages, so they are only sent with --corrections.
+
+Outside QOS_MODE, /analyze runs the analysis on the event loop, so an
+in-process app serves one request at a time: in-process sweeps are limited
+to concurrency 1 unless QOS_MODE=1 (analysis in the threadpool). Measure
+concurrency against a server with --url.
+
+Usage:
+    # In-process (no server needed, loads the models in this process)
+    python load_test.py --requests 100
+    QOS_MODE=1 python load_test.py --concurrency 1,2,4,8 --requests 100
+
+    # Against a running uvicorn (point it at a scratch database first)
+    python load_test.py --url http://127.0.0.1:8000 --corrections --mix analyze=6,history=3,update_weight=1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ENDPOINTS = ("analyze", "update_weight", "history")
+DEFAULT_MIX = {"analyze": 6, "history": 2}
+# Endpoints that write ground truth; only sent with --corrections
+CORRECTION_ENDPOINTS = ("update_weight",)
+DEFAULT_IMAGE = "test_image_A.jpg"
+
+
+# ============================================================================
+# STATISTICS
+# ============================================================================
+
+def percentile(values, p):
+    """
+    Percentile with linear interpolation between closest ranks.
+
+    Args:
+        values: Iterable of numbers
+        p: Percentile in [0, 100]
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return float(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+
+
+def summarize(samples, wall_seconds):
+    """
+    Summarize one concurrency level.
+
+    Args:
+        samples: List of (kind, status_code, latency_seconds); status 0 = transport error
+        wall_seconds: Wall-clock duration of the level
+
+    Returns:
+        dict: Throughput, latency percentiles (ms), error rate and per-kind breakdown
+    """
+    def _stats(subset):
+        latencies = [s[2] * 1000 for s in subset]
+        errors = sum(1 for s in subset if s[1] == 0 or s[1] >= 400)
+        return {
+            "requests": len(subset),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "error_rate": round(errors / len(subset), 4) if subset else 0.0,
+        }
+
+    by_kind = defaultdict(list)
+    for sample in samples:
+        by_kind[sample[0]].append(sample)
+
+    summary = _stats(samples)
+    summary["throughput_rps"] = round(len(samples) / wall_seconds, 2) if wall_seconds > 0 else 0.0
+    summary["status_codes"] = dict(Counter(str(s[1]) for s in samples))
+    summary["by_endpoint"] = {kind: _stats(subset) for kind, subset in sorted(by_kind.items())}
+    return summary
+
+
+def parse_mix(text):
+    """Parse 'analyze=6,history=3' into a weight dict"""
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ============================================================================
+# LOAD GENERATOR
+# ============================================================================
+
+class LoadGenerator:
+    """Sends weighted random requests through an httpx.AsyncClient"""
+
+    def __init__(self, client, image_bytes, mix, material="Plastic"):
+        self.client = client
+        self.image_bytes = image_bytes
+        self.kinds = list(mix.keys())
+        self.weights = list(mix.values())
+        self.material = material
+        self.scan_ids = []
+
+    async def _analyze(self):
+        files = {"file": ("load_test.jpg", self.image_bytes, "image/jpeg")}
+        response = await self.client.post("/analyze", files=files, params={"material": self.material})
+        if response.status_code == 200:
+            scan_id = response.json().get("id")
+            if scan_id is not None:
+                self.scan_ids.append(scan_id)
+        return response
+
+    async def _update_weight(self):
+        if not self.scan_ids:
+            # Nothing to correct yet; create a scan first
+            return await self._analyze()
+        scan_id = random.choice(self.scan_ids)
+        return await self.client.put(
+            f"/scan/{scan_id}/update_weight",
+            params={"actual_weight": round(random.uniform(0.01, 0.5), 3), "category": self.material},
+        )
+
+    async def _history(self):
+        return await self.client.get("/history")
+
+    async def one_request(self):
+        kind = random.choices(self.kinds, weights=self.weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await getattr(self, f"_{kind}")()
+            status = response.status_code
+        except Exception as e:
+            print(f"[LoadTest] {kind} failed: {e}")
+            status = 0
+        return kind, status, time.perf_counter() - start
+
+    async def run_level(self, concurrency, total_requests):
+        """Run `total_requests` requests with `concurrency` workers"""
+        samples = []
+        remaining = total_requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                samples.append(await self.one_request())
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(samples, time.perf_counter() - start)
+
+
+def isolate_in_process():
+    """
+    Point the in-process app at a scratch database and upload store. Must
+    run before main (and with it database) is imported.
+
+    Returns:
+        str: The temporary directory, removed by the caller
+    """
+    import sys
+
+    if "database" in sys.modules:
+        raise RuntimeError("database already imported: the in-process app would use ./waste.db")
+    scratch = tempfile.mkdtemp(prefix="load_test_")
+    os.environ["WASTE_DB_PATH"] = os.path.join(scratch, "waste.db")
+    os.environ["UPLOAD_DIR"] = os.path.join(scratch, "uploads")
+    os.environ["THUMBNAIL_DIR"] = os.path.join(scratch, "thumbnails")
+    return scratch
+
+
+def _make_client(url, timeout):
+    import httpx
+
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+
+    # In-process: route requests straight into the ASGI app (see isolate_in_process)
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout)
+
+
+async def run_sweep(url, levels, requests_per_level, mix, image_path, timeout=60.0, warmup=2):
+    with open(image_path, "rb") as f:
+        image_bytes = f.read()
+
+    results = []
+    async with _make_client(url, timeout) as client:
+        generator = LoadGenerator(client, image_bytes, mix)
+
+        # Warm-up: load models and seed scan ids outside the measured window
+        for _ in range(warmup):
+            await generator._analyze()
+
+        for concurrency in levels:
+            summary = await generator.run_level(concurrency, requests_per_level)
+            summary["concurrency"] = concurrency
+            results.append(summary)
+            print_level(summary)
+    return results
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def print_header():
+    print("=" * 78)
+    print(f"{'conc':>5} {'req':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}  status")
+    print("-" * 78)
+
+
+def print_level(summary):
+    codes = " ".join(f"{code}:{n}" for code, n in sorted(summary["status_codes"].items()))
+    print(
+        f"{summary['concurrency']:>5} {summary['requests']:>6} {summary['throughput_rps']:>8.2f} "
+        f"{summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} "
+        f"{summary['error_rate'] * 100:>7.1f}%  {codes}"
+    )
+
+
+def print_memory(pid_file):
+    """Per-worker memory of a serve.py deployment (see serve.py --pid-file)"""
+    from metrics import read_memory
+
+    with open(pid_file) as f:
+        pids = json.load(f)
+
+    print(f"{'role':>8} {'pid':>7} {'rss MiB':>9} {'pss MiB':>9} {'uss MiB':>9}")
+    rows = [("parent", pids["parent"])] + [("worker", pid) for pid in pids["workers"]]
+    worker_pss = []
+    for role, pid in rows:
+        mem = read_memory(pid)
+        if mem is None:
+            print(f"{role:>8} {pid:>7}   (unavailable)")
+            continue
+        if role == "worker":
+            worker_pss.append(mem["pss"])
+        print(f"{role:>8} {pid:>7} {mem['rss'] / 2**20:>9.1f} {mem['pss'] / 2**20:>9.1f} {mem['uss'] / 2**20:>9.1f}")
+    if worker_pss:
+        print(f"Memory per worker (mean PSS): {sum(worker_pss) / len(worker_pss) / 2**20:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency sweep load test for the backend")
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: in-process)")
+    parser.add_argument("--concurrency", default=None,
+                        help="Comma-separated concurrency levels (default: 1,2,4,8, in-process: 1)")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per concurrency level")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+                        help="Weighted endpoint mix, e.g. analyze=6,update_weight=2,history=2")
+    parser.add_argument("--corrections", action="store_true",
+                        help="Allow update_weight in the mix (writes random ground truth)")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="Image uploaded by /analyze requests")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the traffic mix")
+    parser.add_argument("--json", default=None, help="Write the full report to this JSON file")
+    parser.add_argument("--pid-file", default=None,
+                        help="serve.py --pid-file; report per-worker memory after the sweep")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    if not os.path.exists(args.image):
+        parser.error(f"Image not found: {args.image}")
+
+    import qos
+
+    concurrency = args.concurrency or ("1,2,4,8" if args.url else "1")
+    levels = [int(level) for level in concurrency.split(",") if level.strip()]
+    if not args.url and max(levels) > 1 and not qos.QOS_MODE:
+        parser.error("in-process /analyze runs on the event loop without QOS_MODE=1, so requests are "
+                     "served one at a time; use --url for concurrency > 1 (or set QOS_MODE=1)")
+    mix = parse_mix(args.mix)
+    corrections = [name for name in mix if name in CORRECTION_ENDPOINTS]
+    if corrections and not args.corrections:
+        parser.error(f"{', '.join(corrections)} writes random corrections; pass --corrections to allow it")
+
+    scratch = None if args.url else isolate_in_process()
+    print(f"Target: {args.url or 'in-process ASGI app'}  mix: {mix}")
+    if scratch:
+        print(f"Scratch database and uploads: {scratch}")
+    print_header()
+    try:
+        results = asyncio.run(run_sweep(args.url, levels, args.requests, mix, args.image, args.timeout))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    print("=" * 78)
+
+    if args.pid_file:
+        print_memory(args.pid_file)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
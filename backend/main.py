@@ -1,10 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, Depends
+from fastapi import FastAPI, UploadFile, File, Depends, Request, Response, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import shutil
 import os
 import json
-from database import SessionLocal, init_db, ScanResult
+import time
+import asyncio
+import metrics
+import profiling
+import cascade
+import qos
+import background
+import live_stream
+import blob_store
+import thumbnails
+import corrections
+import serialization
+import data_version
+import object_weights
+import model_manager
+from database import SessionLocal, AsyncSessionLocal, init_db, ScanResult
 from model import analyze_image
 
 # Initialize DB
@@ -21,6 +40,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger JSON/MessagePack bodies (e.g. /history); images and 206 responses are skipped
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=6)
+
+# Record latency of every request, labelled by route template (not raw URL)
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    if not metrics.METRICS_ENABLED:
+        return await call_next(request)
+    
+    metrics.start_trace()
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        metrics.observe_request(route_path, request.method, status_code, time.perf_counter() - start)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -29,43 +70,209 @@ def get_db():
     finally:
         db.close()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Async session for endpoints that only do DB work: IO does not block the event loop
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+os.makedirs(blob_store.UPLOAD_DIR, exist_ok=True)
 
 @app.post("/analyze")
-async def analyze_endpoint(file: UploadFile = File(...), material: str = None, db: Session = Depends(get_db)):
-    # Save uploaded file
-    file_location = f"{UPLOAD_DIR}/{file.filename}"
-    with open(file_location, "wb+") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def analyze_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    material: str = None,
+    source_id: str = None,
+    response_profile: str = serialization.DEFAULT_PROFILE,
+    x_profile: str = Header(None),
+    db: Session = Depends(get_db),
+    adb: AsyncSession = Depends(get_async_db),
+):
+    serialization.check_profile(response_profile)
+    request_id = profiling.new_request_id()
+    profile_mode = profiling.choose_mode(x_profile)
     
-    # Run AI Analysis
-    # Pass DB session to allow learning from history
-    result_data = analyze_image(file_location, db, user_material=material)
+    with profiling.timed() as elapsed:
+        # Save uploaded file (content-addressed: identical uploads are stored once)
+        with metrics.stage("upload_io"):
+            blob = blob_store.save_stream(file.file)
+        file_location = blob.path
+        
+        # Run AI Analysis
+        # Pass DB session to allow learning from history
+        with metrics.track_in_flight():
+            if qos.QOS_MODE:
+                # Off the event loop so queued requests are visible to the router and can be degraded.
+                # The profiler is enabled in the worker thread, where the analysis runs
+                result_data, capture = await run_in_threadpool(
+                    profiling.call_captured, request_id, profile_mode,
+                    qos.analyze, file_location, db, material, source_id,
+                )
+            else:
+                with profiling.capture(request_id, profile_mode) as capture:
+                    result_data = analyze_image(file_location, db, user_material=material, defer_embedding=True, source_id=source_id)
+        
+        # Save to Database
+        db_scan = ScanResult(
+            filename=file.filename,
+            category=result_data["category"],
+            material=result_data["material"],
+            weight=result_data["weight"],
+            confidence=result_data["confidence"],
+            object_count=result_data.get("object_count", 1),
+            embedding=json.dumps(result_data.get("embedding")) if result_data.get("embedding") else None,
+            embedding_status=result_data.get("embedding_status"),
+            embedding_version=result_data.get("embedding_version"),
+            phash=result_data.get("phash"),
+            detected_objects=json.dumps(result_data.get("waste_objects", [])),
+            prediction_method=result_data.get("prediction_method"),
+            blob_hash=blob.sha256,
+            qos_level=result_data.get("qos_level")
+        )
+        with metrics.stage("db_commit"):
+            adb.add(db_scan)
+            if result_data.get("objects"):
+                await adb.flush()
+                adb.add_all(object_weights.to_rows(db_scan.id, result_data))
+            await adb.commit()
+    
+    # Embedding not needed for this answer: compute it after the response is sent
+    if result_data.get("embedding_status") == "pending":
+        background.submit_embedding(db_scan.id, file_location)
+    if blob.created:
+        # Thumbnails first: the quota check may evict this original once verified
+        background.submit_thumbnails(blob.sha256, file_location)
+        background.submit_quota_check()
+    if qos.QOS_MODE:
+        background.submit_qos_rerun()
+    
+    profiling.slow_log.record(
+        request_id,
+        elapsed["seconds"],
+        stages=metrics.current_trace(),
+        profile_file=capture.filename,
+        scan_id=db_scan.id,
+        filename=db_scan.filename,
+        prediction_method=result_data.get("prediction_method"),
+    )
+    headers = {"X-Request-ID": request_id}
+    if capture.filename:
+        headers["X-Profile-Trace"] = str(request.url_for("get_profile", filename=capture.filename))
+    
+    content = serialization.shape({
+        "id": db_scan.id,
+        "filename": db_scan.filename,
+        **result_data
+    }, response_profile)
+    return serialization.negotiated_response(request, content, headers=headers)
+
+@app.post("/analyze_video")
+def analyze_video_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    material: str = None,
+    response_profile: str = serialization.DEFAULT_PROFILE,
+    db: Session = Depends(get_db),
+):
+    # Sync endpoint: FastAPI runs it in the threadpool, so a long video does not block the event loop
+    from video_analyzer import analyze_video
+    
+    serialization.check_profile(response_profile)
+    
+    with metrics.stage("upload_io"):
+        blob = blob_store.save_stream(file.file)
+    file_location = blob.path
+    
+    with metrics.track_in_flight():
+        try:
+            result_data = analyze_video(file_location, db, user_material=material)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    metrics.record_prediction_method(result_data["prediction_method"])
     
-    # Save to Database
     db_scan = ScanResult(
         filename=file.filename,
         category=result_data["category"],
         material=result_data["material"],
         weight=result_data["weight"],
         confidence=result_data["confidence"],
-        object_count=result_data.get("object_count", 1),
-        embedding=json.dumps(result_data.get("embedding")) if result_data.get("embedding") else None
+        object_count=result_data["object_count"],
+        detected_objects=json.dumps(result_data["waste_objects"]),
+        prediction_method=result_data["prediction_method"],
+        blob_hash=blob.sha256
     )
-    db.add(db_scan)
-    db.commit()
-    db.refresh(db_scan)
+    with metrics.stage("db_commit"):
+        db.add(db_scan)
+        db.commit()
+        db.refresh(db_scan)
+    if blob.created:
+        background.submit_quota_check()
     
-    return {
+    content = serialization.shape({
         "id": db_scan.id,
         "filename": db_scan.filename,
         **result_data
-    }
+    }, response_profile)
+    return serialization.negotiated_response(request, content)
+
+@app.websocket("/ws/camera")
+async def camera_stream(websocket: WebSocket, material: str = None, source_id: str = None):
+    """
+    Live camera: the client sends JPEG frames as binary messages and gets one
+    JSON result per processed frame. Frames arriving while inference is busy
+    replace each other, so only the newest one is analyzed.
+    """
+    from io import BytesIO
+    from PIL import Image
+    
+    await websocket.accept()
+    slot = live_stream.LatestFrameSlot()
+    stats = live_stream.StreamStats()
+    db = SessionLocal()
+    
+    async def receive_frames():
+        try:
+            while True:
+                slot.put(await websocket.receive_bytes())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            slot.close()
+    
+    def analyze_frame(frame_bytes):
+        image = Image.open(BytesIO(frame_bytes))
+        image.load()
+        return analyze_image(image, db, user_material=material, defer_embedding=True, source_id=source_id)
+    
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            frame_bytes = await slot.get()
+            if frame_bytes is None:
+                break
+            try:
+                with metrics.track_in_flight():
+                    result = await run_in_threadpool(analyze_frame, frame_bytes)
+            except Exception as e:
+                await websocket.send_json({"error": f"Frame could not be analyzed: {e}"})
+                continue
+            stats.record_processed()
+            await websocket.send_json({
+                "object_count": result.get("object_count", 0),
+                "weight": result["weight"],
+                "detected_objects": result.get("waste_objects", []),
+                "prediction_method": result.get("prediction_method"),
+                **stats.snapshot(slot),
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        db.close()
 
 @app.put("/scan/{scan_id}/update_weight")
-def update_weight(scan_id: int, actual_weight: float, category: str = None, db: Session = Depends(get_db)):
-    scan = db.query(ScanResult).filter(ScanResult.id == scan_id).first()
+async def update_weight(scan_id: int, actual_weight: float, category: str = None, db: AsyncSession = Depends(get_async_db)):
+    scan = await db.get(ScanResult, scan_id)
     if not scan:
         return {"error": "Scan not found"}
     
@@ -75,13 +282,139 @@ def update_weight(scan_id: int, actual_weight: float, category: str = None, db:
         # Also update material to match category so future AI lookups for this material type use this weight
         scan.material = category 
         
-    db.commit()
+    await db.commit()
+    # Verified scans make their originals evictable
+    background.submit_quota_check()
     return {"message": "Weight and Category updated successfully", "new_weight": actual_weight, "new_category": category}
 
+@app.post("/scans/corrections")
+async def bulk_corrections(request: Request, format: str = None, dry_run: bool = False):
+    """
+    Ground-truth weights for many scans at once (e.g. a weighbridge export).
+    Body: CSV with scan_id,actual_weight[,category] or NDJSON with the same keys.
+    """
+    content_type = request.headers.get("content-type", "")
+    if format is None and "csv" in content_type:
+        format = "csv"
+    elif format is None and "ndjson" in content_type:
+        format = "ndjson"
+    try:
+        text = (await request.body()).decode("utf-8-sig")
+        rows, errors = corrections.parse_corrections(text, format)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def apply():
+        db = SessionLocal()
+        try:
+            return corrections.apply_corrections(db, rows, dry_run=dry_run)
+        finally:
+            db.close()
+    
+    report = await run_in_threadpool(apply)
+    report["errors"] = errors
+    if report["applied"]:
+        # Verified scans make their originals evictable
+        background.submit_quota_check()
+    return report
+
+@app.get("/scan/{scan_id}/thumbnail")
+def get_thumbnail(
+    scan_id: int,
+    size: str = thumbnails.DEFAULT_SIZE,
+    accept: str = Header(None),
+    if_none_match: str = Header(None),
+    db: Session = Depends(get_db),
+):
+    # Small cached rendition of the scan image for history views (WebP when accepted)
+    if size not in thumbnails.THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(thumbnails.THUMBNAIL_SIZES)}")
+    scan = db.query(ScanResult).filter(ScanResult.id == scan_id).first()
+    if not scan or not scan.blob_hash:
+        raise HTTPException(status_code=404, detail="No stored image for this scan")
+    
+    fmt = thumbnails.choose_format(accept)
+    etag = thumbnails.etag(scan.blob_hash, size, fmt)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    path = thumbnails.get_rendition(blob_store.blob_path(scan.blob_hash), scan.blob_hash, size, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Original image no longer stored, or not an image")
+    # FileResponse adds Last-Modified and serves Range requests
+    return FileResponse(path, media_type=thumbnails.MEDIA_TYPES[fmt], headers=headers)
+
 @app.get("/history")
-def get_history(db: Session = Depends(get_db)):
-    scans = db.query(ScanResult).order_by(ScanResult.timestamp.desc()).limit(20).all()
-    return scans
+async def get_history(
+    request: Request,
+    response_profile: str = serialization.DEFAULT_PROFILE,
+    db: AsyncSession = Depends(get_async_db),
+):
+    serialization.check_profile(response_profile)
+    
+    async def build():
+        result = await db.execute(select(ScanResult).order_by(ScanResult.timestamp.desc()).limit(20))
+        return [serialization.scan_to_dict(scan, response_profile) for scan in result.scalars().all()]
+    
+    # Polling dashboards get 304 (or a cached body) until a scan is added or corrected
+    return await data_version.versioned_response(request, db, ("history", response_profile), build)
+
+@app.get("/debug/slow_requests")
+def get_slow_requests(request: Request, limit: int = 20):
+    # Slowest recent /analyze calls with per-stage timings and a link to their trace
+    entries = profiling.slow_log.slowest(limit)
+    for entry in entries:
+        if entry["profile_file"]:
+            entry["profile_url"] = str(request.url_for("get_profile", filename=entry["profile_file"]))
+    return entries
+
+@app.get("/debug/profiles/{filename}", name="get_profile")
+def get_profile(filename: str):
+    path = profiling.profile_path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=filename)
+
+@app.get("/debug/cascade")
+def get_cascade_stats():
+    # Escalation rate and estimated latency saved by cascaded detection
+    return cascade.stats.report()
+
+@app.get("/debug/qos")
+def get_qos_stats():
+    # Routing decisions, backlog and per-level service times of the overload router
+    return qos.router.report()
+
+@app.get("/debug/models")
+def get_models_report():
+    # Loaded models, their memory, use and evictions (see model_manager.py)
+    return model_manager.manager.report()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus scrape target
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def preload_models():
+    # Models of the default path load now instead of on the first request (MODEL_PRELOAD)
+    model_manager.manager.preload()
+
+@app.on_event("startup")
+def warn_stale_embeddings():
+    # Embeddings of another (or, from before versioning, no) version are skipped by k-NN until backfilled
+    from backfill_embeddings import warn_stale
+    db = SessionLocal()
+    try:
+        warn_stale(db)
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def shutdown_background_workers():
+    # Unfinished jobs leave embedding_status="pending"; they can be recomputed later
+    background.shutdown(wait=False)
 
 @app.get("/")
 def read_root():
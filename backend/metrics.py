@@ -0,0 +1,306 @@
+"""
+Lightweight in-process metrics for WasteVisionAI
+Stage timing spans, counters and gauges exposed in Prometheus text format
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Set WASTE_METRICS=0 to turn every span and counter into a no-op
+METRICS_ENABLED = os.environ.get("WASTE_METRICS", "1") != "0"
+
+# Latency buckets (seconds) shared by all histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ============================================================================
+# METRIC TYPES
+# ============================================================================
+
+class _Histogram:
+    """Cumulative histogram for a single label set"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of counters, gauges and histograms.
+    Label sets are stored as sorted tuples so they can be used as dict keys.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def add_gauge(self, name, delta, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(LATENCY_BUCKETS)
+            hist.observe(value)
+
+    def get_counter(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_gauge(self, name, **labels):
+        return self._gauges.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {
+                key: (list(h.counts), h.sum, h.count, h.buckets)
+                for key, h in self._histograms.items()
+            }
+
+        lines = []
+        lines += self._render_simple(counters, "counter")
+        lines += self._render_simple(gauges, "gauge")
+
+        for name in sorted({key[0] for key in histograms}):
+            lines += self._header(name, "histogram")
+            for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_simple(self, values, metric_type):
+        lines = []
+        for name in sorted({key[0] for key in values}):
+            lines += self._header(name, metric_type)
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+    def _header(self, name, metric_type):
+        lines = []
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        return lines
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# ============================================================================
+# GLOBAL REGISTRY
+# ============================================================================
+
+registry = MetricsRegistry()
+
+registry.describe("waste_stage_duration_seconds", "Time spent in each analysis stage")
+registry.describe("waste_http_request_duration_seconds", "End-to-end HTTP request latency")
+registry.describe("waste_http_requests_total", "HTTP requests by route and status code")
+registry.describe("waste_prediction_method_total", "Predictions by the method that produced the weight")
+registry.describe("waste_cache_hits_total", "Cache lookups that were served from a cache")
+registry.describe("waste_cache_misses_total", "Cache lookups that fell through to full work")
+registry.describe("waste_cascade_total", "Cascade first passes accepted or escalated to the full model")
+registry.describe("waste_tiled_total", "Images re-detected with tiled inference, by trigger")
+registry.describe("waste_analyze_in_flight", "Analyze requests currently queued or running")
+registry.describe("waste_process_resident_memory_bytes", "Resident set size of this process")
+registry.describe("waste_process_proportional_memory_bytes",
+                  "Proportional set size: shared pages divided among the processes mapping them")
+
+# Per-request stage breakdown: {stage_name: seconds}, None outside a request
+_current_trace = ContextVar("waste_current_trace", default=None)
+
+
+# ============================================================================
+# INSTRUMENTATION API
+# ============================================================================
+
+@contextmanager
+def stage(name):
+    """
+    Time a named pipeline stage.
+
+    Usage:
+        with metrics.stage("yolo"):
+            results = model(image_path)
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("waste_stage_duration_seconds", elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def track_in_flight(name="waste_analyze_in_flight"):
+    """Count requests currently waiting for or running inference"""
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    registry.add_gauge(name, 1)
+    try:
+        yield
+    finally:
+        registry.add_gauge(name, -1)
+
+
+def start_trace():
+    """Begin collecting a per-request stage breakdown in the current context"""
+    trace = {}
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    """Return the stage breakdown of the current request (or None)"""
+    return _current_trace.get()
+
+
+def observe_request(route, method, status_code, seconds):
+    """Record end-to-end latency of one HTTP request"""
+    if not METRICS_ENABLED:
+        return
+    registry.observe("waste_http_request_duration_seconds", seconds, route=route, method=method)
+    registry.inc("waste_http_requests_total", route=route, method=method, status=str(status_code))
+
+
+def record_prediction_method(method):
+    """Count the method that produced a weight, without per-k detail"""
+    if not METRICS_ENABLED or not method:
+        return
+    registry.inc("waste_prediction_method_total", method=method.split(" (")[0])
+
+
+def record_cache(cache, hit):
+    """Count a cache hit or miss for the named cache"""
+    if not METRICS_ENABLED:
+        return
+    if hit:
+        registry.inc("waste_cache_hits_total", cache=cache)
+    else:
+        registry.inc("waste_cache_misses_total", cache=cache)
+
+
+def process_memory_bytes():
+    """Current resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        # Windows: no /proc and no resource module
+        return 0
+    else:
+        # ru_maxrss is bytes on macOS and kilobytes on Linux
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def read_memory(pid="self"):
+    """
+    Memory breakdown of a process from /proc/<pid>/smaps_rollup (Linux only).
+
+    Returns:
+        dict or None: Bytes for 'rss', 'pss' and 'uss' (private pages only).
+                      PSS is the per-worker figure to use when workers share
+                      model weights copy-on-write; RSS double-counts them.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except (OSError, ValueError):
+        return None
+
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def render_metrics():
+    """Prometheus exposition text; memory is sampled at scrape time only"""
+    registry.set_gauge("waste_process_resident_memory_bytes", process_memory_bytes())
+    memory = read_memory()
+    if memory:
+        registry.set_gauge("waste_process_proportional_memory_bytes", memory["pss"])
+    return registry.render()
@@ -1,23 +1,279 @@
 from ultralytics import YOLO
+import os
 import random
 import json
-from feature_extractor import FeatureExtractor
+import time
+import metrics
+import cascade
+import tiling
+import image_hash
+import change_gate
+import artifact_store
+import object_weights
+import model_manager
+from PIL import Image, ImageOps
+import embedding_projection
+import feature_extractor  # registers the shared "embedding" model
 from predictor import predict_weight
 
-# Initialize Feature Extractor
-feature_extractor = FeatureExtractor()
+# Models are loaded on first use (or at startup, MODEL_PRELOAD) and can be
+# evicted when idle, see model_manager.py
 
-# Load a pretrained YOLOv8 model (small version for better accuracy)
-# YOLOv8s detects 30% more objects than YOLOv8n (13 vs 10 bottles in tests)
-try:
-    model = YOLO("yolov8s.pt")
+def _load_yolo():
+    # Pretrained YOLOv8 small: detects 30% more objects than YOLOv8n (13 vs 10 bottles in tests)
+    detector = YOLO(artifact_store.cached_file("yolov8s.pt"))
     print("[Model] Loaded YOLOv8s (Small) for improved accuracy")
-except Exception as e:
-    print(f"Error loading YOLO model: {e}")
-    model = None
+    return detector
 
-def analyze_image(image_path, db=None, user_material=None):
-    if not model:
+def _load_fast_yolo():
+    # Cheap first-pass model for cascade mode (CASCADE_MODE=1)
+    detector = YOLO(cascade.CASCADE_MODEL)
+    print(f"[Model] Cascade enabled: {cascade.CASCADE_MODEL} @ {cascade.CASCADE_IMGSZ}px first, YOLOv8s on escalation")
+    return detector
+
+model_manager.manager.register("yolo", _load_yolo)
+if cascade.CASCADE_MODE:
+    model_manager.manager.register("yolo_fast", _load_fast_yolo)
+
+def embedding_model():
+    """Hold the shared FeatureExtractor: `with embedding_model() as extractor:`"""
+    return model_manager.manager.acquire("embedding")
+
+def _cascade_available():
+    return cascade.CASCADE_MODE and model_manager.manager.available("yolo_fast")
+
+# Define classes that are likely hallucinations in a waste context
+# "teddy bear" often triggers on crumpled plastic/paper textures
+BLOCKED_CLASSES = {
+    "teddy bear", "person", "giraffe", "zebra", "horse", "dog", "cat", 
+    "backpack", "umbrella", "handbag", "tie", "suitcase", "bed", "toilet",
+    "refrigerator", "oven", "microwave", "toaster", "sink", "dining table",
+    "chair", "couch", "tv", "laptop", "keyboard", "mouse", "remote",
+    "cell phone", "book", "clock", "vase", "scissors", "hair drier", "toothbrush"
+}
+
+# Run detection with VERY lower confidence threshold to catch crumpled bottles
+EXIF_ORIENTATION = 0x0112
+DETECTION_CONF = 0.05
+HIGH_CONF_THRESH = 0.25
+
+def _boxes_to_detections(result, names):
+    """Convert one ultralytics result into dicts, dropping blocked classes"""
+    detections = []
+    for box in result.boxes:
+        name = names[int(box.cls[0])]
+        
+        # Filter out blocked classes (always ignore these)
+        if name in BLOCKED_CLASSES:
+            continue
+        
+        detections.append({
+            "name": name,
+            "conf": float(box.conf[0]),
+            "box": [float(v) for v in box.xyxy[0]],
+        })
+    return detections
+
+def _detector_input(image):
+    """
+    Paths are decoded here: uploads are stored without a file extension
+    (blob_store.py) and ultralytics only accepts image paths by extension.
+    """
+    return load_image(image) if isinstance(image, (str, os.PathLike)) else image
+
+def _detect(name, image, **kwargs):
+    """Run one YOLO model (by manager name) and return the non-blocked detections as dicts"""
+    with model_manager.manager.acquire(name) as detector:
+        results = detector(_detector_input(image), conf=DETECTION_CONF, **kwargs)
+        
+        detections = []
+        for result in results:
+            detections.extend(_boxes_to_detections(result, detector.names))
+    return detections
+
+def load_image(image):
+    """
+    Accept a path or a PIL image; return an upright RGB PIL image.
+    The EXIF orientation is applied (as cv2.imread did for the paths given
+    to YOLO before, and as the thumbnails do), so phone photos are detected
+    upright and their boxes match the renditions.
+    """
+    img = image if isinstance(image, Image.Image) else Image.open(image)
+    if img.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        img = ImageOps.exif_transpose(img)
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+def detect_tiled(image):
+    """
+    Detect on overlapping tiles (batched through the full model) and merge
+    them with cross-tile NMS.
+    """
+    pil_image = load_image(image)
+    tiles = tiling.make_tiles(*pil_image.size)
+    crops = [pil_image.crop(tile) for tile in tiles]
+    
+    detections = []
+    with model_manager.manager.acquire("yolo") as model:
+        for batch_start in range(0, len(crops), tiling.TILE_BATCH):
+            batch = crops[batch_start:batch_start + tiling.TILE_BATCH]
+            results = model(batch, conf=DETECTION_CONF, imgsz=tiling.TILE_SIZE)
+            for offset, result in enumerate(results):
+                index = batch_start + offset
+                detections.extend(tiling.offset_detections(
+                    _boxes_to_detections(result, model.names), tiles[index], index
+                ))
+    return detections
+
+def run_detection(image, reduced=False):
+    """
+    Detect objects, using the cascade when enabled.
+    
+    With reduced=True (overload, see qos.py) only the cheap pass runs: the
+    cascade model if loaded, otherwise YOLOv8s at the cascade's lower imgsz.
+    
+    Returns:
+        (detections, detection_path): detection_path is "full", "fast",
+        "escalated:<reason>" or "reduced"
+    """
+    fast = _cascade_available()
+    if reduced:
+        with metrics.stage("yolo_reduced"):
+            detections = _detect("yolo_fast" if fast else "yolo", image, imgsz=cascade.CASCADE_IMGSZ)
+        return detections, "reduced"
+    
+    if not fast:
+        start = time.perf_counter()
+        with metrics.stage("yolo"):
+            detections = _detect("yolo", image)
+        cascade.stats.record_full(time.perf_counter() - start)
+        return detections, "full"
+    
+    start = time.perf_counter()
+    with metrics.stage("yolo_fast"):
+        fast_detections = _detect("yolo_fast", image, imgsz=cascade.CASCADE_IMGSZ)
+    fast_seconds = time.perf_counter() - start
+    
+    reason = cascade.escalation_reason(fast_detections, HIGH_CONF_THRESH)
+    if reason is None:
+        cascade.stats.record_accepted(fast_seconds)
+        metrics.registry.inc("waste_cascade_total", outcome="accepted")
+        return fast_detections, "fast"
+    
+    cascade.stats.record_escalated(reason, fast_seconds)
+    metrics.registry.inc("waste_cascade_total", outcome="escalated", reason=reason)
+    
+    start = time.perf_counter()
+    with metrics.stage("yolo"):
+        detections = _detect("yolo", image)
+    cascade.stats.record_full(time.perf_counter() - start)
+    return detections, f"escalated:{reason}"
+
+# Fallback heuristics (Defaults from User Guide)
+DEFAULT_UNIT_WEIGHTS = {
+    "Plastic": 0.020, # UPDATED: 0.020kg per bottle as requested
+    "Glass": 0.250,
+    "Metal": 0.050,
+    "Paper": 0.020,
+    "Organic": 0.100,
+    "Mixed Waste": 0.050,
+    "Mixed": 0.050
+}
+
+def unit_weight(material, db=None):
+    """
+    Weight per detected item for a material.
+    
+    Returns:
+        (avg_weight_per_item, prediction_method): learned from verified scans
+        when available, otherwise the default for the material
+    """
+    if db:
+        from database import ScanResult # Local import to avoid circular dependency
+        from sqlalchemy import func
+        
+        # Query average of ACTUAL weights where available
+        with metrics.stage("learned_avg_query"):
+            stats = db.query(
+                func.sum(ScanResult.actual_weight), 
+                func.sum(ScanResult.object_count)
+            ).filter(
+                ScanResult.material == material,
+                ScanResult.actual_weight != None
+            ).first()
+        
+        if stats[0] and stats[1] and stats[1] > 0:
+            avg_weight_per_item = stats[0] / stats[1]
+            print(f"DEBUG: Learning active. Found {stats[1]} items. Avg weight: {avg_weight_per_item}")
+            return avg_weight_per_item, "Count x Learned Avg"
+    
+    return DEFAULT_UNIT_WEIGHTS.get(material, 0.050), "Count x Default Avg"
+
+def detect_batch(images):
+    """Run the full model on a batch of images (paths, PIL images or BGR arrays)"""
+    with model_manager.manager.acquire("yolo") as model:
+        results = model([_detector_input(image) for image in images], conf=DETECTION_CONF)
+        return [_boxes_to_detections(result, model.names) for result in results]
+
+def _reuse_near_duplicate(phash, db, material):
+    """Result of a recent scan whose frame is within NEAR_DUP_RADIUS bits, or None"""
+    from database import ScanResult
+    
+    with metrics.stage("near_duplicate_lookup"):
+        image_hash.near_duplicates.sync(db)
+        match = image_hash.near_duplicates.find(image_hash.hex_to_hash(phash), material)
+        if match is None:
+            return None
+        scan_id, distance = match
+        scan = db.query(ScanResult).filter(ScanResult.id == scan_id).first()
+    if scan is None:
+        return None
+    
+    # A verified weight beats the earlier estimate
+    weight = scan.actual_weight if scan.actual_weight is not None else scan.weight
+    detected_objects = json.loads(scan.detected_objects) if scan.detected_objects else []
+    object_count = scan.object_count or 0
+    print(f"DEBUG: Near-duplicate of scan {scan_id} (distance {distance}), reusing its result")
+    
+    return {
+        "weight": round(weight or 0.0, 3),
+        "confidence": scan.confidence,
+        "category": scan.category,
+        "material": scan.material,
+        "detected_objects": detected_objects if detected_objects else ["No objects detected"],
+        "low_conf_objects": [],
+        "waste_objects": detected_objects,
+        "object_count": object_count,
+        "embedding": json.loads(scan.embedding) if scan.embedding else None,
+        "embedding_status": scan.embedding_status if scan.embedding else "pending",
+        "embedding_version": scan.embedding_version if scan.embedding else None,
+        "phash": phash,
+        "prediction_method": f"Near-Duplicate Reuse (scan {scan_id}, distance {distance})",
+        "description": f"Same scene as scan {scan_id}",
+        "detection_path": "reused",
+        "reused_scan_id": scan_id,
+        "avg_weight_used": round(weight / object_count, 3) if weight and object_count else 0.0
+    }
+
+def detect_region(image, region):
+    """Detect only inside `region` (x0, y0, x1, y1) and return image-coordinate boxes"""
+    crop = load_image(image).crop(region)
+    return tiling.offset_detections(_detect("yolo", crop), region, "region")
+
+def analyze_image(image_path, db=None, user_material=None, defer_embedding=False, source_id=None, reduced=False):
+    """
+    Detect, count and weigh the objects in an image.
+    
+    reduced=True trades accuracy for latency under overload: a single cheap
+    detection pass and no tiling.
+    
+    With defer_embedding=True the embedding is only computed here when the
+    k-NN fallback needs it; otherwise "embedding_status" is "pending" and the
+    caller is expected to compute it in the background.
+    
+    With a source_id (fixed camera), frames that did not change since the
+    last processed frame of that source return the previous result.
+    """
+    if not model_manager.manager.available("yolo"):
         # Fallback if model fails to load
         return {
             "weight": round(random.uniform(0.1, 2.5), 2),
@@ -27,43 +283,80 @@ def analyze_image(image_path, db=None, user_material=None):
             "detected_objects": ["Model Error"]
         }
 
-    # Define classes that are likely hallucinations in a waste context
-    # "teddy bear" often triggers on crumpled plastic/paper textures
-    BLOCKED_CLASSES = {
-        "teddy bear", "person", "giraffe", "zebra", "horse", "dog", "cat", 
-        "backpack", "umbrella", "handbag", "tie", "suitcase", "bed", "toilet",
-        "refrigerator", "oven", "microwave", "toaster", "sink", "dining table",
-        "chair", "couch", "tv", "laptop", "keyboard", "mouse", "remote",
-        "cell phone", "book", "clock", "vase", "scissors", "hair drier", "toothbrush"
-    }
+    # Decoded once; every stage below works on the same upright image
+    with metrics.stage("decode"):
+        image = load_image(image_path)
+    
+    # Fixed cameras: skip inference entirely when the scene has not changed
+    gate_decision = None
+    if source_id:
+        with metrics.stage("change_gate"):
+            frame_signature = change_gate.signature(image)
+            frame_size = image.size
+            gate_decision = change_gate.gate.check(source_id, frame_signature, frame_size)
+        previous = gate_decision.previous
+        if previous is not None and previous.result["material"] != (user_material or "Mixed"):
+            # Same scene but a different material: weights must be recomputed
+            gate_decision = change_gate.GateDecision(previous=previous)
+        metrics.record_cache("change_gate", gate_decision.unchanged)
+        if gate_decision.unchanged:
+            result = dict(previous.result)
+            result["prediction_method"] = f"Unchanged Scene ({previous.result['prediction_method']})"
+            result["detection_path"] = "gated"
+            metrics.record_prediction_method(result["prediction_method"])
+            return result
+    
+    # Fingerprint the frame; nearly identical recent frames reuse the earlier result
+    with metrics.stage("phash"):
+        try:
+            phash = image_hash.hash_to_hex(image_hash.dhash(image))
+        except Exception as e:
+            print(f"Error hashing image: {e}")
+            phash = None
+    
+    if phash and db is not None and image_hash.NEAR_DUP_ENABLED:
+        reused = _reuse_near_duplicate(phash, db, user_material or "Mixed")
+        metrics.record_cache("near_duplicate", reused is not None)
+        if reused:
+            metrics.record_prediction_method(reused["prediction_method"])
+            return reused
 
-    # Run detection with VERY lower confidence threshold to catch crumpled bottles
-    results = model(image_path, conf=0.05)
+    if gate_decision is not None and gate_decision.region is not None:
+        # Small localized change: keep the previous boxes elsewhere, re-detect the region
+        with metrics.stage("yolo_region"):
+            fresh = detect_region(image, gate_decision.region)
+        detections = change_gate.merge_region_detections(
+            gate_decision.previous.detections, fresh, gate_decision.region
+        )
+        detection_path = "region"
+        trigger = None
+    else:
+        detections, detection_path = run_detection(image, reduced=reduced)
+        
+        # Large or crowded photos: re-detect on tiles so small bottles are not lost at 640 px
+        width, height = image.size
+        trigger = None if reduced else tiling.tiling_trigger(width, height, detections, HIGH_CONF_THRESH)
+    if trigger:
+        with metrics.stage("yolo_tiled"):
+            tiled = detect_tiled(image)
+            # Keep the whole-image pass too: it sees objects larger than one tile
+            detections = tiling.merge_detections(detections + tiled)
+        metrics.registry.inc("waste_tiled_total", trigger=trigger)
+        detection_path += f"+tiled:{trigger}"
     
     # Process results
     detected_objects = []   # High confidence (standard)
     low_conf_objects = []   # Low confidence (requires user check)
     confidence_sum = 0
     
-    HIGH_CONF_THRESH = 0.25
-    
-    for result in results:
-        for box in result.boxes:
-            class_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            name = model.names[class_id]
-            
-            # Filter out blocked classes (always ignore these)
-            if name in BLOCKED_CLASSES:
-                continue
-            
-            if conf >= HIGH_CONF_THRESH:
-                detected_objects.append(name)
-                confidence_sum += conf
-            elif name == 'bottle':  
-                # Only offer low-confidence fallback for BOTTLES as requested
-                # This avoids suggesting "low confidence dining table" etc.
-                low_conf_objects.append(name)
+    for det in detections:
+        if det["conf"] >= HIGH_CONF_THRESH:
+            detected_objects.append(det["name"])
+            confidence_sum += det["conf"]
+        elif det["name"] == 'bottle':  
+            # Only offer low-confidence fallback for BOTTLES as requested
+            # This avoids suggesting "low confidence dining table" etc.
+            low_conf_objects.append(det["name"])
                 
     # Use only HIGH CONF object count for default weight estimation
     # User can add low conf items interacting with Frontend
@@ -73,6 +366,7 @@ def analyze_image(image_path, db=None, user_material=None):
     category = "Mixed Waste"
     material = "Mixed"
     weight_estimate = 0.0
+    objects = object_embeddings = None
             
     # Override if user provided material (Always apply this)
     if user_material:
@@ -84,41 +378,20 @@ def analyze_image(image_path, db=None, user_material=None):
         
         # KEY CHANGE: Dynamic Weight Calculation
         # Check DB for previous actual weights for this material
-        avg_weight_per_item = None
-        if db:
-            from database import ScanResult # Local import to avoid circular dependency
-            from sqlalchemy import func
-            
-            # Query average of ACTUAL weights where available
-            stats = db.query(
-                func.sum(ScanResult.actual_weight), 
-                func.sum(ScanResult.object_count)
-            ).filter(
-                ScanResult.material == material,
-                ScanResult.actual_weight != None
-            ).first()
-            
-            if stats[0] and stats[1] and stats[1] > 0:
-                avg_weight_per_item = stats[0] / stats[1]
-                print(f"DEBUG: Learning active. Found {stats[1]} items. Avg weight: {avg_weight_per_item}")
-        
-        if avg_weight_per_item:
-            weight_estimate = count * avg_weight_per_item
-            prediction_method = "Count x Learned Avg"
-        else:
-            # Fallback heuristics (Defaults from User Guide)
-            defaults = {
-                "Plastic": 0.020, # UPDATED: 0.020kg per bottle as requested
-                "Glass": 0.250,
-                "Metal": 0.050,
-                "Paper": 0.020,
-                "Organic": 0.100,
-                "Mixed Waste": 0.050,
-                "Mixed": 0.050
-            }
-            avg_weight_per_item = defaults.get(material, 0.050)
-            weight_estimate = count * avg_weight_per_item
-            prediction_method = "Count x Default Avg"
+        avg_weight_per_item, prediction_method = unit_weight(material, db)
+        weight_estimate = count * avg_weight_per_item
+
+        # Per-object mode: one batched pass over the crops, k-NN per object
+        if object_weights.PER_OBJECT_MODE and not reduced:
+            with embedding_model() as extractor:
+                per_object = object_weights.estimate(
+                    extractor, image, detections, HIGH_CONF_THRESH,
+                    material, db, avg_weight_per_item, count,
+                )
+            objects, object_embeddings = per_object["objects"], per_object["embeddings"]
+            if per_object["method"]:
+                weight_estimate = per_object["weight"]
+                prediction_method = per_object["method"]
             
     else:
         avg_confidence = 0.0
@@ -127,7 +400,17 @@ def analyze_image(image_path, db=None, user_material=None):
         avg_weight_per_item = 0.0
         
     # 4. Extract Features (Embedding) - Still useful for future analysis
-    embedding = feature_extractor.get_embedding(image_path)
+    # The request path only needs it for the k-NN fallback below
+    needs_embedding = weight_estimate == 0 and db is not None
+    if needs_embedding or not defer_embedding:
+        with metrics.stage("embedding"), embedding_model() as extractor:
+            embedding = extractor.get_embedding(image)
+        # Stored and searched in the (optionally projected) space of the current version
+        embedding, embedding_version = embedding_projection.for_storage(embedding)
+        embedding_status = "ready" if embedding else "failed"
+    else:
+        embedding = embedding_version = None
+        embedding_status = "pending"
     
     # 5. Final Prediction Logic
     # We strictly use the Count x Avg Weight logic as requested.
@@ -138,7 +421,8 @@ def analyze_image(image_path, db=None, user_material=None):
     # If count is 0, try k-NN as a last resort fallback
     if predicted_weight == 0 and embedding and db:
         # Use database to find similar items
-        p_weight, method = predict_weight(embedding, material, db)
+        with metrics.stage("knn"):
+            p_weight, method = predict_weight(embedding, material, db)
         if p_weight is not None:
             predicted_weight = p_weight
             prediction_method = f"k-NN Fallback ({method})"
@@ -157,7 +441,9 @@ def analyze_image(image_path, db=None, user_material=None):
         lc_count = len(low_conf_objects)
         description += f" (+ {lc_count} potential bottles found)"
     
-    return {
+    metrics.record_prediction_method(prediction_method)
+    
+    result = {
         "weight": round(predicted_weight, 3),
         "confidence": round(avg_confidence * 100, 1),
         "category": category,
@@ -167,7 +453,20 @@ def analyze_image(image_path, db=None, user_material=None):
         "waste_objects": detected_objects,
         "object_count": count, 
         "embedding": embedding,
+        "embedding_status": embedding_status,
+        "embedding_version": embedding_version,
+        "phash": phash,
         "prediction_method": prediction_method,
         "description": description,
+        "detection_path": detection_path,
         "avg_weight_used": round(avg_weight_per_item, 3) if avg_weight_per_item else 0.0
     }
+    if objects is not None:
+        result["objects"] = objects
+        result["object_embeddings"] = object_embeddings
+        result["object_embedding_version"] = object_weights.object_version()
+    
+    if source_id:
+        change_gate.gate.update(source_id, frame_signature, frame_size, result, detections)
+    
+    return result
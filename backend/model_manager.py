@@ -0,0 +1,295 @@
+"""
+Shared model registry with lazy loading, reference counting and eviction
+Every model is registered with a loader and built on first use, exactly
+once: a lock per model makes concurrent first requests wait for the same
+load instead of building duplicates. Callers hold a reference while they
+use a model (acquire); only unreferenced models are evicted, either after
+MODEL_IDLE_SECONDS without use or, least recently used first, while the
+loaded models exceed MODEL_MEMORY_BUDGET_MB. An evicted model is loaded
+again on its next use.
+
+    yolo        YOLOv8s detector (model.py)
+    yolo_fast   cascade first-pass detector (CASCADE_MODE=1)
+    embedding   MobileNetV3 feature extractor (feature_extractor.py)
+    neural      MobileNetV3 weight regressor (weight_model.py)
+    lite        V2 Lite material database (weight_model_v2_lite.py)
+
+Models in MODEL_PRELOAD are loaded at server start so the first request
+does not pay for them; all others wait until a request needs them. The
+prefork server (serve.py) preloads them in the parent and pins them: the
+workers share their pages copy-on-write, and evicting them in a worker
+would only replace the shared copy with a private one.
+"""
+
+import ctypes
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# Evict models unused for this long (0 = keep loaded models)
+MODEL_IDLE_SECONDS = float(os.environ.get("MODEL_IDLE_SECONDS", "0"))
+# Evict least recently used models while the loaded ones exceed this (0 = no budget)
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "yolo,embedding")
+# How often the idle sweep runs
+MODEL_SWEEP_SECONDS = float(os.environ.get("MODEL_SWEEP_SECONDS", "30"))
+
+metrics.registry.describe("waste_model_loads_total", "Model loads by model")
+metrics.registry.describe("waste_model_evictions_total", "Model evictions by model and reason")
+metrics.registry.describe("waste_model_bytes", "Estimated memory of each loaded model")
+
+
+class ModelUnavailable(RuntimeError):
+    """The model failed to load; it is not retried until reset()"""
+
+
+def model_bytes(value):
+    """Parameter and buffer bytes of the torch module behind a model object (0 if there is none)"""
+    import torch.nn as nn
+
+    inner = getattr(value, "model", None)
+    for candidate in (value, inner, getattr(inner, "model", None)):
+        if isinstance(candidate, nn.Module):
+            tensors = list(candidate.parameters()) + list(candidate.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+    return 0
+
+
+def _release_memory():
+    """Collect the evicted model and hand freed heap pages back to the OS (glibc)"""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class _Entry:
+    def __init__(self, name, loader, evictable):
+        self.name = name
+        self.loader = loader
+        self.evictable = evictable
+        self.lock = threading.Lock()    # held while loading or evicting this model
+        self.value = None
+        self.error = None
+        self.refs = 0
+        self.size_bytes = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+
+class ModelManager:
+    def __init__(self, idle_seconds=MODEL_IDLE_SECONDS, budget_mb=MODEL_MEMORY_BUDGET_MB,
+                 sweep_seconds=MODEL_SWEEP_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()   # registry, reference counts and last use
+        self._entries = {}
+        self._sweeper = None
+
+    # ------------------------------------------------------------------
+    # Registration and access
+    # ------------------------------------------------------------------
+
+    def register(self, name, loader, evictable=True):
+        """Register a loader; re-registering a name keeps the first one"""
+        with self._lock:
+            self._entries.setdefault(name, _Entry(name, loader, evictable))
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Unknown model '{name}', registered: {sorted(self._entries)}") from None
+
+    def get(self, name):
+        """The model, loading it if needed. Not protected from eviction: prefer acquire()"""
+        entry = self._entry(name)
+        value = self._load(entry)
+        with self._lock:
+            entry.last_used = time.monotonic()
+        return value
+
+    @contextmanager
+    def acquire(self, name):
+        """Hold the model for the duration of the block; it cannot be evicted meanwhile"""
+        entry = self._entry(name)
+        with self._lock:
+            entry.refs += 1
+        try:
+            yield self._load(entry)
+        finally:
+            with self._lock:
+                entry.refs -= 1
+                entry.last_used = time.monotonic()
+
+    def available(self, name):
+        """Whether the model is registered and loads"""
+        if name not in self._entries:
+            return False
+        try:
+            self.get(name)
+            return True
+        except ModelUnavailable:
+            return False
+
+    def preload(self, names=MODEL_PRELOAD, pin=False):
+        """
+        Load the named (comma-separated) models now; unknown or failing ones
+        are skipped. pin=True also exempts them from eviction.
+        """
+        for name in (n.strip() for n in names.split(",")):
+            if name in self._entries and self.available(name) and pin:
+                self._entries[name].evictable = False
+
+    def reset(self, name):
+        """Forget a failed load so the next use tries again"""
+        self._entry(name).error = None
+
+    def _load(self, entry):
+        value = entry.value
+        if value is not None:
+            return value
+
+        # Double-checked: only the first caller loads, concurrent callers wait for it
+        with entry.lock:
+            value = entry.value
+            if value is None:
+                if entry.error is not None:
+                    raise ModelUnavailable(f"{entry.name} failed to load: {entry.error}")
+                before = metrics.process_memory_bytes()
+                start = time.perf_counter()
+                try:
+                    value = entry.loader()
+                except Exception as e:
+                    entry.error = e
+                    print(f"[Models] Failed to load {entry.name}: {e}")
+                    raise ModelUnavailable(f"{entry.name} failed to load: {e}") from e
+                entry.load_seconds = time.perf_counter() - start
+                # Torch modules are measured exactly, anything else by the RSS growth
+                entry.size_bytes = model_bytes(value) or max(metrics.process_memory_bytes() - before, 0)
+                entry.loads += 1
+                with self._lock:
+                    entry.value = value
+                    entry.last_used = time.monotonic()
+                metrics.registry.inc("waste_model_loads_total", model=entry.name)
+                metrics.registry.set_gauge("waste_model_bytes", entry.size_bytes, model=entry.name)
+                print(f"[Models] Loaded {entry.name} in {entry.load_seconds:.2f}s "
+                      f"({entry.size_bytes / 2**20:.1f} MiB)")
+            else:
+                return value
+
+        self._enforce_budget(keep=entry)
+        self._start_sweeper()
+        return value
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def evict(self, name, reason="manual"):
+        """Unload the model unless it is in use; returns whether it was unloaded"""
+        entry = self._entry(name)
+        with entry.lock:
+            with self._lock:
+                if entry.value is None or entry.refs or not entry.evictable:
+                    return False
+                entry.value = None
+            entry.evictions += 1
+        metrics.registry.inc("waste_model_evictions_total", model=name, reason=reason)
+        metrics.registry.set_gauge("waste_model_bytes", 0, model=name)
+        print(f"[Models] Evicted {name} ({reason}, {entry.size_bytes / 2**20:.1f} MiB)")
+        _release_memory()
+        return True
+
+    def _idle_candidates(self, exclude=None):
+        """Loaded, evictable and unreferenced entries, least recently used first"""
+        with self._lock:
+            candidates = [
+                e for e in self._entries.values()
+                if e.value is not None and e.evictable and not e.refs and e is not exclude
+            ]
+        return sorted(candidates, key=lambda e: e.last_used)
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(e.size_bytes for e in self._entries.values() if e.value is not None)
+
+    def _enforce_budget(self, keep=None):
+        if self.budget_bytes <= 0:
+            return
+        for entry in self._idle_candidates(exclude=keep):
+            if self.loaded_bytes() <= self.budget_bytes:
+                return
+            self.evict(entry.name, reason="budget")
+        if self.loaded_bytes() > self.budget_bytes:
+            print(f"[Models] Over budget ({self.loaded_bytes() / 2**20:.1f} MiB), "
+                  f"all other models are in use")
+
+    def sweep(self, now=None):
+        """Evict models unused for idle_seconds; returns the evicted names"""
+        if self.idle_seconds <= 0:
+            return []
+        now = time.monotonic() if now is None else now
+        return [
+            entry.name for entry in self._idle_candidates()
+            if now - entry.last_used >= self.idle_seconds and self.evict(entry.name, reason="idle")
+        ]
+
+    def _after_fork(self):
+        # Threads do not survive fork: a sweeper started in the parent is gone
+        self._sweeper = None
+
+    def _start_sweeper(self):
+        if self.idle_seconds <= 0 or self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="model-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(min(self.sweep_seconds, self.idle_seconds))
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[Models] Idle sweep failed: {e}")
+
+    def report(self):
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                e.name: {
+                    "loaded": e.value is not None,
+                    "in_use": e.refs,
+                    "pinned": not e.evictable,
+                    "size_mb": round(e.size_bytes / 2**20, 1),
+                    "idle_seconds": round(now - e.last_used, 1) if e.value is not None else None,
+                    "loads": e.loads,
+                    "evictions": e.evictions,
+                    "load_seconds": round(e.load_seconds, 2),
+                    "error": str(e.error) if e.error is not None else None,
+                }
+                for e in self._entries.values()
+            }
+        return {
+            "loaded_mb": round(self.loaded_bytes() / 2**20, 1),
+            "budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+            "idle_seconds": self.idle_seconds or None,
+            "process_memory_mb": round(metrics.process_memory_bytes() / 2**20, 1),
+            "models": models,
+        }
+
+
+manager = ModelManager()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=manager._after_fork)
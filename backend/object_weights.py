@@ -0,0 +1,180 @@
+"""
+Per-object weight estimation (PER_OBJECT_MODE=1)
+Instead of count x average, every kept detection gets its own weight: the
+detected boxes are cropped and embedded in one batched forward pass
+(FeatureExtractor.get_crop_embeddings) and each crop is matched by k-NN
+against the objects of verified scans of the same material.
+
+Objects of a verified scan are labelled by splitting its actual weight in
+proportion to their estimates at scan time (evenly when not all objects
+were stored). The cost per image is bounded: only the MAX_OBJECTS most
+confident detections are embedded, the rest count at the average weight.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+import metrics
+from embedding_projection import current_version, for_storage_batch
+
+PER_OBJECT_MODE = os.environ.get("PER_OBJECT_MODE", "0") == "1"
+MAX_OBJECTS = int(os.environ.get("MAX_OBJECTS", "16"))
+OBJECT_KNN_K = int(os.environ.get("OBJECT_KNN_K", "5"))
+# Bump when the crop preprocessing changes (square box + margin, roi_align to the input size)
+CROP_VERSION = "crop-1"
+
+
+def object_version():
+    """Version stored with (and required of) crop embeddings used for per-object k-NN"""
+    return f"{current_version()}+{CROP_VERSION}"
+
+
+def select_objects(detections, high_conf_thresh):
+    """Kept detections, most confident first, at most MAX_OBJECTS"""
+    kept = sorted((d for d in detections if d["conf"] >= high_conf_thresh), key=lambda d: d["conf"], reverse=True)
+    return kept[:MAX_OBJECTS]
+
+
+# ============================================================================
+# LABELLED OBJECTS
+# ============================================================================
+
+_index_lock = threading.Lock()
+_index_cache = {}   # material -> (data version, embeddings, weights)
+
+
+def _label_objects(rows):
+    """rows: (scan_id, embedding json, estimated weight, actual_weight, object_count)"""
+    by_scan = {}
+    for scan_id, embedding, estimate, actual_weight, object_count in rows:
+        by_scan.setdefault(scan_id, []).append((embedding, estimate or 0.0, actual_weight, object_count))
+
+    X, y = [], []
+    for objects in by_scan.values():
+        actual_weight, object_count = objects[0][2], objects[0][3] or len(objects)
+        estimated_total = sum(estimate for _, estimate, _, _ in objects)
+        for embedding, estimate, _, _ in objects:
+            if len(objects) == object_count and estimated_total > 0:
+                y.append(actual_weight * estimate / estimated_total)
+            else:
+                y.append(actual_weight / object_count)
+            X.append(json.loads(embedding))
+    return np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.float32)
+
+
+def labelled_objects(db, material):
+    """
+    (embeddings, weights) of the objects of verified scans of this material,
+    parsed once per data version.
+    """
+    from database import ScanObject, ScanResult
+    import data_version
+
+    version = data_version.current(db)
+    with _index_lock:
+        cached = _index_cache.get(material)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+    rows = (
+        db.query(ScanObject.scan_id, ScanObject.embedding, ScanObject.weight,
+                 ScanResult.actual_weight, ScanResult.object_count)
+        .join(ScanResult, ScanObject.scan_id == ScanResult.id)
+        .filter(
+            ScanResult.material == material,
+            ScanResult.actual_weight.isnot(None),
+            ScanObject.embedding.isnot(None),
+            ScanObject.embedding_version == object_version(),
+        )
+        .all()
+    )
+    X, y = _label_objects(rows)
+    with _index_lock:
+        _index_cache[material] = (version, X, y)
+    return X, y
+
+
+def knn_weights(embeddings, X, y, k=OBJECT_KNN_K):
+    """Distance-weighted k-NN regression (like KNeighborsRegressor(weights='distance'))"""
+    queries = np.asarray(embeddings, dtype=np.float32)
+    k = min(k, len(X))
+    distances = np.maximum(
+        (queries ** 2).sum(axis=1)[:, None] - 2.0 * queries @ X.T + (X ** 2).sum(axis=1)[None, :], 0.0
+    )
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    weights = []
+    for row, idx in zip(np.sqrt(distances), nearest):
+        d = row[idx]
+        if np.any(d == 0):
+            # Exact matches decide alone
+            weights.append(float(y[idx][d == 0].mean()))
+        else:
+            weights.append(float(np.average(y[idx], weights=1.0 / d)))
+    return weights, k
+
+
+# ============================================================================
+# ESTIMATION
+# ============================================================================
+
+def estimate(extractor, image, detections, high_conf_thresh, material, db, unit_weight, count):
+    """
+    Per-object weights for one image.
+
+    Args:
+        extractor: FeatureExtractor
+        image: Path or PIL image the detections refer to
+        detections: All detections (dicts with name, conf, box)
+        unit_weight: Average weight per item (objects beyond MAX_OBJECTS, and no k-NN data)
+        count: Number of kept detections
+
+    Returns:
+        dict: total weight, method (None = k-NN had no data), objects and their embeddings
+    """
+    selected = select_objects(detections, high_conf_thresh)
+    with metrics.stage("object_embeddings"):
+        embeddings = extractor.get_crop_embeddings(image, [d["box"] for d in selected])
+        embeddings, _ = for_storage_batch(embeddings)
+
+    method = None
+    weights = [unit_weight] * len(selected)
+    if db is not None and selected:
+        with metrics.stage("object_knn"):
+            X, y = labelled_objects(db, material)
+            if len(X) and X.shape[1] == len(embeddings[0]):
+                weights, k = knn_weights(embeddings, X, y)
+                method = f"Per-Object k-NN ({len(selected)} objects, k={k})"
+
+    # Bounded cost: objects beyond MAX_OBJECTS are not embedded and count at the average
+    total = sum(weights) + max(count - len(selected), 0) * unit_weight
+    return {
+        "weight": total,
+        "method": method,
+        "objects": [
+            {"name": d["name"], "conf": round(d["conf"], 3), "box": [round(v, 1) for v in d["box"]], "weight": round(w, 4)}
+            for d, w in zip(selected, weights)
+        ],
+        "embeddings": embeddings,
+    }
+
+
+def to_rows(scan_id, result):
+    """ScanObject rows for the objects of an analyze result"""
+    from database import ScanObject
+
+    version = result.get("object_embedding_version")
+    return [
+        ScanObject(
+            scan_id=scan_id,
+            name=obj["name"],
+            conf=obj["conf"],
+            box=json.dumps(obj["box"]),
+            weight=obj["weight"],
+            embedding=json.dumps(embedding) if embedding else None,
+            embedding_version=version if embedding else None,
+        )
+        for obj, embedding in zip(result.get("objects") or [], result.get("object_embeddings") or [])
+    ]
@@ -4,6 +4,7 @@ from sklearn.neighbors import KNeighborsRegressor
 from sklearn.linear_model import BayesianRidge
 from sqlalchemy import select
 from database import ScanResult
+from embedding_projection import current_version
 
 def predict_weight(current_embedding, material, db):
     """
@@ -14,10 +15,12 @@ def predict_weight(current_embedding, material, db):
 
     # 1. Fetch history for this material
     # We need samples that have BOTH an embedding AND a verified actual_weight
+    # Only embeddings of the current backbone/projection are comparable (see backfill_embeddings.py)
     scans = db.query(ScanResult).filter(
         ScanResult.material == material,
         ScanResult.actual_weight != None,
-        ScanResult.embedding != None
+        ScanResult.embedding != None,
+        ScanResult.embedding_version == current_version()
     ).all()
 
     # Parse data
@@ -42,6 +45,16 @@ def predict_weight(current_embedding, material, db):
     if num_samples < 1:
         return None, "Cold Start"
 
+    return knn_predict(X, y, current_embedding)
+
+
+def knn_predict(X, y, current_embedding):
+    """
+    k-NN estimate from verified samples (embeddings X, actual weights y).
+    Shared with the offline replay (replay_eval.py), which excludes the scan
+    being evaluated from the samples.
+    """
+    num_samples = len(X)
     X = np.array(X)
     y = np.array(y)
     current_embedding = np.array(current_embedding).reshape(1, -1)
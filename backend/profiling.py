@@ -0,0 +1,202 @@
+"""
+Opt-in per-request profiling for /analyze
+Captures cProfile or torch.profiler traces into a bounded on-disk ring
+and keeps a log of the slowest recent requests with their stage breakdown
+"""
+
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+# Fraction of /analyze calls profiled without the X-Profile header (0 = only on request)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Number of recent requests kept for the slow-request report
+SLOW_LOG_SIZE = int(os.environ.get("SLOW_LOG_SIZE", "200"))
+
+
+# ============================================================================
+# CAPTURE
+# ============================================================================
+
+def choose_mode(header_value):
+    """
+    Decide whether (and how) to profile this request.
+
+    Args:
+        header_value: Value of the X-Profile header (None if absent).
+                      "torch" selects torch.profiler, any other truthy value cProfile.
+
+    Returns:
+        str or None: "cprofile", "torch" or None when profiling is off
+    """
+    if header_value:
+        value = header_value.strip().lower()
+        if value in ("0", "false", "off", "no"):
+            return None
+        return "torch" if value == "torch" else "cprofile"
+
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "cprofile"
+    return None
+
+
+class ProfileCapture:
+    """Result holder for one profiled block; `filename` is set when a trace was written"""
+
+    def __init__(self, request_id, mode):
+        self.request_id = request_id
+        self.mode = mode
+        self.filename = None
+
+
+@contextmanager
+def capture(request_id, mode):
+    """
+    Profile the enclosed block and write the trace into PROFILE_DIR.
+    A mode of None makes this a no-op.
+    """
+    holder = ProfileCapture(request_id, mode)
+    if mode is None:
+        yield holder
+        return
+
+    if mode == "torch":
+        try:
+            import torch.profiler
+        except ImportError:
+            print("[Profiling] torch.profiler unavailable, falling back to cProfile")
+            holder.mode = mode = "cprofile"
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+    if mode == "torch":
+        prof = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU],
+            record_shapes=True,
+        )
+        prof.__enter__()
+        try:
+            yield holder
+        finally:
+            prof.__exit__(None, None, None)
+            filename = f"{stamp}_{request_id}.trace.json"
+            try:
+                prof.export_chrome_trace(os.path.join(PROFILE_DIR, filename))
+                holder.filename = filename
+            except Exception as e:
+                print(f"[Profiling] Failed to export torch trace: {e}")
+            _enforce_ring()
+    else:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield holder
+        finally:
+            prof.disable()
+            filename = f"{stamp}_{request_id}.prof"
+            try:
+                prof.dump_stats(os.path.join(PROFILE_DIR, filename))
+                holder.filename = filename
+            except Exception as e:
+                print(f"[Profiling] Failed to write profile: {e}")
+            _enforce_ring()
+
+
+def call_captured(request_id, mode, fn, *args, **kwargs):
+    """
+    Run fn under capture() in the calling thread and return (result, capture).
+    cProfile only sees the thread that enables it: work handed to a thread
+    pool must be profiled there, not around the await.
+    """
+    with capture(request_id, mode) as holder:
+        result = fn(*args, **kwargs)
+    return result, holder
+
+
+def _enforce_ring():
+    """Delete the oldest traces so at most PROFILE_MAX_FILES remain"""
+    try:
+        names = sorted(
+            name for name in os.listdir(PROFILE_DIR)
+            if name.endswith(".prof") or name.endswith(".trace.json")
+        )
+    except OSError:
+        return
+
+    # Names start with a sortable timestamp, so the oldest come first
+    for name in names[:max(len(names) - PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def profile_path(filename):
+    """
+    Resolve a trace filename inside PROFILE_DIR.
+
+    Returns:
+        str or None: Absolute path, or None for unknown / unsafe names
+    """
+    if not filename or os.path.basename(filename) != filename:
+        return None
+    path = os.path.join(PROFILE_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:12]
+
+
+# ============================================================================
+# SLOW REQUEST LOG
+# ============================================================================
+
+class SlowRequestLog:
+    """Bounded log of recent requests, reported slowest first"""
+
+    def __init__(self, maxlen=SLOW_LOG_SIZE):
+        self._entries = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, request_id, duration, stages=None, profile_file=None, **extra):
+        entry = {
+            "request_id": request_id,
+            "timestamp": datetime.now().isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "stages_ms": {name: round(sec * 1000, 2) for name, sec in (stages or {}).items()},
+            "profile_file": profile_file,
+        }
+        entry.update(extra)
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def slowest(self, limit=20):
+        with self._lock:
+            entries = list(self._entries)
+        entries.sort(key=lambda e: e["duration_ms"], reverse=True)
+        return [dict(entry) for entry in entries[:limit]]
+
+
+slow_log = SlowRequestLog()
+
+
+@contextmanager
+def timed():
+    """Yield a dict whose 'seconds' key is filled in when the block exits"""
+    result = {"seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
@@ -0,0 +1,324 @@
+"""
+Adaptive quality of service for /analyze (QOS_MODE=1)
+Each request is routed to the best estimator that is still predicted to
+answer within the latency SLO:
+
+    full     YOLOv8s (+ cascade / tiling), as without QoS
+    reduced  one cheap detection pass, no tiling
+    lite     V2 Lite material database, no detection at all
+
+The prediction is the work already admitted (queued or running detection
+passes, at their tier's recent service time) spread over the detection
+slots, plus the candidate tier's own service time. Degraded results say so
+in prediction_method and are stored with qos_level, and are re-run at full
+quality in the background once nothing is queued any more.
+
+Usage:
+    python qos.py rerun --limit 100      # re-run degraded scans now
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import metrics
+
+QOS_MODE = os.environ.get("QOS_MODE", "0") == "1"
+QOS_SLO_MS = float(os.environ.get("QOS_SLO_MS", "2000"))
+# Detection passes (full or reduced) running at once; more requests wait for a slot
+QOS_CONCURRENCY = int(os.environ.get("QOS_CONCURRENCY", "1"))
+# Re-run degraded scans at full quality when idle (0 = keep degraded results)
+QOS_RERUN = os.environ.get("QOS_RERUN", "1") == "1"
+QOS_RERUN_BATCH = int(os.environ.get("QOS_RERUN_BATCH", "8"))
+
+LEVELS = ("full", "reduced", "lite")
+DEGRADED_LEVELS = ("reduced", "lite")
+DEGRADED_LABELS = {"reduced": "Reduced Quality", "lite": "Overload Fallback"}
+# Starting service-time estimates (seconds), replaced by measurements as requests complete
+INITIAL_SERVICE_SECONDS = {"full": 0.5, "reduced": 0.15, "lite": 0.01}
+
+metrics.registry.describe("waste_qos_routed_total", "Analyze requests by QoS level")
+metrics.registry.describe("waste_qos_backlog_seconds", "Predicted seconds of detection work admitted and not finished")
+metrics.registry.describe("waste_qos_reruns_total", "Degraded scans re-run at full quality")
+
+
+class QosRouter:
+    """Chooses a level per request and keeps the backlog and service-time estimates"""
+
+    def __init__(self, slo_seconds=QOS_SLO_MS / 1000.0, concurrency=QOS_CONCURRENCY, smoothing=0.2):
+        self.slo_seconds = slo_seconds
+        self.concurrency = max(1, concurrency)
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.concurrency)
+        self.service = dict(INITIAL_SERVICE_SECONDS)
+        self.backlog = 0.0      # expected seconds of detection work admitted
+        self.admitted = 0       # detection requests queued or running
+        self.routed = {level: 0 for level in LEVELS}
+        self.reruns = 0
+        # Background re-runs: own slot, invisible to admission so they never degrade live requests
+        self._background_slot = threading.Semaphore(1)
+        self.background = 0
+
+    def _predicted(self, level):
+        if level == "lite":
+            return self.service["lite"]
+        return self.backlog / self.concurrency + self.service[level]
+
+    def predicted_latency(self, level):
+        with self._lock:
+            return self._predicted(level)
+
+    def choose(self):
+        """Best level predicted to meet the SLO; lite when none is"""
+        with self._lock:
+            for level in LEVELS[:-1]:
+                if self._predicted(level) <= self.slo_seconds:
+                    return level
+            return "lite"
+
+    def idle(self):
+        with self._lock:
+            return self.admitted == 0
+
+    def run(self, level, fn, *args, **kwargs):
+        """Call fn at `level`, holding a detection slot unless lite, and learn its service time"""
+        with self._lock:
+            estimate = self.service[level]
+            self.routed[level] += 1
+            if level != "lite":
+                self.backlog += estimate
+                self.admitted += 1
+        metrics.registry.inc("waste_qos_routed_total", level=level)
+        metrics.registry.set_gauge("waste_qos_backlog_seconds", self.backlog)
+        try:
+            if level == "lite":
+                start = time.perf_counter()
+                result = fn(*args, **kwargs)
+            else:
+                with self._slots:
+                    start = time.perf_counter()
+                    result = fn(*args, **kwargs)
+            self._record(level, time.perf_counter() - start)
+            return result
+        finally:
+            if level != "lite":
+                with self._lock:
+                    self.backlog = max(self.backlog - estimate, 0.0)
+                    self.admitted -= 1
+                metrics.registry.set_gauge("waste_qos_backlog_seconds", self.backlog)
+
+    def run_background(self, fn, *args, **kwargs):
+        """Call fn as background work: not admitted, not in the backlog, routing or service times"""
+        with self._background_slot:
+            with self._lock:
+                self.background += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.background -= 1
+
+    def _record(self, level, seconds):
+        with self._lock:
+            self.service[level] += self.smoothing * (seconds - self.service[level])
+
+    def report(self):
+        with self._lock:
+            total = sum(self.routed.values())
+            return {
+                "enabled": QOS_MODE,
+                "slo_ms": round(self.slo_seconds * 1000, 1),
+                "concurrency": self.concurrency,
+                "admitted": self.admitted,
+                "backlog_ms": round(self.backlog * 1000, 1),
+                "predicted_ms": {level: round(self._predicted(level) * 1000, 1) for level in LEVELS},
+                "service_ms": {level: round(seconds * 1000, 1) for level, seconds in self.service.items()},
+                "routed": dict(self.routed),
+                "degraded_rate": round((total - self.routed["full"]) / total, 4) if total else 0.0,
+                "reruns": self.reruns,
+                "reruns_running": self.background,
+            }
+
+
+router = QosRouter()
+
+
+# ============================================================================
+# ROUTING
+# ============================================================================
+
+def _run_full(image_path, db, material, source_id):
+    from model import analyze_image
+    return analyze_image(image_path, db, user_material=material, defer_embedding=True, source_id=source_id)
+
+
+def _run_reduced(image_path, db, material):
+    from model import analyze_image
+    return analyze_image(image_path, db, user_material=material, defer_embedding=True, reduced=True)
+
+
+def _run_rerun(image_path, db, material):
+    from model import analyze_image
+    # Embedding included: degraded scans may not have one yet
+    return analyze_image(image_path, db, user_material=material)
+
+
+def _run_lite(image_path, material):
+    from weight_model_v2_lite import analyze_image_v2
+    result = analyze_image_v2(image_path, material or "Mixed Waste")
+    # Same material/category convention as model.analyze_image
+    result["material"] = material or "Mixed"
+    result["category"] = material or "Mixed Waste"
+    result["detection_path"] = "lite"
+    return result
+
+
+def degrade(result, level):
+    """Mark a result as produced below full quality"""
+    global _rerun_pending
+    result = dict(result)
+    result["prediction_method"] = f"{DEGRADED_LABELS[level]} ({result.get('prediction_method')})"
+    result["qos_level"] = level
+    # Not offered for near-duplicate reuse until it has been re-run at full quality
+    result["phash"] = None
+    _rerun_pending = True
+    return result
+
+
+def analyze(image_path, db=None, material=None, source_id=None):
+    """
+    model.analyze_image behind the router.
+
+    Degraded levels do not use or update the change gate of source_id, so an
+    unchanged camera frame never keeps returning a degraded result.
+    """
+    level = router.choose()
+    if level == "full":
+        return router.run("full", _run_full, image_path, db, material, source_id)
+    if level == "reduced":
+        result = router.run("reduced", _run_reduced, image_path, db, material)
+    else:
+        result = router.run("lite", _run_lite, image_path, material)
+        metrics.record_prediction_method(DEGRADED_LABELS["lite"])
+    print(f"[QoS] Degraded to {level} (predicted full: {router.predicted_latency('full') * 1000:.0f} ms)")
+    return degrade(result, level)
+
+
+# ============================================================================
+# RE-RUN AT FULL QUALITY
+# ============================================================================
+
+_rerun_lock = threading.Lock()
+_rerun_scheduled = False
+_rerun_pending = True   # degraded scans may exist (unknown at startup)
+
+
+def should_rerun():
+    """Claim the re-run job when enabled, idle and there may be work; the caller must submit it"""
+    global _rerun_scheduled
+    if not (QOS_MODE and QOS_RERUN and _rerun_pending) or not router.idle():
+        return False
+    with _rerun_lock:
+        if _rerun_scheduled:
+            return False
+        _rerun_scheduled = True
+        return True
+
+
+def rerun_degraded(db, limit=QOS_RERUN_BATCH, stop_when_busy=True):
+    """
+    Re-analyze degraded, unverified scans at full quality and overwrite
+    their estimate. Scans whose original is gone or whose re-run raises are
+    marked rerun_missing / rerun_failed and not tried again. Re-runs bypass the router's admission accounting, so
+    they never make it degrade live requests; the loop stops before the
+    next scan as soon as a live request is admitted.
+
+    Returns:
+        int: Number of scans re-run
+    """
+    global _rerun_pending
+    import blob_store
+    from database import ScanResult
+
+    scans = (
+        db.query(ScanResult)
+        .filter(ScanResult.qos_level.in_(DEGRADED_LEVELS), ScanResult.actual_weight.is_(None))
+        .order_by(ScanResult.id)
+        .limit(limit)
+        .all()
+    )
+    done = examined = 0
+    for scan in scans:
+        if stop_when_busy and not router.idle():
+            break
+        examined += 1
+        path = blob_store.original_path(scan.blob_hash, scan.filename)
+        if path is None or not os.path.exists(path):
+            scan.qos_level = "rerun_missing"
+            db.commit()
+            continue
+
+        material = None if scan.material == "Mixed" else scan.material
+        try:
+            result = router.run_background(_run_rerun, path, db, material)
+        except Exception as e:
+            # Out of the degraded set, or it would be selected first and block every later run
+            print(f"[QoS] Re-run of scan {scan.id} failed: {e}")
+            db.rollback()
+            scan.qos_level = "rerun_failed"
+            db.commit()
+            continue
+
+        scan.weight = result["weight"]
+        scan.confidence = result["confidence"]
+        scan.category = result["category"]
+        scan.object_count = result.get("object_count", 1)
+        scan.detected_objects = json.dumps(result.get("waste_objects", []))
+        scan.prediction_method = result.get("prediction_method")
+        scan.phash = result.get("phash")
+        if result.get("embedding"):
+            scan.embedding = json.dumps(result["embedding"])
+            scan.embedding_status = result.get("embedding_status")
+            scan.embedding_version = result.get("embedding_version")
+        scan.qos_level = "rerun"
+        db.commit()
+        done += 1
+        metrics.registry.inc("waste_qos_reruns_total")
+
+    if examined == len(scans) < limit:
+        _rerun_pending = False   # caught up; set again by the next degraded result
+    with router._lock:
+        router.reruns += done
+    if done:
+        print(f"[QoS] Re-ran {done} degraded scan(s) at full quality")
+    return done
+
+
+def finish_rerun():
+    global _rerun_scheduled
+    with _rerun_lock:
+        _rerun_scheduled = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run degraded scans at full quality")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rerun = sub.add_parser("rerun")
+    rerun.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(json.dumps({"rerun": rerun_degraded(db, args.limit, stop_when_busy=False)}))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Offline replay of verified scans through every weight estimator
+Each scan with an actual_weight and a stored original is run through the
+selected estimators, and the report gives MAE (overall and per material),
+per-image latency and the memory each estimator adds.
+
+    yolo    YOLOv8s count x learned average per item, k-NN when nothing
+            is detected (model.analyze_image)
+    neural  MobileNetV3 regression (weight_model.py)
+    lite    V2 Lite material database (weight_model_v2_lite.py)
+
+Images are decoded once by a thread pool (the next batch while the current
+one runs) and shared by all estimators; yolo and neural run one forward
+pass per batch. The yolo learned average and its k-NN fallback are computed
+leave-one-out, so a scan never sees its own actual weight. The neural model and the V2 Lite
+database were updated online from these same corrections, so their MAE
+is in-sample and optimistic.
+
+Usage:
+    python replay_eval.py                              # all estimators
+    python replay_eval.py --estimators yolo,lite --batch-size 16 --workers 8
+    python replay_eval.py --max-mae 0.05 --out replay_report.json
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+import blob_store
+import metrics
+from load_test import percentile
+
+ESTIMATORS = ("yolo", "neural", "lite")
+
+
+# ============================================================================
+# DATA
+# ============================================================================
+
+def load_verified(db, limit=None):
+    """
+    Verified scans whose original is still stored.
+
+    Returns:
+        (scans, skipped): scans are dicts with id, material, actual_weight,
+        object_count, path and embedding (None unless stored with the current
+        version); skipped counts scans without an original
+    """
+    from database import ScanResult
+    from embedding_projection import current_version
+
+    query = (
+        db.query(ScanResult.id, ScanResult.material, ScanResult.actual_weight,
+                 ScanResult.object_count, ScanResult.blob_hash, ScanResult.filename,
+                 ScanResult.embedding, ScanResult.embedding_version)
+        .filter(ScanResult.actual_weight.isnot(None))
+        .order_by(ScanResult.id)
+    )
+    if limit:
+        query = query.limit(limit)
+
+    version = current_version()
+    scans, skipped = [], 0
+    for scan_id, material, actual_weight, object_count, blob_hash, filename, embedding, embedding_version in query:
+        path = blob_store.original_path(blob_hash, filename)
+        if path is None or not os.path.exists(path):
+            skipped += 1
+            continue
+        scans.append({
+            "id": scan_id,
+            "material": material or "Mixed",
+            "actual_weight": actual_weight,
+            "object_count": object_count or 0,
+            "path": path,
+            "embedding": json.loads(embedding) if embedding and embedding_version == version else None,
+        })
+    return scans, skipped
+
+
+def _decode(path):
+    try:
+        with Image.open(path) as image:
+            return ImageOps.exif_transpose(image).convert("RGB")
+    except Exception as e:
+        print(f"[Replay] Cannot decode {path}: {e}")
+        return None
+
+
+def iter_batches(scans, batch_size, workers):
+    """Yield (scans, images) per batch; decoding of the next batch overlaps the current one"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batches = [scans[i:i + batch_size] for i in range(0, len(scans), batch_size)]
+        pending = [pool.submit(_decode, scan["path"]) for scan in batches[0]] if batches else []
+        for index, batch in enumerate(batches):
+            current = pending
+            if index + 1 < len(batches):
+                pending = [pool.submit(_decode, scan["path"]) for scan in batches[index + 1]]
+            images = [future.result() for future in current]
+            kept = [(scan, image) for scan, image in zip(batch, images) if image is not None]
+            yield [scan for scan, _ in kept], [image for _, image in kept]
+
+
+# ============================================================================
+# ESTIMATORS
+# ============================================================================
+
+class YoloCountEstimator:
+    """
+    Detected high-confidence objects x learned average per item, and the
+    k-NN estimate when nothing is detected (like model.analyze_image)
+    """
+
+    name = "yolo"
+
+    def __init__(self, scans):
+        # Per material: (sum of actual weights, sum of object counts) of the verified scans
+        self.totals = defaultdict(lambda: [0.0, 0])
+        # Per material: (scan id, stored embedding, actual weight) for the k-NN fallback
+        self.samples = defaultdict(list)
+        for scan in scans:
+            self.totals[scan["material"]][0] += scan["actual_weight"]
+            self.totals[scan["material"]][1] += scan["object_count"]
+            if scan.get("embedding"):
+                self.samples[scan["material"]].append((scan["id"], scan["embedding"], scan["actual_weight"]))
+        self.extractor = None
+
+    def load(self):
+        import model
+        import model_manager
+        self.model = model
+        # Models are lazy: load them here so load time and memory are reported as such
+        model_manager.manager.get("yolo")
+        if model_manager.manager.available("embedding"):
+            self.extractor = model_manager.manager.get("embedding")
+
+    def unit_weight(self, scan):
+        """Learned average without this scan (what model.unit_weight had seen before it)"""
+        weight_sum, count_sum = self.totals[scan["material"]]
+        weight_sum -= scan["actual_weight"]
+        count_sum -= scan["object_count"]
+        if weight_sum > 0 and count_sum > 0:
+            return weight_sum / count_sum
+        return self.model.DEFAULT_UNIT_WEIGHTS.get(scan["material"], 0.050)
+
+    def knn_fallback(self, scan, image):
+        """k-NN over the other verified scans of the material, or 0 (model.analyze_image at count 0)"""
+        from embedding_projection import for_storage
+        from predictor import knn_predict
+
+        others = [(embedding, actual) for scan_id, embedding, actual in self.samples[scan["material"]]
+                  if scan_id != scan["id"]]
+        if not others or self.extractor is None:
+            return 0.0
+        embedding, _ = for_storage(self.extractor.get_embedding(image))
+        others = [(e, actual) for e, actual in others if embedding and len(e) == len(embedding)]
+        if not others:
+            return 0.0
+        weight, _ = knn_predict([e for e, _ in others], [actual for _, actual in others], embedding)
+        return weight
+
+    def predict_batch(self, scans, images):
+        detections = self.model.detect_batch(images)
+        weights = []
+        for scan, image, found in zip(scans, images, detections):
+            count = sum(1 for d in found if d["conf"] >= self.model.HIGH_CONF_THRESH)
+            weights.append(count * self.unit_weight(scan) if count else self.knn_fallback(scan, image))
+        return weights
+
+
+class NeuralEstimator:
+    name = "neural"
+
+    def load(self):
+        from weight_model import get_predictor
+        self.predictor = get_predictor()
+
+    def predict_batch(self, scans, images):
+        return self.predictor.predict_batch(images, [scan["material"] for scan in scans])
+
+
+class LiteEstimator:
+    name = "lite"
+
+    def load(self):
+        from weight_model_v2_lite import get_estimator_v2_lite
+        self.estimator = get_estimator_v2_lite()
+
+    def predict_batch(self, scans, images):
+        return [self.estimator.predict(scan["path"], scan["material"])["weight"] for scan in scans]
+
+
+def make_estimators(names, scans):
+    factories = {
+        "yolo": lambda: YoloCountEstimator(scans),
+        "neural": NeuralEstimator,
+        "lite": LiteEstimator,
+    }
+    unknown = [name for name in names if name not in factories]
+    if unknown:
+        raise ValueError(f"Unknown estimator(s) {unknown}, choose from {list(ESTIMATORS)}")
+    return [factories[name]() for name in names]
+
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+def _mae(errors):
+    return round(sum(errors) / len(errors), 4) if errors else None
+
+
+def replay(scans, estimators, batch_size=16, workers=4):
+    """
+    Run every estimator over the scans.
+
+    Returns:
+        dict: estimator name -> accuracy, latency and memory summary
+    """
+    state = {}
+    for estimator in estimators:
+        before = metrics.process_memory_bytes()
+        start = time.perf_counter()
+        estimator.load()
+        state[estimator.name] = {
+            "load_seconds": time.perf_counter() - start,
+            "load_memory_bytes": metrics.process_memory_bytes() - before,
+            "errors": defaultdict(list),
+            "latencies": [],
+            "failed": 0,
+        }
+
+    decoded = 0
+    for batch, images in iter_batches(scans, batch_size, workers):
+        decoded += len(batch)
+        if not batch:
+            continue
+        for estimator in estimators:
+            entry = state[estimator.name]
+            start = time.perf_counter()
+            try:
+                weights = estimator.predict_batch(batch, images)
+            except Exception as e:
+                print(f"[Replay] {estimator.name} failed on a batch: {e}")
+                entry["failed"] += len(batch)
+                continue
+            per_image = (time.perf_counter() - start) / len(batch)
+            entry["latencies"].extend([per_image] * len(batch))
+            for scan, weight in zip(batch, weights):
+                entry["errors"][scan["material"]].append(abs(weight - scan["actual_weight"]))
+        print(f"[Replay] {decoded}/{len(scans)} scans")
+
+    report = {}
+    for name, entry in state.items():
+        all_errors = [e for errors in entry["errors"].values() for e in errors]
+        latencies = entry["latencies"]
+        report[name] = {
+            "scans": len(all_errors),
+            "failed": entry["failed"],
+            "mae": _mae(all_errors),
+            "mae_per_material": {material: _mae(errors) for material, errors in sorted(entry["errors"].items())},
+            "scans_per_material": {material: len(errors) for material, errors in sorted(entry["errors"].items())},
+            "latency_ms_per_image": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            },
+            "load_seconds": round(entry["load_seconds"], 2),
+            "load_memory_mb": round(entry["load_memory_bytes"] / 2**20, 1),
+        }
+    return report
+
+
+def recommend(report, max_mae):
+    """Fastest estimator whose overall MAE is within max_mae, or None"""
+    eligible = [
+        (summary["latency_ms_per_image"]["mean"], name)
+        for name, summary in report.items()
+        if summary["mae"] is not None and summary["mae"] <= max_mae
+    ]
+    return min(eligible)[1] if eligible else None
+
+
+def print_report(report):
+    print("=" * 78)
+    print(f"{'estimator':>10} {'scans':>6} {'MAE kg':>9} {'ms/img':>9} {'p95 ms':>9} {'load s':>8} {'load MiB':>9}")
+    print("-" * 78)
+    for name, s in report.items():
+        latency = s["latency_ms_per_image"]
+        print(f"{name:>10} {s['scans']:>6} {s['mae'] if s['mae'] is not None else '-':>9} "
+              f"{latency['mean'] if latency['mean'] is not None else '-':>9} "
+              f"{latency['p95'] if latency['p95'] is not None else '-':>9} "
+              f"{s['load_seconds']:>8} {s['load_memory_mb']:>9}")
+    materials = sorted({m for s in report.values() for m in s["mae_per_material"]})
+    if materials:
+        print("-" * 78)
+        print(f"{'MAE kg':>10} " + " ".join(f"{m[:12]:>12}" for m in materials))
+        for name, s in report.items():
+            print(f"{name:>10} " + " ".join(f"{str(s['mae_per_material'].get(m, '-')):>12}" for m in materials))
+    print("=" * 78)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the weight estimators on verified scans")
+    parser.add_argument("--estimators", default=",".join(ESTIMATORS), help="Comma-separated subset of yolo,neural,lite")
+    parser.add_argument("--batch-size", type=int, default=16, help="Images per forward pass")
+    parser.add_argument("--workers", type=int, default=4, help="Image decoding threads")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N verified scans")
+    parser.add_argument("--max-mae", type=float, default=None, help="Accuracy bar (kg) for the recommendation")
+    parser.add_argument("--out", default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        scans, skipped = load_verified(db, args.limit)
+    finally:
+        db.close()
+    print(f"[Replay] {len(scans)} verified scans with a stored original ({skipped} without)")
+    if not scans:
+        raise SystemExit("Nothing to replay: no verified scan has its original in the upload store")
+
+    estimators = make_estimators([name.strip() for name in args.estimators.split(",") if name.strip()], scans)
+    report = replay(scans, estimators, args.batch_size, args.workers)
+    print_report(report)
+
+    result = {"scans": len(scans), "skipped_without_original": skipped, "estimators": report}
+    if args.max_mae is not None:
+        result["max_mae"] = args.max_mae
+        result["recommended"] = recommend(report, args.max_mae)
+        print(f"Cheapest estimator with MAE <= {args.max_mae} kg: {result['recommended'] or 'none'}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Response shaping and encoding for the API
+Profiles: "lean" (default) drops the embedding and other internal fields,
+"full" returns everything (debugging).
+Encoding: orjson when installed (falls back to the json module), MessagePack
+when the client sends Accept: application/msgpack.
+"""
+
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROFILES = ("lean", "full")
+DEFAULT_PROFILE = "lean"
+# Needed for debugging or internal bookkeeping only; a 1024-float embedding alone is ~20 KB of JSON
+LEAN_EXCLUDED_FIELDS = frozenset({
+    "embedding",
+    "embedding_status",
+    "embedding_version",
+    "phash",
+    "blob_hash",
+    "detection_path",
+    "object_embeddings",
+    "object_embedding_version",
+})
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def check_profile(profile):
+    if profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"response_profile must be one of {list(PROFILES)}")
+    return profile
+
+
+def shape(data, profile=DEFAULT_PROFILE):
+    """Drop internal fields from a result dict for the lean profile"""
+    if profile == "full":
+        return data
+    return {key: value for key, value in data.items() if key not in LEAN_EXCLUDED_FIELDS}
+
+
+def scan_to_dict(scan, profile=DEFAULT_PROFILE):
+    """ScanResult row -> plain dict (cheaper than jsonable_encoder on ORM objects)"""
+    data = {}
+    for column in scan.__table__.columns:
+        if profile != "full" and column.name in LEAN_EXCLUDED_FIELDS:
+            continue
+        value = getattr(scan, column.name)
+        data[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def _default(value):
+    # numpy scalars/arrays and datetimes that slip into result dicts
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def wants_msgpack(accept_header):
+    return msgpack is not None and bool(accept_header) and any(t in accept_header for t in MSGPACK_MEDIA_TYPES)
+
+
+def encode(content, accept_header=None):
+    """Returns (body bytes, media type) for the negotiated format"""
+    if wants_msgpack(accept_header):
+        return msgpack.packb(content, use_bin_type=True, default=_default), "application/msgpack"
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY), "application/json"
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8"), "application/json"
+
+
+def negotiated_response(request, content, status_code=200, headers=None):
+    """JSON or MessagePack response depending on the request's Accept header"""
+    body, media_type = encode(content, request.headers.get("accept"))
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept"
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
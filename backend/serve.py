@@ -0,0 +1,181 @@
+"""
+Prefork server for WasteVisionAI
+Loads the app and the preloaded models (MODEL_PRELOAD: YOLO + MobileNet)
+once in the parent process, then forks worker processes that share the model weights copy-on-write.
+Each worker gets an equal slice of the CPU for torch intra-op threads.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 2 --threads-per-worker 2 --pid-file serve_workers.json
+
+Linux/macOS only (relies on os.fork). On Windows use plain `uvicorn main:app`.
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def thread_budget(workers, threads_per_worker=None):
+    """Torch/OpenMP threads per worker so that workers do not oversubscribe the CPU"""
+    if threads_per_worker:
+        return max(1, threads_per_worker)
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // max(1, workers))
+
+
+def _bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """Parent process: owns the listening socket and supervises the workers"""
+
+    def __init__(self, app, sock, workers, threads, log_level="info", pid_file=None):
+        self.app = app
+        self.sock = sock
+        self.num_workers = workers
+        self.threads = threads
+        self.log_level = log_level
+        self.pid_file = pid_file
+        self.workers = {}  # pid -> worker index
+        self.stopping = False
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            # Child
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self._run_worker(index)
+            os._exit(0)
+        self.workers[pid] = index
+        return pid
+
+    def _run_worker(self, index):
+        import uvicorn
+
+        try:
+            import torch
+            torch.set_num_threads(self.threads)
+        except ImportError:
+            pass
+
+        print(f"[Serve] Worker {index} (pid {os.getpid()}) started with {self.threads} thread(s)")
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        server = uvicorn.Server(config)
+        server.run(sockets=[self.sock])
+
+    def _write_pid_file(self):
+        if not self.pid_file:
+            return
+        with open(self.pid_file, "w") as f:
+            json.dump({"parent": os.getpid(), "workers": sorted(self.workers)}, f)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _report_memory(self, signum=None, frame=None):
+        from metrics import read_memory
+        print("[Serve] Memory per worker (MiB):  pid      rss      pss      uss")
+        for pid in sorted(self.workers):
+            mem = read_memory(pid)
+            if mem:
+                print(f"[Serve]                       {pid:>6} {mem['rss'] / 2**20:>8.1f} "
+                      f"{mem['pss'] / 2**20:>8.1f} {mem['uss'] / 2**20:>8.1f}")
+
+    def run(self):
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGUSR1, self._report_memory)
+
+        for index in range(self.num_workers):
+            self.spawn(index)
+        self._write_pid_file()
+
+        # Supervise: restart workers that die unexpectedly
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            index = self.workers.pop(pid, None)
+            if index is None:
+                continue
+            if not self.stopping:
+                print(f"[Serve] Worker {index} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(1)
+                self.spawn(index)
+                self._write_pid_file()
+
+        if self.pid_file and os.path.exists(self.pid_file):
+            os.remove(self.pid_file)
+        print("[Serve] All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork server sharing model weights across workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Torch intra-op threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--pid-file", default=None,
+                        help="Write parent/worker PIDs here (used by load_test.py --pid-file)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork(); use `uvicorn main:app` on this platform")
+
+    threads = thread_budget(args.workers, args.threads_per_worker)
+
+    # Must be set before torch is imported so OpenMP/MKL size their pools accordingly
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, str(threads))
+
+    # Load YOLO and the feature extractor once, in the parent (models are lazy,
+    # importing main alone loads none). Pinned: evicting them in a worker would
+    # drop the shared pages and load a private copy. No inference runs here,
+    # so no torch thread pools exist before fork.
+    from main import app
+    from database import engine
+    import model_manager
+
+    model_manager.manager.preload(pin=True)
+
+    # Never share SQLite connections across processes
+    engine.dispose()
+
+    # Move everything allocated so far out of the GC's reach: collections would
+    # otherwise touch every object header and un-share the pages in each worker
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind_socket(args.host, args.port)
+    print(f"[Serve] Listening on {args.host}:{args.port} with {args.workers} worker(s), "
+          f"{threads} thread(s) each")
+
+    PreforkServer(app, sock, args.workers, threads, args.log_level, args.pid_file).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Test script for the model artifact store
+Checks manifests, mmap loading without copies, tamper detection and the
+verified third-party weights cache
+"""
+
+import os
+import shutil
+import tempfile
+
+import torch
+
+import artifact_store
+from weight_model import WeightEstimator, WeightPredictor
+
+
+def test_checkpoint_roundtrip_mmap():
+    """A saved checkpoint loads memory-mapped into a model built on the meta device"""
+    print("\n" + "="*60)
+    print("TEST 1: Checkpoint Roundtrip (mmap)")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "weight_model.pth")
+        original = WeightEstimator(pretrained=False).eval()
+        manifest = artifact_store.save_state_dict(original.state_dict(), path)
+        print(f"  Saved {manifest['size']} bytes, sha256 {manifest['sha256'][:12]}")
+
+        assert os.path.exists(artifact_store.manifest_path(path))
+        assert manifest["sha256"] == artifact_store.sha256_file(path)
+        assert [f for f in os.listdir(tmp_dir) if f.endswith(".tmp")] == []
+
+        loaded = artifact_store.load_into(lambda: WeightEstimator(pretrained=False), path).eval()
+        for (name, a), (_, b) in zip(original.state_dict().items(), loaded.state_dict().items()):
+            assert torch.equal(a, b), name
+
+        image = torch.rand(2, 3, 224, 224)
+        materials = torch.tensor([1, 3])
+        with torch.no_grad():
+            assert torch.allclose(original(image, materials), loaded(image, materials))
+
+        # The predictor uses the same path and keeps training on the mapped tensors
+        predictor = WeightPredictor(model_path=path, device=torch.device("cpu"))
+        assert not any(p.is_meta for p in predictor.model.parameters())
+        predictor.model.train()
+        loss = predictor.model(image, materials).sum()
+        loss.backward()
+        torch.optim.SGD(predictor.model.parameters(), lr=0.1).step()
+        predictor.save_model()
+        artifact_store.verify(path, full=True)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Checkpoint mapped, usable and trainable")
+    return True
+
+
+def test_tamper_detection():
+    """A modified checkpoint is rejected; a legacy one without manifest is adopted"""
+    print("\n" + "="*60)
+    print("TEST 2: Integrity")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, "model.pth")
+        artifact_store.save_state_dict({"w": torch.arange(1024, dtype=torch.float32)}, path)
+
+        with open(path, "r+b") as f:
+            f.seek(-64, os.SEEK_END)
+            byte = f.read(1)
+            f.seek(-64, os.SEEK_END)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        try:
+            artifact_store.load_state_dict(path, verify_hash=True)
+            raise AssertionError("tampered checkpoint was loaded")
+        except artifact_store.IntegrityError as e:
+            print(f"  Rejected: {e}")
+
+        legacy = os.path.join(tmp_dir, "legacy.pth")
+        torch.save({"w": torch.ones(4)}, legacy)
+        state = artifact_store.load_state_dict(legacy)
+        assert torch.equal(state["w"], torch.ones(4))
+        assert artifact_store.read_manifest(legacy)["sha256"] == artifact_store.sha256_file(legacy)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Tampering detected, legacy checkpoint adopted")
+    return True
+
+
+def test_cached_file():
+    """Third-party weights are fetched once, then served from the store after verification"""
+    print("\n" + "="*60)
+    print("TEST 3: Cached Weights")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    default_dir = artifact_store.ARTIFACT_DIR
+    artifact_store.ARTIFACT_DIR = os.path.join(tmp_dir, "artifacts")
+    fetches = []
+
+    def fetch(name):
+        fetches.append(name)
+        source = os.path.join(tmp_dir, "download-" + name)
+        with open(source, "wb") as f:
+            f.write(os.urandom(4096))
+        return source
+
+    try:
+        first = artifact_store.cached_file("yolo-test.pt", fetch=fetch)
+        second = artifact_store.cached_file("yolo-test.pt", fetch=fetch)
+        assert first == second and len(fetches) == 1
+
+        with open(first, "r+b") as f:
+            f.write(b"\x00" * 16)   # corrupt in place, same size
+        third = artifact_store.cached_file("yolo-test.pt", fetch=fetch)
+        print(f"  Fetches: {len(fetches)}")
+        assert third == first and len(fetches) == 2
+        artifact_store.verify(third, full=True)
+    finally:
+        artifact_store.ARTIFACT_DIR = default_dir
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Fetched once, re-fetched only when corrupt")
+    return True
+
+
+def main():
+    tests = [test_checkpoint_roundtrip_mmap, test_tamper_detection, test_cached_file]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
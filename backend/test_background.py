@@ -0,0 +1,159 @@
+"""
+Test script for deferred embeddings
+Checks that analyze_image leaves the embedding pending when the count
+decides the weight, computes it at once when the k-NN fallback needs it,
+and that the background job stores it on the scan
+"""
+
+import json
+from types import SimpleNamespace
+
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import background
+import model_manager
+from database import Base, ScanResult
+
+
+class _StubDetector:
+    names = {0: "bottle"}
+
+    def __init__(self, count):
+        self.count = count
+
+    def __call__(self, source, conf, **kwargs):
+        boxes = [
+            SimpleNamespace(cls=[0], conf=[0.9], xyxy=[[10.0 + 60 * i, 20.0, 60.0 + 60 * i, 120.0]])
+            for i in range(self.count)
+        ]
+        return [SimpleNamespace(boxes=boxes)]
+
+
+class _StubExtractor:
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.calls = 0
+
+    def get_embedding(self, image):
+        self.calls += 1
+        return self.embedding
+
+
+def _use_stub_models(count, embedding):
+    """Replace the shared model manager; returns (previous manager, extractor)"""
+    default_manager = model_manager.manager
+    extractor = _StubExtractor(embedding)
+    model_manager.manager = model_manager.ModelManager(idle_seconds=0, budget_mb=0)
+    model_manager.manager.register("yolo", lambda: _StubDetector(count))
+    model_manager.manager.register("embedding", lambda: extractor)
+    return default_manager, extractor
+
+
+def _scratch_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def test_deferred_when_counted():
+    """Objects counted: no embedding on the request path, status pending"""
+    print("\n" + "="*60)
+    print("TEST 1: Deferred Embedding")
+    print("="*60)
+
+    import model
+
+    default_manager, extractor = _use_stub_models(count=2, embedding=[0.1, 0.2])
+    db = _scratch_db()()
+    try:
+        result = model.analyze_image(Image.new("RGB", (640, 480), (90, 90, 90)), db, "Plastic", defer_embedding=True)
+    finally:
+        db.close()
+        model_manager.manager = default_manager
+
+    assert result["object_count"] == 2 and result["weight"] > 0
+    assert result["embedding_status"] == "pending"
+    assert result["embedding"] is None and result["embedding_version"] is None
+    assert extractor.calls == 0
+    print("✓ Embedding left to the background")
+    return True
+
+
+def test_fallback_needs_embedding():
+    """Nothing counted: the k-NN fallback needs the embedding now"""
+    print("\n" + "="*60)
+    print("TEST 2: Synchronous Fallback")
+    print("="*60)
+
+    import model
+
+    default_manager, extractor = _use_stub_models(count=0, embedding=[0.1, 0.2])
+    db = _scratch_db()()
+    try:
+        result = model.analyze_image(Image.new("RGB", (640, 480), (90, 90, 90)), db, "Plastic", defer_embedding=True)
+    finally:
+        db.close()
+        model_manager.manager = default_manager
+
+    assert result["object_count"] == 0
+    assert result["embedding_status"] == "ready" and result["embedding"] == [0.1, 0.2]
+    assert result["embedding_version"] is not None
+    assert extractor.calls == 1
+    print("✓ Embedding computed on the request path")
+    return True
+
+
+def test_background_writes_row():
+    """The background job stores embedding, status and version on the scan"""
+    print("\n" + "="*60)
+    print("TEST 3: Background Write")
+    print("="*60)
+
+    import embedding_projection
+
+    Session = _scratch_db()
+    db = Session()
+    db.add_all([ScanResult(id=1, filename="a.jpg", embedding_status="pending"),
+                ScanResult(id=2, filename="b.jpg", embedding_status="pending")])
+    db.commit()
+    db.close()
+
+    default_session = background.SessionLocal
+    background.SessionLocal = Session
+    try:
+        default_manager, _ = _use_stub_models(count=0, embedding=[0.3, 0.4])
+        try:
+            background._compute_embedding(1, "a.jpg")
+        finally:
+            model_manager.manager = default_manager
+        default_manager, _ = _use_stub_models(count=0, embedding=[])
+        try:
+            background._compute_embedding(2, "b.jpg")
+            background._compute_embedding(3, "missing.jpg")       # deleted meanwhile: ignored
+        finally:
+            model_manager.manager = default_manager
+    finally:
+        background.SessionLocal = default_session
+
+    db = Session()
+    ready, failed = db.query(ScanResult).order_by(ScanResult.id).all()
+    db.close()
+    print(f"  Statuses: {ready.embedding_status}, {failed.embedding_status}")
+    assert json.loads(ready.embedding) == [0.3, 0.4]
+    assert ready.embedding_status == "ready"
+    assert ready.embedding_version == embedding_projection.current_version()
+    assert failed.embedding_status == "failed" and failed.embedding is None
+    print("✓ Row updated by the background job")
+    return True
+
+
+def main():
+    tests = [test_deferred_when_counted, test_fallback_needs_embedding, test_background_writes_row]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
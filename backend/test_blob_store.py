@@ -0,0 +1,165 @@
+"""
+Test script for content-addressed upload storage
+Checks streaming hash, dedup, verified-only LRU quota eviction and that
+detection works on the extensionless stored blobs
+"""
+
+import io
+import hashlib
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import blob_store
+import model_manager
+from database import Base, ScanResult
+
+
+_DEFAULTS = (blob_store.UPLOAD_DIR, blob_store.UPLOAD_QUOTA_MB)
+
+
+def _use_tmp_store(quota_mb=0.0):
+    tmp_dir = tempfile.mkdtemp()
+    blob_store.UPLOAD_DIR = tmp_dir
+    blob_store.UPLOAD_QUOTA_MB = quota_mb
+    blob_store._usage_bytes = None
+    return tmp_dir
+
+
+def _restore_store(tmp_dir):
+    shutil.rmtree(tmp_dir)
+    blob_store.UPLOAD_DIR, blob_store.UPLOAD_QUOTA_MB = _DEFAULTS
+    blob_store._usage_bytes = None
+
+
+def test_save_and_dedup():
+    """Identical content is stored once under its SHA-256"""
+    print("\n" + "="*60)
+    print("TEST 1: Save and Dedup")
+    print("="*60)
+
+    tmp_dir = _use_tmp_store()
+    try:
+        data = os.urandom(3 * blob_store.CHUNK_SIZE + 17)   # several chunks
+        first = blob_store.save_stream(io.BytesIO(data))
+        second = blob_store.save_stream(io.BytesIO(data))
+        print(f"  Stored at: {os.path.relpath(first.path, tmp_dir)}")
+
+        assert first.sha256 == hashlib.sha256(data).hexdigest()
+        assert first.created and not second.created
+        assert first.path == second.path
+        assert os.path.relpath(first.path, tmp_dir).split(os.sep)[:2] == [first.sha256[:2], first.sha256[2:4]]
+        with open(first.path, "rb") as f:
+            assert f.read() == data
+        assert os.listdir(os.path.join(tmp_dir, "tmp")) == []   # no temp files left behind
+        assert blob_store.usage_bytes() == len(data)
+    finally:
+        _restore_store(tmp_dir)
+
+    print("✓ Content stored once")
+    return True
+
+
+def test_quota_evicts_verified_lru():
+    """Over quota, only verified blobs are evicted, oldest first"""
+    print("\n" + "="*60)
+    print("TEST 2: Quota Eviction")
+    print("="*60)
+
+    tmp_dir = _use_tmp_store(quota_mb=2.5)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        blobs = []
+        for age in range(4):
+            blob = blob_store.save_stream(io.BytesIO(os.urandom(1024 * 1024)))
+            os.utime(blob.path, (1000 + age, 1000 + age))   # blob 0 is least recently used
+            blobs.append(blob)
+        # Blob 0 is unverified, blobs 1-3 verified
+        for i, blob in enumerate(blobs):
+            db.add(ScanResult(filename=f"{i}.jpg", blob_hash=blob.sha256, actual_weight=None if i == 0 else 1.0))
+        db.commit()
+
+        assert blob_store.over_quota()
+        evicted = blob_store.evict_to_quota(db)
+        print(f"  Evicted: {evicted}, in use: {blob_store.usage_bytes()} bytes")
+
+        assert evicted == 2
+        assert os.path.exists(blobs[0].path)        # unverified: kept despite being oldest
+        assert not os.path.exists(blobs[1].path)
+        assert not os.path.exists(blobs[2].path)
+        assert os.path.exists(blobs[3].path)
+        assert not blob_store.over_quota()
+    finally:
+        db.close()
+        _restore_store(tmp_dir)
+
+    print("✓ Verified originals evicted by LRU")
+    return True
+
+
+class _StubDetector:
+    """Rejects image paths it cannot classify by extension, like ultralytics"""
+    names = {0: "bottle"}
+
+    def __init__(self):
+        self.inputs = []
+
+    def __call__(self, source, conf, **kwargs):
+        if isinstance(source, str) and not os.path.splitext(source)[1]:
+            raise FileNotFoundError(f"No images or videos found in {source}")
+        self.inputs.append(source)
+        box = SimpleNamespace(cls=[0], conf=[0.9], xyxy=[[10.0, 20.0, 110.0, 220.0]])
+        return [SimpleNamespace(boxes=[box])]
+
+
+def test_detect_stored_blob():
+    """Detection decodes extensionless blobs itself, upright per EXIF"""
+    print("\n" + "="*60)
+    print("TEST 3: Detection on Stored Blobs")
+    print("="*60)
+
+    import model
+
+    tmp_dir = _use_tmp_store()
+    default_manager = model_manager.manager
+    detector = _StubDetector()
+    model_manager.manager = model_manager.ModelManager(idle_seconds=0, budget_mb=0)
+    model_manager.manager.register("yolo", lambda: detector)
+    try:
+        # Phone photo stored sideways with EXIF orientation 6 (rotate 90 degrees)
+        photo = io.BytesIO()
+        exif = Image.Exif()
+        exif[model.EXIF_ORIENTATION] = 6
+        Image.new("RGB", (400, 300), (200, 30, 30)).save(photo, "JPEG", exif=exif)
+        photo.seek(0)
+        blob = blob_store.save_stream(photo)
+        assert not os.path.splitext(blob.path)[1]
+
+        detections, path = model.run_detection(blob.path)
+        assert path == "full"
+        assert detections == [{"name": "bottle", "conf": 0.9, "box": [10.0, 20.0, 110.0, 220.0]}]
+        assert model._detect("yolo", blob.path) == detections
+        assert all(image.size == (300, 400) for image in detector.inputs)   # upright
+    finally:
+        model_manager.manager = default_manager
+        _restore_store(tmp_dir)
+
+    print("✓ Stored blobs detected upright")
+    return True
+
+
+def main():
+    tests = [test_save_and_dedup, test_quota_evicts_verified_lru, test_detect_stored_blob]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Test script for the cascaded detection policy
+Checks when the cheap pass is accepted or escalated, and the savings report
+"""
+
+import cascade
+
+THRESH = 0.25
+
+
+def det(name, conf):
+    return {"name": name, "conf": conf, "box": [0, 0, 10, 10]}
+
+
+def test_escalation_policy():
+    """Ambiguous cheap results escalate, clear ones are accepted"""
+    print("\n" + "="*60)
+    print("TEST 1: Escalation Policy")
+    print("="*60)
+
+    cases = [
+        ([], "empty"),
+        ([det("bottle", 0.10)], "empty"),
+        ([det("bottle", 0.9), det("bottle", 0.1), det("bottle", 0.12)], "low_conf_bottles"),
+        ([det("bottle", 0.9), det("cup", 0.28)], "borderline_count"),
+        ([det("bottle", 0.40), det("cup", 0.38)], "low_mean_conf"),
+        ([det("bottle", 0.92)], None),
+        ([det("bottle", 0.85), det("bottle", 0.05)], None),
+    ]
+    for detections, expected in cases:
+        reason = cascade.escalation_reason(detections, THRESH)
+        print(f"  {[(d['name'], d['conf']) for d in detections]} -> {reason}")
+        assert reason == expected
+
+    print("✓ Escalation policy works")
+    return True
+
+
+def test_stats_report():
+    """Escalation rate and latency saved are reported"""
+    print("\n" + "="*60)
+    print("TEST 2: Cascade Report")
+    print("="*60)
+
+    stats = cascade.CascadeStats()
+    stats.record_full(0.400)
+    assert abs(stats.record_accepted(0.100) - 0.300) < 1e-9
+    stats.record_accepted(0.100)
+    stats.record_escalated("empty", 0.100)
+    stats.record_full(0.400)
+
+    report = stats.report()
+    print(f"  {report}")
+    assert report["requests"] == 3
+    assert report["escalation_rate"] == round(1 / 3, 4)
+    assert report["escalation_reasons"] == {"empty": 1}
+    assert report["net_saved_seconds"] == 0.5
+
+    print("✓ Cascade report works")
+    return True
+
+
+def main():
+    tests = [test_escalation_policy, test_stats_report]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
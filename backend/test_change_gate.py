@@ -0,0 +1,143 @@
+"""
+Test script for static-camera change gating
+Checks unchanged / localized / full-change decisions and region merging
+"""
+
+import numpy as np
+from PIL import Image
+from change_gate import ChangeGate, signature, merge_region_detections
+
+SIZE = (640, 480)
+
+
+def _scene(box=None):
+    """Grey background with an optional bright square (x0, y0, x1, y1)"""
+    pixels = np.full((SIZE[1], SIZE[0], 3), 90, dtype=np.uint8)
+    if box:
+        x0, y0, x1, y1 = box
+        pixels[y0:y1, x0:x1] = 240
+    return Image.fromarray(pixels)
+
+
+def test_unchanged_scene():
+    """Same frame (plus sensor noise) is reported unchanged"""
+    print("\n" + "="*60)
+    print("TEST 1: Unchanged Scene")
+    print("="*60)
+
+    gate = ChangeGate()
+    first = signature(_scene())
+    assert not gate.check("cam-1", first, SIZE).unchanged   # nothing stored yet
+    gate.update("cam-1", first, SIZE, {"weight": 1.0}, [])
+
+    noisy = np.clip(first.astype(np.int16) + np.random.default_rng(0).integers(-5, 6, first.shape), 0, 255)
+    decision = gate.check("cam-1", noisy.astype(np.uint8), SIZE)
+    print(f"  Changed fraction: {decision.changed_fraction:.4f}")
+    assert decision.unchanged
+    assert decision.previous.result == {"weight": 1.0}
+
+    # Other sources have their own state
+    assert not gate.check("cam-2", first, SIZE).unchanged
+
+    print("✓ Unchanged frames are gated")
+    return True
+
+
+def test_localized_change():
+    """A new object in one corner yields a region covering it"""
+    print("\n" + "="*60)
+    print("TEST 2: Localized Change")
+    print("="*60)
+
+    gate = ChangeGate()
+    gate.update("cam-1", signature(_scene()), SIZE, {}, [])
+    decision = gate.check("cam-1", signature(_scene((500, 360, 580, 440))), SIZE)
+    print(f"  Region: {decision.region}, fraction: {decision.changed_fraction:.4f}")
+
+    assert not decision.unchanged
+    x0, y0, x1, y1 = decision.region
+    assert x0 <= 500 and y0 <= 360 and x1 >= 580 and y1 >= 440
+    assert (x1 - x0) * (y1 - y0) < SIZE[0] * SIZE[1] / 4
+
+    print("✓ Region covers the change")
+    return True
+
+
+def test_full_change():
+    """Large changes and resolution changes require a full pass"""
+    print("\n" + "="*60)
+    print("TEST 3: Full Change")
+    print("="*60)
+
+    gate = ChangeGate()
+    gate.update("cam-1", signature(_scene()), SIZE, {}, [])
+    decision = gate.check("cam-1", signature(_scene((0, 0, 600, 400))), SIZE)
+    assert not decision.unchanged and decision.region is None
+
+    decision = gate.check("cam-1", signature(_scene()), (1280, 960))
+    assert not decision.unchanged and decision.region is None and decision.previous is None
+
+    print("✓ Full re-analysis when the scene changed")
+    return True
+
+
+def test_merge_region_detections():
+    """Previous boxes inside the region are replaced by fresh detections"""
+    print("\n" + "="*60)
+    print("TEST 4: Region Merge")
+    print("="*60)
+
+    previous = [
+        {"name": "bottle", "conf": 0.9, "box": [10, 10, 50, 50]},
+        {"name": "bottle", "conf": 0.8, "box": [410, 310, 450, 350]},
+    ]
+    fresh = [{"name": "cup", "conf": 0.7, "box": [420, 320, 460, 360]}]
+    merged = merge_region_detections(previous, fresh, (400, 300, 640, 480))
+
+    assert sorted(d["name"] for d in merged) == ["bottle", "cup"]
+    assert [10, 10, 50, 50] in [d["box"] for d in merged]
+
+    # Bottle straddling the region edge: kept from before and cut by the region crop
+    previous = [{"name": "bottle", "conf": 0.9, "box": [360, 100, 460, 200]}]
+    fresh = [
+        {"name": "bottle", "conf": 0.6, "box": [420, 100, 460, 200], "tile": "region"},
+        {"name": "bottle", "conf": 0.8, "box": [500, 320, 540, 400], "tile": "region"},
+    ]
+    merged = merge_region_detections(previous, fresh, (420, 0, 640, 480))
+    assert sorted(d["box"][0] for d in merged) == [360, 500]
+
+    print("✓ Region detections merged without duplicates")
+    return True
+
+
+def test_lru_bound():
+    """Only the most recently used sources are kept"""
+    print("\n" + "="*60)
+    print("TEST 5: Source Limit")
+    print("="*60)
+
+    gate = ChangeGate(max_sources=2)
+    sig = signature(_scene())
+    for source in ("a", "b", "c"):
+        gate.update(source, sig, SIZE, {}, [])
+    assert gate.check("a", sig, SIZE).previous is None
+    assert gate.check("c", sig, SIZE).unchanged
+
+    print("✓ Oldest source evicted")
+    return True
+
+
+def main():
+    tests = [
+        test_unchanged_scene,
+        test_localized_change,
+        test_full_change,
+        test_merge_region_detections,
+        test_lru_bound,
+    ]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Test script for bulk ground-truth corrections
+Checks CSV/NDJSON parsing, the single-transaction bulk update and the
+batched V2 Lite material database update
+"""
+
+import os
+import tempfile
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from corrections import parse_corrections, apply_corrections
+from database import Base, ScanResult
+from weight_model_v2_lite import MaterialWeightDB
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i in range(1, 5):
+        db.add(ScanResult(id=i, filename=f"{i}.jpg", material="Plastic", category="Plastic", weight=0.1, object_count=2))
+    db.commit()
+    return engine, db
+
+
+def test_parse_formats():
+    """CSV and NDJSON give the same rows; bad rows are reported by line"""
+    print("\n" + "="*60)
+    print("TEST 1: Parse CSV and NDJSON")
+    print("="*60)
+
+    csv_text = "scan_id,actual_weight,category\n1,0.25,\n2,0.40,Glass\n3,abc,\n"
+    ndjson_text = '{"scan_id": 1, "actual_weight": 0.25}\n{"scan_id": 2, "actual_weight": 0.4, "category": "Glass"}\n\n{"scan_id": 3}\n'
+
+    csv_rows, csv_errors = parse_corrections(csv_text)
+    nd_rows, nd_errors = parse_corrections(ndjson_text)
+    print(f"  CSV rows: {csv_rows}, errors: {csv_errors}")
+
+    assert csv_rows == nd_rows
+    assert csv_rows[0] == {"scan_id": 1, "actual_weight": 0.25, "category": None}
+    assert csv_rows[1]["category"] == "Glass"
+    assert csv_errors[0]["line"] == 4 and nd_errors[0]["line"] == 4
+
+    rows, errors = parse_corrections("id,weight\n1,2\n")
+    assert rows == [] and "missing columns" in errors[0]["error"]
+
+    print("✓ Both formats parsed")
+    return True
+
+
+def test_bulk_apply_single_transaction():
+    """All rows are written with one commit; unknown ids are reported"""
+    print("\n" + "="*60)
+    print("TEST 2: Bulk Apply")
+    print("="*60)
+
+    engine, db = _session()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, params, context, many: statements.append((sql, many)))
+
+    rows, _ = parse_corrections("scan_id,actual_weight,category\n1,0.2,\n2,0.3,\n3,0.5,Glass\n2,0.35,\n99,1.0,\n")
+    report = apply_corrections(db, rows, update_v2_lite=False)
+    print(f"  Report: {report}")
+
+    assert report["applied"] == 3
+    assert report["duplicates"] == 1
+    assert report["unknown_scan_ids"] == [99]
+    updates = [many for sql, many in statements if sql.startswith("UPDATE")]
+    assert len(updates) == 2 and updates[0]              # one statement per shape, rows via executemany
+
+    scans = {s.id: s for s in db.query(ScanResult).all()}
+    assert scans[2].actual_weight == 0.35                # later row wins
+    assert scans[3].material == "Glass" and scans[3].category == "Glass"
+    assert scans[4].actual_weight is None
+
+    dry = apply_corrections(db, parse_corrections("scan_id,actual_weight\n4,1.0\n")[0], update_v2_lite=False, dry_run=True)
+    assert dry["applied"] == 1 and db.get(ScanResult, 4).actual_weight is None
+    db.close()
+
+    print("✓ Applied in one transaction")
+    return True
+
+
+def test_material_db_update_many():
+    """update_many matches repeated update() and saves once"""
+    print("\n" + "="*60)
+    print("TEST 3: MaterialWeightDB.update_many")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        single = MaterialWeightDB(os.path.join(tmp_dir, "single.json"))
+        batched = MaterialWeightDB(os.path.join(tmp_dir, "batched.json"))
+        updates = [("Plastic", "default", 0.02), ("plastics", "default", 0.04), ("Glass", "bottle", 0.3)]
+
+        for update in updates:
+            single.update(*update)
+        saves = []
+        original_save = batched.save
+        batched.save = lambda: saves.append(1) or original_save()
+        assert batched.update_many(updates) == 3
+
+        assert len(saves) == 1
+        assert batched.weights == single.weights
+        assert batched.weights["Plastic"]["default"]["count"] == 2
+    finally:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+    print("✓ Batched update saved once")
+    return True
+
+
+def main():
+    tests = [test_parse_formats, test_bulk_apply_single_transaction, test_material_db_update_many]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
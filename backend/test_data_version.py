@@ -0,0 +1,158 @@
+"""
+Test script for conditional-request caching
+Checks the change-counter triggers, ETag matching, the per-version cache
+and 304 answers from a read endpoint
+"""
+
+import os
+import tempfile
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import data_version
+from database import Base, ScanResult, ensure_version_triggers
+
+
+def _engine(url="sqlite://"):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    ensure_version_triggers(engine)
+    return engine
+
+
+def test_triggers():
+    """Inserts and updates of any column bump the version"""
+    print("\n" + "="*60)
+    print("TEST 1: Version Triggers")
+    print("="*60)
+
+    db = sessionmaker(bind=_engine())()
+    assert data_version.current(db) == 0
+
+    scan = ScanResult(filename="a.jpg", weight=0.5)
+    db.add(scan)
+    db.commit()
+    assert data_version.current(db) == 1
+
+    scan.embedding = "[0.1]"
+    scan.embedding_status = "ready"
+    db.commit()
+    assert data_version.current(db) == 2
+
+    scan.actual_weight = 0.6
+    db.commit()
+    assert data_version.current(db) == 3
+    db.close()
+
+    print("✓ Version follows inserts, background updates and corrections")
+    return True
+
+
+def test_cache_and_etag():
+    """Cache entries are only valid for their version; weak ETags compare"""
+    print("\n" + "="*60)
+    print("TEST 2: Cache and ETag")
+    print("="*60)
+
+    cache = data_version.VersionedCache(max_entries=2)
+    cache.put("history", 3, b"v3")
+    assert cache.get("history", 3) == b"v3"
+    assert cache.get("history", 4) is None
+    cache.put("history", 2, b"stale")                   # older body never replaces a newer one
+    assert cache.get("history", 3) == b"v3"
+    cache.put("a", 1, b"a")
+    cache.put("b", 1, b"b")
+    assert cache.get("history", 3) is None               # LRU bound
+
+    tag = data_version.etag(7, ("history", "lean"))
+    assert tag != data_version.etag(8, ("history", "lean"))
+    assert tag != data_version.etag(7, ("history", "full"))
+    assert data_version.matches(tag, tag)
+    assert data_version.matches(f'"x", {tag[2:]}', tag)
+    assert data_version.matches("*", tag)
+    assert not data_version.matches('W/"6-abc"', tag)
+
+    print("✓ Cache and ETag correct")
+    return True
+
+
+def test_endpoint_304():
+    """Polling returns 304 until the data changes"""
+    print("\n" + "="*60)
+    print("TEST 3: If-None-Match")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "test.db")
+    sync_engine = _engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+    builds = []
+
+    app = FastAPI()
+
+    async def get_db():
+        async with AsyncSession() as db:
+            yield db
+
+    @app.get("/history")
+    async def history(request: Request, db=Depends(get_db)):
+        async def build():
+            builds.append(1)
+            result = await db.execute(select(ScanResult.id))
+            return [row[0] for row in result]
+        return await data_version.versioned_response(request, db, ("history",), build)
+
+    data_version.response_cache.clear()
+    try:
+        with TestClient(app) as client:
+            first = client.get("/history")
+            tag = first.headers["etag"]
+            assert first.json() == []
+
+            assert client.get("/history", headers={"If-None-Match": tag}).status_code == 304
+            assert client.get("/history").json() == []
+            assert len(builds) == 1                      # second full GET served from cache
+
+            db = sessionmaker(bind=sync_engine)()
+            db.add(ScanResult(filename="b.jpg", weight=1.0))
+            db.commit()
+            db.close()
+
+            changed = client.get("/history", headers={"If-None-Match": tag})
+            print(f"  After insert: {changed.status_code}, ETag {tag} -> {changed.headers['etag']}")
+            assert changed.status_code == 200 and changed.json() == [1]
+            assert changed.headers["etag"] != tag
+
+            # Background embedding writer: only embedding_status changes
+            tag = changed.headers["etag"]
+            db = sessionmaker(bind=sync_engine)()
+            db.query(ScanResult).filter(ScanResult.id == 1).update({"embedding_status": "ready"})
+            db.commit()
+            db.close()
+            updated = client.get("/history", headers={"If-None-Match": tag})
+            assert updated.status_code == 200 and updated.headers["etag"] != tag
+    finally:
+        data_version.response_cache.clear()
+        sync_engine.dispose()
+        os.remove(path)
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+    print("✓ 304 until the data changes")
+    return True
+
+
+def main():
+    tests = [test_triggers, test_cache_and_etag, test_endpoint_304]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Test script for the embedding projection
+Checks PCA recall on low-rank data, persistence/versioning and the
+storage hook used by analysis and backfill
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+import embedding_projection
+from embedding_projection import Projection, fit_pca, fit_random, evaluate
+from feature_extractor import EMBEDDING_VERSION
+
+
+def _embeddings(n=400, dim=1024, rank=16, seed=0):
+    """Clustered, mostly low-rank vectors (like CNN features of similar items)"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, dim))
+    return rng.standard_normal((n, rank)) @ basis + 0.05 * rng.standard_normal((n, dim))
+
+
+def test_pca_recall():
+    """PCA to 64 dims keeps the full-dimension neighbours"""
+    print("\n" + "="*60)
+    print("TEST 1: PCA Recall")
+    print("="*60)
+
+    X = _embeddings()
+    report = evaluate(fit_pca(X, 64), X, k=5)
+    print(f"  {report}")
+
+    assert report["dim"] == 64
+    assert report["recall_at_5"] >= 0.9
+    assert report["explained_variance"] > 0.95
+    assert report["bytes_per_row_float32"]["projected"] * 16 == report["bytes_per_row_float32"]["full"]
+    assert report["bytes_per_row_json"]["projected"] < report["bytes_per_row_json"]["full"] / 8
+
+    random_report = evaluate(fit_random(X.shape[1], 64), X, k=5)
+    print(f"  Random projection recall: {random_report['recall_at_5']}")
+    assert random_report["recall_at_5"] > 0.5
+
+    print("✓ Neighbours preserved")
+    return True
+
+
+def test_save_load_version():
+    """Saved projections reload identically; the version tracks the content"""
+    print("\n" + "="*60)
+    print("TEST 2: Persistence and Version")
+    print("="*60)
+
+    X = _embeddings()
+    projection = fit_pca(X, 32)
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "projection.npz")
+    try:
+        projection.save(path)
+        loaded = Projection.load(path)
+    finally:
+        os.remove(path)
+        os.rmdir(tmp_dir)
+
+    assert loaded.version == projection.version
+    assert loaded.backbone_version == EMBEDDING_VERSION
+    assert np.allclose(loaded.project(X[:3]), projection.project(X[:3]), atol=1e-4)
+    assert fit_pca(X[:200], 32).version != projection.version
+
+    print(f"✓ Version {projection.version}")
+    return True
+
+
+def test_for_storage():
+    """Without a projection embeddings pass through; with one they are projected"""
+    print("\n" + "="*60)
+    print("TEST 3: Storage Hook")
+    print("="*60)
+
+    X = _embeddings(n=100)
+    saved = (embedding_projection._active, embedding_projection._active_loaded)
+    try:
+        embedding_projection._active, embedding_projection._active_loaded = None, True
+        assert embedding_projection.for_storage(X[0].tolist()) == (X[0].tolist(), EMBEDDING_VERSION)
+        assert embedding_projection.for_storage(None) == (None, None)
+
+        projection = fit_pca(X, 8)
+        embedding_projection._active = projection
+        stored, version = embedding_projection.for_storage(X[0].tolist())
+        batch, batch_version = embedding_projection.for_storage_batch(X[:2].tolist())
+        assert len(stored) == 8 and len(batch[0]) == 8
+        assert version == batch_version == f"{EMBEDDING_VERSION}+{projection.version}"
+        assert embedding_projection.current_version() == version
+    finally:
+        embedding_projection._active, embedding_projection._active_loaded = saved
+
+    print("✓ Projection applied before storage")
+    return True
+
+
+def main():
+    tests = [test_pca_recall, test_save_load_version, test_for_storage]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
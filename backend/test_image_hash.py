@@ -0,0 +1,87 @@
+"""
+Test script for perceptual hashing and the near-duplicate index
+"""
+
+import random
+from datetime import datetime, timedelta
+from PIL import Image
+
+import image_hash
+
+
+def test_dhash_similarity():
+    """Slightly different frames hash close, different scenes hash far"""
+    print("\n" + "="*60)
+    print("TEST 1: dHash Similarity")
+    print("="*60)
+
+    gradient = Image.new("L", (320, 240))
+    gradient.putdata([(x + y) % 256 for y in range(240) for x in range(320)])
+    noisy = gradient.point(lambda v: min(255, v + 3))
+    flipped = gradient.transpose(Image.FLIP_LEFT_RIGHT)
+
+    base = image_hash.dhash(gradient)
+    near = image_hash.hamming(base, image_hash.dhash(noisy))
+    far = image_hash.hamming(base, image_hash.dhash(flipped))
+    print(f"  Brightness shift: {near} bits, mirrored scene: {far} bits")
+    assert near <= image_hash.NEAR_DUP_RADIUS
+    assert far > image_hash.NEAR_DUP_RADIUS
+    assert image_hash.hex_to_hash(image_hash.hash_to_hex(base)) == base
+
+    print("✓ dHash separates near and far frames")
+    return True
+
+
+def test_bktree_matches_bruteforce():
+    """BK-tree radius search returns exactly the brute-force result"""
+    print("\n" + "="*60)
+    print("TEST 2: BK-Tree Search")
+    print("="*60)
+
+    rng = random.Random(42)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    # Add some near copies so radius queries have hits
+    values += [v ^ (1 << rng.randrange(64)) for v in values[:50]]
+
+    tree = image_hash.BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    for query in values[:20]:
+        expected = sorted(i for i, v in enumerate(values) if image_hash.hamming(query, v) <= 3)
+        found = sorted(item for _, item in tree.search(query, 3))
+        assert found == expected
+
+    print(f"  {tree.size} hashes indexed")
+    print("✓ BK-tree search is exact")
+    return True
+
+
+def test_index_window_and_material():
+    """Lookups respect material and the recency window"""
+    print("\n" + "="*60)
+    print("TEST 3: Near-Duplicate Index")
+    print("="*60)
+
+    index = image_hash.NearDuplicateIndex(window_seconds=60, max_entries=10)
+    now = datetime.now()
+    index.add(0b1010, 1, "Plastic", now - timedelta(seconds=120))  # too old
+    index.add(0b1011, 2, "Plastic", now)
+    index.add(0b1010, 3, "Glass", now)
+
+    assert index.find(0b1010, "Plastic", radius=2) == (2, 1)
+    assert index.find(0b1010, "Glass", radius=2) == (3, 0)
+    assert index.find(0b1010, "Metal", radius=2) is None
+
+    print("✓ Index filters by material and age")
+    return True
+
+
+def main():
+    tests = [test_dhash_similarity, test_bktree_matches_bruteforce, test_index_window_and_material]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Test script for the load-testing harness statistics
+"""
+
+from load_test import DEFAULT_MIX, percentile, summarize, parse_mix
+
+
+def test_percentiles():
+    """Interpolated percentiles match hand-computed values"""
+    print("\n" + "="*60)
+    print("TEST 1: Percentiles")
+    print("="*60)
+
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50.5
+    assert percentile(values, 99) == 99.01
+    assert percentile([], 95) == 0.0
+    assert percentile([7], 99) == 7.0
+
+    print("✓ Percentiles are correct")
+    return True
+
+
+def test_summary():
+    """Summary reports throughput, error rate and per-endpoint stats"""
+    print("\n" + "="*60)
+    print("TEST 2: Level Summary")
+    print("="*60)
+
+    samples = [
+        ("analyze", 200, 0.10),
+        ("analyze", 503, 0.30),
+        ("history", 200, 0.01),
+        ("history", 0, 0.02),
+    ]
+    summary = summarize(samples, wall_seconds=2.0)
+    print(f"  {summary}")
+
+    assert summary["requests"] == 4
+    assert summary["throughput_rps"] == 2.0
+    assert summary["error_rate"] == 0.5
+    assert summary["status_codes"] == {"200": 2, "503": 1, "0": 1}
+    assert summary["by_endpoint"]["analyze"]["error_rate"] == 0.5
+    assert parse_mix("analyze=3,history=1") == {"analyze": 3.0, "history": 1.0}
+    assert "update_weight" not in DEFAULT_MIX    # corrections are opt-in
+
+    print("✓ Summary works")
+    return True
+
+
+def main():
+    tests = [test_percentiles, test_summary]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
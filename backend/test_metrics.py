@@ -0,0 +1,78 @@
+"""
+Test script for the in-process metrics registry
+Checks stage timing, counters and the Prometheus text output
+"""
+
+import time
+import metrics
+
+
+def test_stage_timing():
+    """Stage spans land in the histogram and the request trace"""
+    print("\n" + "="*60)
+    print("TEST 1: Stage Timing")
+    print("="*60)
+
+    trace = metrics.start_trace()
+    with metrics.stage("unit_test_stage"):
+        time.sleep(0.01)
+
+    assert "unit_test_stage" in trace
+    assert trace["unit_test_stage"] >= 0.01
+    print(f"  Stage took {trace['unit_test_stage'] * 1000:.1f} ms")
+
+    text = metrics.render_metrics()
+    assert 'waste_stage_duration_seconds_count{stage="unit_test_stage"} 1' in text
+    assert 'waste_stage_duration_seconds_bucket{stage="unit_test_stage",le="+Inf"} 1' in text
+
+    print("✓ Stage timing works")
+    return True
+
+
+def test_counters_and_gauges():
+    """Prediction method, cache and in-flight counters"""
+    print("\n" + "="*60)
+    print("TEST 2: Counters and Gauges")
+    print("="*60)
+
+    metrics.record_prediction_method("k-NN Fallback (k-NN (k=3))")
+    metrics.record_cache("unit_test", hit=True)
+    metrics.record_cache("unit_test", hit=False)
+
+    with metrics.track_in_flight():
+        assert metrics.registry.get_gauge("waste_analyze_in_flight") == 1
+    assert metrics.registry.get_gauge("waste_analyze_in_flight") == 0
+
+    text = metrics.render_metrics()
+    assert 'waste_prediction_method_total{method="k-NN Fallback"}' in text
+    assert 'waste_cache_hits_total{cache="unit_test"} 1' in text
+    assert 'waste_cache_misses_total{cache="unit_test"} 1' in text
+    assert "waste_process_resident_memory_bytes" in text
+
+    print("✓ Counters and gauges work")
+    return True
+
+
+def test_label_escaping():
+    """Label values with quotes do not break the exposition format"""
+    print("\n" + "="*60)
+    print("TEST 3: Label Escaping")
+    print("="*60)
+
+    registry = metrics.MetricsRegistry()
+    registry.inc("escaped_total", route='/a"b')
+    text = registry.render()
+    assert 'escaped_total{route="/a\\"b"} 1' in text
+
+    print("✓ Labels are escaped")
+    return True
+
+
+def main():
+    tests = [test_stage_timing, test_counters_and_gauges, test_label_escaping]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Test script for the shared model manager
+Checks that concurrent first uses load a model once, that models in use
+are never evicted, idle and memory-budget eviction, and failed loads
+"""
+
+import threading
+import time
+
+import torch.nn as nn
+
+from model_manager import ModelManager, ModelUnavailable, model_bytes
+
+# nn.Linear(256, 256): (256 * 256 + 256) float32 values
+LINEAR_BYTES = (256 * 256 + 256) * 4
+
+
+def _counting_loader(calls, delay=0.0):
+    def load():
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        return nn.Linear(256, 256)
+    return load
+
+
+def test_single_load_under_concurrency():
+    """Concurrent first requests share one load"""
+    print("\n" + "="*60)
+    print("TEST 1: Locked Lazy Load")
+    print("="*60)
+
+    manager = ModelManager(idle_seconds=0, budget_mb=0)
+    calls = []
+    manager.register("slow", _counting_loader(calls, delay=0.2))
+    assert not manager.report()["models"]["slow"]["loaded"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get("slow"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert manager.report()["models"]["slow"]["size_mb"] == round(LINEAR_BYTES / 2**20, 1)
+    assert model_bytes(results[0]) == LINEAR_BYTES
+    print("✓ One load for 8 concurrent callers")
+    return True
+
+
+def test_idle_eviction_respects_references():
+    """Idle models are evicted unless held; the next use loads again"""
+    print("\n" + "="*60)
+    print("TEST 2: Idle Eviction")
+    print("="*60)
+
+    manager = ModelManager(idle_seconds=60, budget_mb=0)
+    calls = []
+    manager.register("neural", _counting_loader(calls))
+
+    with manager.acquire("neural") as held:
+        assert manager.sweep(now=time.monotonic() + 3600) == []      # in use
+        assert manager.evict("neural") is False
+    assert manager.sweep(now=time.monotonic() + 1) == []             # not idle long enough
+    assert manager.sweep(now=time.monotonic() + 3600) == ["neural"]
+    assert not manager.report()["models"]["neural"]["loaded"]
+
+    with manager.acquire("neural") as reloaded:
+        assert reloaded is not held
+    assert len(calls) == 2 and manager.report()["models"]["neural"]["evictions"] == 1
+
+    # Pinned by a prefork preload: never evicted
+    manager.register("yolo", _counting_loader([]))
+    manager.preload("yolo, missing", pin=True)
+    assert manager.report()["models"]["yolo"]["pinned"]
+    assert manager.sweep(now=time.monotonic() + 3600) == ["neural"]
+    assert manager.report()["models"]["yolo"]["loaded"]
+    print("✓ Held and pinned models kept, idle ones evicted and reloaded on demand")
+    return True
+
+
+def test_memory_budget():
+    """Loading past the budget evicts the least recently used idle model"""
+    print("\n" + "="*60)
+    print("TEST 3: Memory Budget")
+    print("="*60)
+
+    manager = ModelManager(idle_seconds=0, budget_mb=2.5 * LINEAR_BYTES / 2**20)
+    for name in ("a", "b", "c"):
+        manager.register(name, _counting_loader([]))
+
+    manager.get("a")
+    manager.get("b")
+    manager.get("a")                       # b is now the least recently used
+    manager.get("c")
+    loaded = {name for name, m in manager.report()["models"].items() if m["loaded"]}
+    assert loaded == {"a", "c"}
+
+    # Nothing idle to evict: stays over budget rather than unloading a model in use
+    with manager.acquire("a"), manager.acquire("c"):
+        manager.get("b")
+        loaded = {name for name, m in manager.report()["models"].items() if m["loaded"]}
+        assert loaded == {"a", "b", "c"}
+    print("✓ LRU eviction within the budget, models in use kept")
+    return True
+
+
+def test_failed_load():
+    """A failing loader is reported and not retried until reset"""
+    print("\n" + "="*60)
+    print("TEST 4: Failed Load")
+    print("="*60)
+
+    manager = ModelManager(idle_seconds=0, budget_mb=0)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise OSError("weights missing")
+
+    manager.register("broken", broken)
+    assert manager.available("broken") is False
+    assert manager.available("broken") is False
+    assert len(attempts) == 1
+    try:
+        manager.get("broken")
+        raise AssertionError("expected ModelUnavailable")
+    except ModelUnavailable as e:
+        assert "weights missing" in str(e)
+    assert manager.report()["models"]["broken"]["error"] == "weights missing"
+
+    manager.reset("broken")
+    assert manager.available("broken") is False and len(attempts) == 2
+    assert manager.available("unknown") is False
+    print("✓ Failure cached until reset")
+    return True
+
+
+def main():
+    tests = [test_single_load_under_concurrency, test_idle_eviction_respects_references,
+             test_memory_budget, test_failed_load]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Test script for per-object crop embeddings and per-object k-NN
+Checks the square crop boxes, that the batched roi_align path embeds each
+box like a single-box call, the labelling of stored objects and the bound
+on embedded objects per image
+"""
+
+import json
+
+import numpy as np
+import torch
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from torchvision import models
+
+import object_weights
+from database import Base, ScanObject, ScanResult
+from feature_extractor import IMAGENET_MEAN, IMAGENET_STD, FeatureExtractor, square_box
+
+
+def _extractor():
+    """FeatureExtractor with random backbone weights (no download needed)"""
+    extractor = FeatureExtractor.__new__(FeatureExtractor)
+    extractor.model = models.mobilenet_v3_small(weights=None)
+    extractor.model.classifier[3] = torch.nn.Identity()
+    extractor.model.eval()
+    extractor._mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    extractor._std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    return extractor
+
+
+def _image():
+    image = Image.new("RGB", (640, 480), (40, 40, 40))
+    image.paste((220, 30, 30), (50, 60, 150, 260))
+    image.paste((30, 200, 60), (400, 300, 460, 330))
+    return image
+
+
+def test_square_box():
+    """Boxes become squares with margin, shifted inside the image"""
+    print("\n" + "="*60)
+    print("TEST 1: Square Crop Boxes")
+    print("="*60)
+
+    assert square_box([100, 100, 200, 150], 640, 480, margin=0.1) == [90.0, 65.0, 210.0, 185.0]
+    # Near the border: shifted, not clipped
+    assert square_box([0, 0, 50, 100], 640, 480, margin=0.0) == [0.0, 0.0, 100.0, 100.0]
+    # Larger than the image: limited to the short side
+    assert square_box([0, 0, 640, 480], 640, 480) == [80.0, 0.0, 560.0, 480.0]
+    print("✓ Square boxes inside the image")
+    return True
+
+
+def test_batched_crops():
+    """One batched pass gives the same embedding per box as one call per box"""
+    print("\n" + "="*60)
+    print("TEST 2: Batched Crop Embeddings")
+    print("="*60)
+
+    extractor = _extractor()
+    image = _image()
+    boxes = [[50, 60, 150, 260], [400, 300, 460, 330], [0, 0, 640, 480]]
+
+    batched = extractor.get_crop_embeddings(image, boxes)
+    assert len(batched) == 3 and len(batched[0]) == 1024
+    # Untrained backbone: outputs are tiny, compare relative to their norm
+    for box, embedding in zip(boxes, batched):
+        single = extractor.get_crop_embeddings(image, [box])[0]
+        assert np.linalg.norm(np.subtract(embedding, single)) <= 1e-3 * np.linalg.norm(single)
+    assert np.linalg.norm(np.subtract(batched[0], batched[1])) > 1e-2 * np.linalg.norm(batched[0])
+    assert extractor.get_crop_embeddings(image, []) == []
+    print("✓ Batch matches per-box calls")
+    return True
+
+
+def test_labels_and_knn():
+    """Verified weights are split over stored objects; k-NN is distance-weighted"""
+    print("\n" + "="*60)
+    print("TEST 3: Per-Object k-NN")
+    print("="*60)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    version = object_weights.object_version()
+    big, small = [1.0, 0.0], [0.0, 1.0]
+
+    # Both objects stored: 0.6 kg split 2:1 by the estimates at scan time
+    db.add(ScanResult(id=1, material="Glass", actual_weight=0.6, object_count=2))
+    db.add(ScanObject(scan_id=1, weight=0.2, embedding=json.dumps(big), embedding_version=version))
+    db.add(ScanObject(scan_id=1, weight=0.1, embedding=json.dumps(small), embedding_version=version))
+    # One of three objects stored: even split
+    db.add(ScanResult(id=2, material="Glass", actual_weight=0.9, object_count=3))
+    db.add(ScanObject(scan_id=2, weight=0.5, embedding=json.dumps(big), embedding_version=version))
+    # Ignored: unverified, other material, other version
+    db.add(ScanResult(id=3, material="Glass", object_count=1))
+    db.add(ScanObject(scan_id=3, weight=5.0, embedding=json.dumps(big), embedding_version=version))
+    db.add(ScanResult(id=4, material="Plastic", actual_weight=5.0, object_count=1))
+    db.add(ScanObject(scan_id=4, weight=5.0, embedding=json.dumps(big), embedding_version=version))
+    db.add(ScanResult(id=5, material="Glass", actual_weight=5.0, object_count=1))
+    db.add(ScanObject(scan_id=5, weight=5.0, embedding=json.dumps(big), embedding_version="old"))
+    db.commit()
+
+    object_weights._index_cache.clear()
+    X, y = object_weights.labelled_objects(db, "Glass")
+    db.close()
+    assert np.allclose(sorted(y), [0.2, 0.3, 0.4])
+
+    weights, k = object_weights.knn_weights([big, small, [0.5, 0.5]], X, y, k=2)
+    assert k == 2
+    assert abs(weights[0] - 0.35) < 1e-6          # exact matches 0.4 and 0.3 decide alone
+    assert abs(weights[1] - 0.2) < 1e-6
+    print(f"  Weights: {[round(w, 3) for w in weights]}")
+    print("✓ Labels split by estimate, k-NN per object")
+    return True
+
+
+def test_bounded_objects():
+    """Only MAX_OBJECTS crops are embedded; the rest count at the average"""
+    print("\n" + "="*60)
+    print("TEST 4: Bounded Cost")
+    print("="*60)
+
+    detections = [
+        {"name": "bottle", "conf": 0.9, "box": [50, 60, 150, 260]},
+        {"name": "bottle", "conf": 0.7, "box": [400, 300, 460, 330]},
+        {"name": "cup", "conf": 0.8, "box": [200, 200, 260, 280]},
+        {"name": "bottle", "conf": 0.2, "box": [10, 10, 20, 20]},
+    ]
+    default_max = object_weights.MAX_OBJECTS
+    object_weights.MAX_OBJECTS = 2
+    try:
+        per_object = object_weights.estimate(
+            _extractor(), _image(), detections, 0.4, "Plastic", None, unit_weight=0.03, count=3,
+        )
+    finally:
+        object_weights.MAX_OBJECTS = default_max
+
+    assert [o["conf"] for o in per_object["objects"]] == [0.9, 0.8]
+    assert len(per_object["embeddings"]) == 2
+    assert per_object["method"] is None                   # no labelled objects: average per item
+    assert abs(per_object["weight"] - 0.09) < 1e-9
+    print("✓ Most confident objects embedded, cost bounded")
+    return True
+
+
+def main():
+    tests = [test_square_box, test_batched_crops, test_labels_and_knn, test_bounded_objects]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
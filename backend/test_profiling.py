@@ -0,0 +1,117 @@
+"""
+Test script for opt-in request profiling
+Checks mode selection, the on-disk trace ring and the slow-request log
+"""
+
+import os
+import shutil
+import tempfile
+import profiling
+
+
+def test_mode_selection():
+    """Header values map to profiler modes"""
+    print("\n" + "="*60)
+    print("TEST 1: Mode Selection")
+    print("="*60)
+
+    assert profiling.choose_mode("1") == "cprofile"
+    assert profiling.choose_mode("torch") == "torch"
+    assert profiling.choose_mode("off") is None
+    assert profiling.choose_mode(None) is None  # sample rate defaults to 0
+
+    print("✓ Mode selection works")
+    return True
+
+
+def test_profile_ring():
+    """Only the newest PROFILE_MAX_FILES traces are kept"""
+    print("\n" + "="*60)
+    print("TEST 2: Bounded Profile Ring")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    old_dir, old_max = profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES
+    profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES = tmp_dir, 3
+    try:
+        written = []
+        for i in range(5):
+            with profiling.capture(f"req{i}", "cprofile") as capture:
+                sum(range(1000))
+            written.append(capture.filename)
+
+        remaining = sorted(os.listdir(tmp_dir))
+        print(f"  Kept: {remaining}")
+        assert len(remaining) == 3
+        assert remaining == sorted(written[-3:])
+        assert profiling.profile_path(written[-1]) is not None
+        assert profiling.profile_path(written[0]) is None
+        assert profiling.profile_path("../etc/passwd") is None
+    finally:
+        profiling.PROFILE_DIR, profiling.PROFILE_MAX_FILES = old_dir, old_max
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Profile ring is bounded")
+    return True
+
+
+def _profiled_work():
+    return sum(range(1000))
+
+
+def test_capture_in_worker_thread():
+    """Work run in a thread pool is captured when profiled in that thread"""
+    print("\n" + "="*60)
+    print("TEST 3: Thread Pool Capture")
+    print("="*60)
+
+    import pstats
+    from concurrent.futures import ThreadPoolExecutor
+
+    tmp_dir = tempfile.mkdtemp()
+    old_dir = profiling.PROFILE_DIR
+    profiling.PROFILE_DIR = tmp_dir
+    try:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            result, capture = pool.submit(
+                profiling.call_captured, "req-pool", "cprofile", _profiled_work
+            ).result()
+        assert result == sum(range(1000)) and capture.filename
+        stats = pstats.Stats(os.path.join(tmp_dir, capture.filename))
+        assert any(func[2] == "_profiled_work" for func in stats.stats)
+    finally:
+        profiling.PROFILE_DIR = old_dir
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Worker-thread frames in the trace")
+    return True
+
+
+def test_slow_log():
+    """Slowest requests are reported first"""
+    print("\n" + "="*60)
+    print("TEST 4: Slow Request Log")
+    print("="*60)
+
+    log = profiling.SlowRequestLog(maxlen=3)
+    for i, seconds in enumerate([0.1, 0.5, 0.2, 0.9]):
+        log.record(f"req{i}", seconds, stages={"yolo": seconds / 2})
+
+    slowest = log.slowest(2)
+    assert [e["request_id"] for e in slowest] == ["req3", "req1"]
+    assert slowest[0]["stages_ms"]["yolo"] == 450.0
+    # Oldest entry was evicted by the bounded deque
+    assert all(e["request_id"] != "req0" for e in log.slowest(10))
+
+    print("✓ Slow request log works")
+    return True
+
+
+def main():
+    tests = [test_mode_selection, test_profile_ring, test_capture_in_worker_thread, test_slow_log]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Test script for the overload router
+Checks level selection from backlog and service times, marking of degraded
+results and the full-quality re-run of degraded scans
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import blob_store
+import qos
+from database import Base, ScanResult
+
+
+def test_routing_follows_backlog():
+    """Levels step down as detection work queues up and recover when it drains"""
+    print("\n" + "="*60)
+    print("TEST 1: Routing")
+    print("="*60)
+
+    router = qos.QosRouter(slo_seconds=1.0, concurrency=1, smoothing=0.0)
+    router.service = {"full": 0.4, "reduced": 0.1, "lite": 0.01}
+    assert router.choose() == "full" and router.idle()
+
+    release = threading.Event()
+    started = []
+
+    def slow():
+        started.append(1)
+        release.wait(5)
+
+    def admit(level):
+        expected = router.admitted + 1
+        thread = threading.Thread(target=router.run, args=(level, slow))
+        thread.start()
+        deadline = time.time() + 5
+        while router.admitted < expected and time.time() < deadline:
+            time.sleep(0.001)
+        return thread
+
+    threads = [admit("full")]
+    # 0.4 queued + 0.4 own <= 1.0
+    assert router.choose() == "full"
+    threads.append(admit("full"))
+    # 0.8 + 0.4 > 1.0, but 0.8 + 0.1 fits
+    assert router.choose() == "reduced"
+    threads.append(admit("reduced"))
+    # 0.9 + 0.1 still fits, one more does not
+    threads.append(admit("reduced"))
+    print(f"  Report under load: {router.report()}")
+    assert router.choose() == "lite" and not router.idle()
+    time.sleep(0.05)
+    assert len(started) == 1   # one detection slot: the rest are queued
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert router.idle() and router.backlog == 0.0
+    assert router.choose() == "full"
+    assert router.routed == {"full": 2, "reduced": 2, "lite": 0}
+
+    print("✓ full -> reduced -> lite under load, full again once drained")
+    return True
+
+
+def test_degraded_result_marked():
+    """Degraded answers are labelled and kept out of near-duplicate reuse"""
+    print("\n" + "="*60)
+    print("TEST 2: Degraded Results")
+    print("="*60)
+
+    default_router, default_lite = qos.router, qos._run_lite
+    qos.router = qos.QosRouter(slo_seconds=0.05)
+    qos._run_lite = lambda image_path, material: {
+        "weight": 0.025, "confidence": 50.0, "material": material or "Mixed",
+        "category": material or "Mixed Waste", "object_count": 1,
+        "prediction_method": "Material Database (Lite)", "detection_path": "lite",
+    }
+    try:
+        # Initial estimates (full 500 ms, reduced 150 ms) exceed a 50 ms SLO
+        result = qos.analyze("photo.jpg", None, "Plastic")
+        print(f"  {result['prediction_method']}")
+        assert result["qos_level"] == "lite"
+        assert result["prediction_method"] == "Overload Fallback (Material Database (Lite))"
+        assert result["phash"] is None and result["material"] == "Plastic"
+        assert qos.router.routed["lite"] == 1
+    finally:
+        qos.router, qos._run_lite = default_router, default_lite
+
+    print("✓ Degraded path visible in prediction_method and qos_level")
+    return True
+
+
+def test_rerun_degraded():
+    """Unverified degraded scans are re-analyzed at full quality when idle"""
+    print("\n" + "="*60)
+    print("TEST 3: Re-run")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    default_dir, default_rerun = blob_store.UPLOAD_DIR, qos._run_rerun
+    blob_store.UPLOAD_DIR = tmp_dir
+    calls = []
+    routed_before = dict(qos.router.routed)
+
+    def fake_rerun(image_path, db, material):
+        calls.append((os.path.basename(image_path), material))
+        # Not visible to live routing while it runs
+        assert qos.router.idle() and qos.router.backlog == 0.0 and qos.router.background == 1
+        return {
+            "weight": 0.06, "confidence": 88.0, "category": "Plastic", "object_count": 3,
+            "waste_objects": ["bottle"] * 3, "prediction_method": "Material Average (DB)",
+            "phash": "00ff00ff00ff00ff", "embedding": [0.1, 0.2],
+            "embedding_status": "ready", "embedding_version": "test-1",
+        }
+
+    qos._run_rerun = fake_rerun
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        with open(os.path.join(tmp_dir, "kept.jpg"), "wb") as f:
+            f.write(b"jpeg")
+        db.add_all([
+            ScanResult(filename="kept.jpg", material="Plastic", weight=0.025, qos_level="lite"),
+            ScanResult(filename="gone.jpg", material="Mixed", weight=0.05, qos_level="reduced"),
+            ScanResult(filename="kept.jpg", material="Plastic", weight=0.025, qos_level="lite", actual_weight=0.07),
+            ScanResult(filename="kept.jpg", material="Plastic", weight=0.05),
+        ])
+        db.commit()
+
+        qos._rerun_pending = True
+        done = qos.rerun_degraded(db, limit=10)
+        scans = db.query(ScanResult).order_by(ScanResult.id).all()
+        print(f"  Re-ran {done}, levels: {[s.qos_level for s in scans]}")
+
+        assert done == 1 and calls == [("kept.jpg", "Plastic")]
+        assert scans[0].qos_level == "rerun" and scans[0].weight == 0.06 and scans[0].object_count == 3
+        assert scans[0].prediction_method == "Material Average (DB)" and scans[0].embedding_version == "test-1"
+        assert scans[1].qos_level == "rerun_missing"
+        assert scans[2].qos_level == "lite" and scans[2].weight == 0.025   # verified: left alone
+        assert scans[3].qos_level is None
+        assert qos._rerun_pending is False
+        assert qos.rerun_degraded(db) == 0
+        assert qos.router.routed == routed_before
+
+        # A live request admitted: the loop stops before re-running anything
+        db.add(ScanResult(filename="kept.jpg", material="Plastic", weight=0.025, qos_level="reduced"))
+        db.commit()
+        qos.router.admitted += 1
+        try:
+            assert qos.rerun_degraded(db) == 0 and len(calls) == 1
+        finally:
+            qos.router.admitted -= 1
+    finally:
+        db.close()
+        qos._run_rerun = default_rerun
+        blob_store.UPLOAD_DIR = default_dir
+        qos._rerun_pending = True
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Degraded scans replaced by full-quality results")
+    return True
+
+
+def test_failed_rerun_skipped():
+    """A scan whose re-run raises is marked and does not block the queue"""
+    print("\n" + "="*60)
+    print("TEST 4: Failed Re-run")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    default_dir, default_rerun = blob_store.UPLOAD_DIR, qos._run_rerun
+    blob_store.UPLOAD_DIR = tmp_dir
+    calls = []
+
+    def flaky_rerun(image_path, db, material):
+        calls.append(os.path.basename(image_path))
+        if os.path.basename(image_path) == "corrupt.jpg":
+            raise OSError("cannot identify image file")
+        return {"weight": 0.06, "confidence": 88.0, "category": "Plastic", "object_count": 3}
+
+    qos._run_rerun = flaky_rerun
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        for name in ("corrupt.jpg", "kept.jpg"):
+            with open(os.path.join(tmp_dir, name), "wb") as f:
+                f.write(b"jpeg")
+        db.add_all([
+            ScanResult(filename="corrupt.jpg", material="Plastic", weight=0.025, qos_level="lite"),
+            ScanResult(filename="kept.jpg", material="Plastic", weight=0.025, qos_level="lite"),
+        ])
+        db.commit()
+
+        assert qos.rerun_degraded(db, limit=10) == 1
+        scans = db.query(ScanResult).order_by(ScanResult.id).all()
+        print(f"  Levels: {[s.qos_level for s in scans]}")
+        assert [s.qos_level for s in scans] == ["rerun_failed", "rerun"]
+        assert scans[0].weight == 0.025
+        # Not selected again
+        assert qos.rerun_degraded(db, limit=10) == 0 and calls == ["corrupt.jpg", "kept.jpg"]
+    finally:
+        db.close()
+        qos._run_rerun = default_rerun
+        blob_store.UPLOAD_DIR = default_dir
+        qos._rerun_pending = True
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Failing scan marked, the rest re-run")
+    return True
+
+
+def main():
+    tests = [test_routing_follows_backlog, test_degraded_result_marked, test_rerun_degraded,
+             test_failed_rerun_skipped]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Test script for the offline estimator replay
+Checks scan selection, batching, per-material MAE, the leave-one-out
+learned average and the recommendation
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import blob_store
+import replay_eval
+from database import Base, ScanResult
+
+
+class FixedEstimator:
+    """Predicts a constant; records batch sizes"""
+
+    def __init__(self, name, weight, delay=0.0):
+        self.name = name
+        self.weight = weight
+        self.delay = delay
+        self.batches = []
+
+    def load(self):
+        pass
+
+    def predict_batch(self, scans, images):
+        assert len(scans) == len(images) and all(image.mode == "RGB" for image in images)
+        self.batches.append(len(scans))
+        time.sleep(self.delay)
+        return [self.weight] * len(scans)
+
+
+def _verified_db(tmp_dir):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rows = [("a.jpg", "Plastic", 0.10), ("b.jpg", "Plastic", 0.30), ("c.jpg", "Glass", 0.50),
+            ("d.jpg", "Glass", 0.70), ("e.jpg", "Glass", 0.90), ("gone.jpg", "Glass", 1.0)]
+    for filename, material, actual in rows:
+        if filename != "gone.jpg":
+            Image.new("RGB", (32, 24), (120, 60, 30)).save(os.path.join(tmp_dir, filename))
+        db.add(ScanResult(filename=filename, material=material, weight=0.2, actual_weight=actual, object_count=1))
+    db.add(ScanResult(filename="a.jpg", material="Plastic", weight=0.2))   # unverified
+    db.commit()
+    return db
+
+
+def test_replay_mae_per_material():
+    """MAE is computed per estimator and material over verified scans with an original"""
+    print("\n" + "="*60)
+    print("TEST 1: Replay MAE")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    default_dir = blob_store.UPLOAD_DIR
+    blob_store.UPLOAD_DIR = tmp_dir
+    try:
+        db = _verified_db(tmp_dir)
+        scans, skipped = replay_eval.load_verified(db)
+        db.close()
+        assert len(scans) == 5 and skipped == 1
+
+        fast, slow = FixedEstimator("fast", 0.5), FixedEstimator("slow", 0.4, delay=0.01)
+        report = replay_eval.replay(scans, [fast, slow], batch_size=2, workers=2)
+        replay_eval.print_report(report)
+
+        assert fast.batches == [2, 2, 1]
+        assert report["fast"]["scans"] == 5
+        # Plastic |0.5-0.1|,|0.5-0.3| -> 0.3; Glass 0, 0.2, 0.4 -> 0.2
+        assert report["fast"]["mae_per_material"] == {"Glass": 0.2, "Plastic": 0.3}
+        assert report["fast"]["mae"] == round((0.4 + 0.2 + 0.0 + 0.2 + 0.4) / 5, 4)
+        assert report["slow"]["mae"] == round((0.3 + 0.1 + 0.1 + 0.3 + 0.5) / 5, 4)
+        assert report["slow"]["latency_ms_per_image"]["mean"] > report["fast"]["latency_ms_per_image"]["mean"]
+
+        # MAE fast 0.24, slow 0.26: the faster one wins when both qualify
+        assert replay_eval.recommend(report, max_mae=0.3) == "fast"
+        assert replay_eval.recommend(report, max_mae=0.1) is None
+    finally:
+        blob_store.UPLOAD_DIR = default_dir
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Per-material MAE and recommendation")
+    return True
+
+
+def test_leave_one_out_average():
+    """The YOLO learned average never includes the scan being evaluated"""
+    print("\n" + "="*60)
+    print("TEST 2: Leave-One-Out Average")
+    print("="*60)
+
+    scans = [
+        {"id": 1, "material": "Plastic", "actual_weight": 0.04, "object_count": 2, "path": "1.jpg"},
+        {"id": 2, "material": "Plastic", "actual_weight": 0.09, "object_count": 3, "path": "2.jpg"},
+        {"id": 3, "material": "Glass", "actual_weight": 0.5, "object_count": 1, "path": "3.jpg"},
+    ]
+    estimator = replay_eval.YoloCountEstimator(scans)
+
+    class FakeModel:
+        DEFAULT_UNIT_WEIGHTS = {"Glass": 0.25}
+
+    estimator.model = FakeModel
+    assert abs(estimator.unit_weight(scans[0]) - 0.03) < 1e-9     # only scan 2: 0.09 / 3
+    assert abs(estimator.unit_weight(scans[1]) - 0.02) < 1e-9     # only scan 1: 0.04 / 2
+    assert estimator.unit_weight(scans[2]) == 0.25                # no other Glass scan: default
+    print("✓ Own ground truth excluded")
+    return True
+
+
+def test_knn_fallback():
+    """Nothing detected: k-NN over the other scans, like model.analyze_image"""
+    print("\n" + "="*60)
+    print("TEST 3: k-NN Fallback")
+    print("="*60)
+
+    scans = [
+        {"id": 1, "material": "Glass", "actual_weight": 0.5, "object_count": 0, "path": "1.jpg", "embedding": [1.0, 0.0]},
+        {"id": 2, "material": "Glass", "actual_weight": 0.3, "object_count": 0, "path": "2.jpg", "embedding": [0.0, 1.0]},
+        {"id": 3, "material": "Paper", "actual_weight": 0.1, "object_count": 0, "path": "3.jpg", "embedding": None},
+    ]
+    estimator = replay_eval.YoloCountEstimator(scans)
+
+    class FakeModel:
+        HIGH_CONF_THRESH = 0.25
+
+        @staticmethod
+        def detect_batch(images):
+            return [[] for _ in images]
+
+    class FakeExtractor:
+        def get_embedding(self, image):
+            return [1.0, 0.0]
+
+    estimator.model, estimator.extractor = FakeModel, FakeExtractor()
+    weights = estimator.predict_batch(scans, [None] * 3)
+    print(f"  Weights: {weights}")
+    assert weights[0] == 0.3            # own scan excluded: only scan 2 remains
+    assert weights[1] == 0.5            # only scan 1 remains
+    assert weights[2] == 0.0            # no other Paper samples: 0 like the service
+    print("✓ Leave-one-out k-NN when nothing is detected")
+    return True
+
+
+def main():
+    tests = [test_replay_mae_per_material, test_leave_one_out_average, test_knn_fallback]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
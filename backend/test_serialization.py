@@ -0,0 +1,97 @@
+"""
+Test script for response profiles and encodings
+Checks lean/full shaping, JSON/MessagePack negotiation and gzip of large bodies
+"""
+
+from datetime import datetime
+
+import msgpack
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+
+import serialization
+from database import ScanResult
+
+RESULT = {
+    "id": 7,
+    "weight": 0.125,
+    "detected_objects": ["bottle", "bottle"],
+    "embedding": [0.1] * 1024,
+    "embedding_status": "ready",
+    "phash": "00ff00ff00ff00ff",
+    "detection_path": "full",
+    "prediction_method": "Count x Default Avg",
+}
+
+
+def test_lean_profile():
+    """Lean drops internal fields, full keeps everything"""
+    print("\n" + "="*60)
+    print("TEST 1: Response Profiles")
+    print("="*60)
+
+    lean = serialization.shape(RESULT)
+    assert "embedding" not in lean and "phash" not in lean and "detection_path" not in lean
+    assert lean["weight"] == 0.125 and lean["detected_objects"] == ["bottle", "bottle"]
+    assert serialization.shape(RESULT, "full") == RESULT
+
+    lean_size = len(serialization.encode(lean)[0])
+    full_size = len(serialization.encode(RESULT)[0])
+    print(f"  Lean: {lean_size} bytes, full: {full_size} bytes")
+    assert lean_size * 20 < full_size
+
+    scan = ScanResult(id=1, timestamp=datetime(2026, 1, 2, 3, 4, 5), weight=1.5, embedding="[1, 2]", phash="ab")
+    row = serialization.scan_to_dict(scan)
+    assert row["timestamp"] == "2026-01-02T03:04:05"
+    assert "embedding" not in row and "phash" not in row
+    assert serialization.scan_to_dict(scan, "full")["embedding"] == "[1, 2]"
+
+    print("✓ Internal fields dropped")
+    return True
+
+
+def test_negotiation_and_gzip():
+    """Accept: application/msgpack gets MessagePack; large bodies are gzipped"""
+    print("\n" + "="*60)
+    print("TEST 2: Content Negotiation")
+    print("="*60)
+
+    app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+    @app.get("/result")
+    def result(request: Request, response_profile: str = "lean"):
+        serialization.check_profile(response_profile)
+        return serialization.negotiated_response(request, serialization.shape(RESULT, response_profile))
+
+    client = TestClient(app)
+
+    as_json = client.get("/result")
+    assert as_json.headers["content-type"] == "application/json"
+    assert as_json.json() == serialization.shape(RESULT)
+
+    as_msgpack = client.get("/result", headers={"Accept": "application/msgpack"})
+    assert as_msgpack.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(as_msgpack.content) == serialization.shape(RESULT)
+
+    full = client.get("/result?response_profile=full", headers={"Accept-Encoding": "gzip"})
+    print(f"  Full profile encoding: {full.headers.get('content-encoding')}, vary: {full.headers.get('vary')}")
+    assert full.headers.get("content-encoding") == "gzip"
+    assert full.json()["embedding"] == RESULT["embedding"]
+    assert "Accept" in full.headers["vary"]
+
+    assert client.get("/result?response_profile=tiny").status_code == 400
+
+    print("✓ Negotiation works")
+    return True
+
+
+def main():
+    tests = [test_lean_profile, test_negotiation_and_gzip]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Test script for thumbnail renditions
+Checks sizing, format choice, caching and the evicted-original and video cases
+"""
+
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+import thumbnails
+
+BLOB_HASH = "ab" * 32
+
+
+def _setup():
+    tmp_dir = tempfile.mkdtemp()
+    thumbnails.THUMBNAIL_DIR = os.path.join(tmp_dir, "thumbnails")
+    source = os.path.join(tmp_dir, "original.jpg")
+    Image.new("RGB", (3000, 2000), (30, 120, 200)).save(source, "JPEG", quality=90)
+    return tmp_dir, source
+
+
+def test_render_sizes():
+    """Renditions keep the aspect ratio and fit the requested size"""
+    print("\n" + "="*60)
+    print("TEST 1: Rendition Sizes")
+    print("="*60)
+
+    default_dir = thumbnails.THUMBNAIL_DIR
+    tmp_dir, source = _setup()
+    try:
+        thumbnails.render_all(source, BLOB_HASH)
+        fmt = "webp" if thumbnails.WEBP_SUPPORTED else "jpg"
+        for size, max_side in thumbnails.THUMBNAIL_SIZES.items():
+            path = thumbnails.rendition_path(BLOB_HASH, size, fmt)
+            with Image.open(path) as img:
+                print(f"  {size}: {img.size} {img.format}, {os.path.getsize(path)} bytes")
+                assert max(img.size) == max_side
+                assert abs(img.size[0] / img.size[1] - 1.5) < 0.02
+            assert os.path.getsize(path) < os.path.getsize(source)
+    finally:
+        shutil.rmtree(tmp_dir)
+        thumbnails.THUMBNAIL_DIR = default_dir
+
+    print("✓ Renditions sized correctly")
+    return True
+
+
+def test_cache_and_evicted_original():
+    """Cached renditions are served even after the original is gone"""
+    print("\n" + "="*60)
+    print("TEST 2: Cache")
+    print("="*60)
+
+    default_dir = thumbnails.THUMBNAIL_DIR
+    tmp_dir, source = _setup()
+    try:
+        path = thumbnails.get_rendition(source, BLOB_HASH, "small", "jpg")
+        mtime = os.path.getmtime(path)
+        os.remove(source)
+
+        assert thumbnails.get_rendition(source, BLOB_HASH, "small", "jpg") == path
+        assert os.path.getmtime(path) == mtime                       # not re-rendered
+        assert thumbnails.get_rendition(source, BLOB_HASH, "medium", "jpg") is None
+
+        # Video scans store the video: no rendition rather than an error
+        with open(source, "wb") as f:
+            f.write(b"\x00\x00\x00\x18ftypmp42" + bytes(64))
+        assert thumbnails.get_rendition(source, "cd" * 32, "small", "jpg") is None
+    finally:
+        shutil.rmtree(tmp_dir)
+        thumbnails.THUMBNAIL_DIR = default_dir
+
+    print("✓ Cached renditions outlive the original, videos have none")
+    return True
+
+
+def test_format_and_etag():
+    """WebP only when accepted; ETag differs per size and format"""
+    print("\n" + "="*60)
+    print("TEST 3: Format Negotiation")
+    print("="*60)
+
+    assert thumbnails.choose_format("image/jpeg,*/*") == "jpg"
+    assert thumbnails.choose_format(None) == "jpg"
+    if thumbnails.WEBP_SUPPORTED:
+        assert thumbnails.choose_format("image/avif,image/webp,*/*") == "webp"
+
+    tags = {thumbnails.etag(BLOB_HASH, s, f) for s in thumbnails.THUMBNAIL_SIZES for f in ("jpg", "webp")}
+    assert len(tags) == len(thumbnails.THUMBNAIL_SIZES) * 2
+
+    print("✓ Format and ETag correct")
+    return True
+
+
+def main():
+    tests = [test_render_sizes, test_cache_and_evicted_original, test_format_and_etag]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
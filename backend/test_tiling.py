@@ -0,0 +1,91 @@
+"""
+Test script for tiled inference helpers
+Checks tile coverage, the tiling trigger and cross-tile NMS merging
+"""
+
+import tiling
+
+
+def det(name, conf, box, tile=None):
+    return {"name": name, "conf": conf, "box": box, "tile": tile}
+
+
+def test_tile_grid():
+    """Tiles overlap and cover the whole image"""
+    print("\n" + "="*60)
+    print("TEST 1: Tile Grid")
+    print("="*60)
+
+    tiles = tiling.make_tiles(1500, 1000, tile_size=640, overlap=0.2)
+    print(f"  {len(tiles)} tiles for 1500x1000")
+    assert tiles[0] == (0, 0, 640, 640)
+    assert max(t[2] for t in tiles) == 1500
+    assert max(t[3] for t in tiles) == 1000
+    # Every pixel row/column is inside some tile
+    for x in range(0, 1500, 10):
+        assert any(t[0] <= x < t[2] for t in tiles)
+    assert tiling.make_tiles(500, 400, tile_size=640) == [(0, 0, 500, 400)]
+
+    print("✓ Tile grid covers the image")
+    return True
+
+
+def test_trigger():
+    """Tiling only runs for large images with small objects, or crowded images"""
+    print("\n" + "="*60)
+    print("TEST 2: Tiling Trigger")
+    print("="*60)
+
+    large = [det("bottle", 0.8, [0, 0, 900, 1500])] * 3
+    small = [det("bottle", 0.3, [0, 0, 60, 150])] * 3
+    assert tiling.tiling_trigger(1280, 960, small) is None
+    # 12 MP phone photo of a few bottles: no tiling
+    assert tiling.tiling_trigger(4032, 3024, large) is None
+    assert tiling.tiling_trigger(4032, 3024, small) == "small_objects"
+    assert tiling.tiling_trigger(1280, 960, large * 5) == "density"
+    assert tiling.tiling_trigger(640, 480, large * 20) is None  # already one tile
+    # Low-confidence noise of the 0.05 pass does not count
+    noise = [det("bottle", 0.1, [0, 0, 60, 150])] * 20
+    assert tiling.tiling_trigger(1280, 960, noise) == "density"
+    assert tiling.tiling_trigger(1280, 960, noise, min_conf=0.25) is None
+    assert tiling.tiling_trigger(4032, 3024, noise + small, min_conf=0.25) == "small_objects"
+
+    print("✓ Trigger works")
+    return True
+
+
+def test_cross_tile_merge():
+    """Duplicates across tiles collapse, distinct objects survive"""
+    print("\n" + "="*60)
+    print("TEST 3: Cross-Tile NMS")
+    print("="*60)
+
+    tile = (600, 0, 1240, 640)
+    local = [det("bottle", 0.6, [0, 100, 40, 200])]
+    shifted = tiling.offset_detections(local, tile, 1)
+    assert shifted[0]["box"] == [600, 100, 640, 200]
+
+    detections = [
+        det("bottle", 0.9, [560, 100, 640, 200], tile=0),   # full bottle in tile 0
+        shifted[0],                                          # cut-off half in tile 1
+        det("bottle", 0.8, [100, 100, 180, 200], tile=0),   # separate bottle
+        det("cup", 0.7, [565, 105, 640, 200], tile=0),      # different class, same place
+        det("bottle", 0.5, [102, 101, 181, 199], tile=None),  # whole-image duplicate
+    ]
+    merged = tiling.merge_detections(detections)
+    print(f"  {len(detections)} -> {len(merged)} detections")
+    assert len(merged) == 3
+    assert {(d["name"], d["conf"]) for d in merged} == {("bottle", 0.9), ("bottle", 0.8), ("cup", 0.7)}
+
+    print("✓ Cross-tile merging works")
+    return True
+
+
+def main():
+    tests = [test_tile_grid, test_trigger, test_cross_tile_merge]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
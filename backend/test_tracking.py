@@ -0,0 +1,81 @@
+"""
+Test script for the video object tracker
+Checks that objects moving across frames are counted once
+"""
+
+from tracking import IoUTracker
+
+
+def det(name, x, conf=0.8, y=100, size=50):
+    return {"name": name, "conf": conf, "box": [x, y, x + size, y + size]}
+
+
+def test_moving_objects_counted_once():
+    """Two bottles crossing the frame on a belt give two tracks"""
+    print("\n" + "="*60)
+    print("TEST 1: Conveyor Counting")
+    print("="*60)
+
+    tracker = IoUTracker()
+    for step in range(8):
+        frame = [det("bottle", 20 + step * 30), det("bottle", 300 + step * 30, y=200)]
+        tracker.update(frame)
+    # Both leave the frame
+    for _ in range(5):
+        tracker.update([])
+
+    tracks = tracker.confirmed_tracks(min_conf=0.25)
+    print(f"  {len(tracks)} tracks after 8 frames")
+    assert len(tracks) == 2
+    assert all(track.hits == 8 for track in tracks)
+
+    print("✓ Each object counted once")
+    return True
+
+
+def test_noise_and_classes():
+    """One-frame flickers and class changes do not merge or inflate counts"""
+    print("\n" + "="*60)
+    print("TEST 2: Noise and Classes")
+    print("="*60)
+
+    tracker = IoUTracker(min_hits=2)
+    tracker.update([det("bottle", 100), det("cup", 102)])
+    tracker.update([det("bottle", 110), det("cup", 112)])
+    tracker.update([det("bottle", 120), det("can", 400, conf=0.3)])  # flicker
+
+    names = sorted(track.name for track in tracker.confirmed_tracks())
+    print(f"  Confirmed: {names}")
+    assert names == ["bottle", "cup"]
+
+    print("✓ Flickers ignored, classes kept apart")
+    return True
+
+
+def test_adaptive_stride_velocity():
+    """Velocity is per source frame, so predictions survive stride changes"""
+    print("\n" + "="*60)
+    print("TEST 3: Adaptive Stride")
+    print("="*60)
+
+    # 10 px per source frame; the stride widens to 8 and drops back to 1
+    tracker = IoUTracker()
+    for frame_index in (0, 2, 4, 12, 20, 21, 22):
+        tracker.update([det("bottle", 20 + frame_index * 10)], frame_index)
+
+    tracks = tracker.confirmed_tracks()
+    assert len(tracks) == 1 and tracks[0].hits == 7
+    assert tracks[0].velocity == (10.0, 0.0)
+    assert tracks[0].predicted_box(30)[0] == 20 + 30 * 10
+    print("✓ One track across stride changes")
+    return True
+
+
+def main():
+    tests = [test_moving_objects_counted_once, test_noise_and_classes, test_adaptive_stride_velocity]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
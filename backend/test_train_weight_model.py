@@ -0,0 +1,134 @@
+"""
+Test script for the offline weight model trainer
+Checks the memory-mapped image cache (dedup, incremental builds) and a
+short mini-batch training run with a frozen backbone
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import artifact_store
+import blob_store
+import train_weight_model
+from database import Base, ScanResult
+from feature_extractor import load_for_embedding
+from weight_model import WeightEstimator
+
+
+def _scans_db(tmp_dir):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i, color in enumerate([(200, 30, 30), (30, 200, 30), (30, 30, 200)]):
+        Image.new("RGB", (320 + 40 * i, 240), color).save(os.path.join(tmp_dir, f"{i}.jpg"))
+    db.add_all([
+        ScanResult(filename="0.jpg", material="Plastic", actual_weight=0.02),
+        ScanResult(filename="1.jpg", material="Glass", actual_weight=0.3),
+        ScanResult(filename="2.jpg", material="Metal", actual_weight=0.05),
+        ScanResult(filename="0.jpg", material="Plastic", actual_weight=0.03),   # same upload again
+        ScanResult(filename="gone.jpg", material="Paper", actual_weight=0.01),
+        ScanResult(filename="1.jpg", material="Glass"),                         # unverified
+    ])
+    db.commit()
+    return db
+
+
+def test_cache_build():
+    """Each upload is decoded once into the shards; rebuilding only adds new images"""
+    print("\n" + "="*60)
+    print("TEST 1: Preprocessed Cache")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(tmp_dir, "cache")
+    default_dir = blob_store.UPLOAD_DIR
+    blob_store.UPLOAD_DIR = tmp_dir
+    try:
+        db = _scans_db(tmp_dir)
+        first = train_weight_model.build_cache(db, cache_dir, workers=2)
+        print(f"  First build: {first}")
+        assert first["added"] == 3 and first["missing"] == 1
+
+        index = train_weight_model.load_index(cache_dir)
+        shard = np.load(os.path.join(cache_dir, index["shards"][0]["file"]), mmap_mode="r")
+        assert isinstance(shard, np.memmap) and shard.dtype == np.uint8 and shard.shape[1:] == (224, 224, 3)
+        row = index["entries"]["file:1.jpg"][1]
+        assert np.array_equal(shard[row], load_for_embedding(os.path.join(tmp_dir, "1.jpg")))
+
+        second = train_weight_model.build_cache(db, cache_dir, workers=2)
+        assert second["added"] == 0 and second["cached"] == 3
+
+        items = train_weight_model.training_items(db, index)
+        db.close()
+        assert len(items) == 4                                   # both scans of 0.jpg, not the missing one
+        assert sorted(weight for *_, weight in items) == [0.02, 0.03, 0.05, 0.3]
+    finally:
+        blob_store.UPLOAD_DIR = default_dir
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Images decoded once, labels from the database")
+    return True
+
+
+def test_train_frozen_backbone():
+    """Mini-batch training updates only the head when the backbone is frozen"""
+    print("\n" + "="*60)
+    print("TEST 2: Training")
+    print("="*60)
+
+    tmp_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(tmp_dir, "cache")
+    default_dir = blob_store.UPLOAD_DIR
+    blob_store.UPLOAD_DIR = tmp_dir
+    try:
+        db = _scans_db(tmp_dir)
+        train_weight_model.build_cache(db, cache_dir, workers=1)
+        index = train_weight_model.load_index(cache_dir)
+        items = train_weight_model.training_items(db, index)
+        db.close()
+
+        init_path = os.path.join(tmp_dir, "init.pth")
+        out_path = os.path.join(tmp_dir, "trained.pth")
+        initial = WeightEstimator(pretrained=False)
+        # Keep the output ReLU active: a random init can start with zero gradients
+        torch.nn.init.constant_(initial.regressor[-2].bias, 1.0)
+        artifact_store.save_state_dict(initial.state_dict(), init_path)
+
+        report = train_weight_model.train(
+            items, index, cache_dir, epochs=2, batch_size=2, workers=1, lr=1e-2,
+            freeze_backbone=True, val_fraction=0.25, init_path=init_path, out_path=out_path,
+        )
+        last = report["epochs"][-1]
+        print(f"  Last epoch: {last}")
+        assert last["train"]["samples"] == 3 and last["val"]["samples"] == 1
+        assert last["train"]["samples_per_second"] > 0
+
+        before = artifact_store.load_state_dict(init_path)
+        after = artifact_store.load_state_dict(out_path)
+        backbone = [k for k in before if k.startswith("backbone.")]
+        head = [k for k in before if k.startswith("regressor.") or k.startswith("material_embedding.")]
+        assert all(torch.equal(before[k], after[k]) for k in backbone)
+        assert any(not torch.equal(before[k], after[k]) for k in head)
+    finally:
+        blob_store.UPLOAD_DIR = default_dir
+        shutil.rmtree(tmp_dir)
+
+    print("✓ Head trained, frozen backbone unchanged, checkpoint saved")
+    return True
+
+
+def main():
+    tests = [test_cache_build, test_train_frozen_backbone]
+    passed = sum(1 for test in tests if test())
+    print(f"\nPassed: {passed}/{len(tests)}")
+
+
+if __name__ == "__main__":
+    main()
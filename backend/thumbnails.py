@@ -0,0 +1,96 @@
+"""
+Thumbnail / preview renditions of scan images
+Renditions are rendered once (in the background at ingest, or on first
+request) and cached on disk as thumbnails/ab/<hash>_<size>.<ext>.
+Because uploads are content-addressed, a rendition never changes, so its
+ETag is derived from the blob hash and clients can cache it indefinitely.
+"""
+
+import os
+import tempfile
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+import metrics
+
+THUMBNAIL_DIR = os.environ.get("THUMBNAIL_DIR", "thumbnails")
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "80"))
+# Longest side in pixels
+THUMBNAIL_SIZES = {"small": 160, "medium": 480, "large": 1024}
+DEFAULT_SIZE = "small"
+
+WEBP_SUPPORTED = features.check("webp")
+MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+
+def choose_format(accept_header):
+    """WebP when the client accepts it (all current browsers), JPEG otherwise"""
+    if WEBP_SUPPORTED and accept_header and "image/webp" in accept_header:
+        return "webp"
+    return "jpg"
+
+
+def rendition_path(blob_hash, size, fmt):
+    return os.path.join(THUMBNAIL_DIR, blob_hash[:2], f"{blob_hash}_{size}.{fmt}")
+
+
+def etag(blob_hash, size, fmt):
+    return f'"{blob_hash[:16]}-{size}-{fmt}"'
+
+
+def render(source_path, blob_hash, size, fmt):
+    """Render one rendition to the cache (atomic write); returns its path"""
+    max_side = THUMBNAIL_SIZES[size]
+    path = rendition_path(blob_hash, size, fmt)
+
+    with Image.open(source_path) as img:
+        # JPEG: let the decoder downscale by 1/2, 1/4 or 1/8 instead of decoding full size
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        img = img.convert("RGB")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=f".{fmt}")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if fmt == "webp":
+                    img.save(out, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+                else:
+                    img.save(out, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return path
+
+
+def get_rendition(source_path, blob_hash, size, fmt):
+    """
+    Path of the cached rendition, rendering it first if needed.
+    Returns None when it is not cached and the original is gone (evicted)
+    or is not an image (video scans).
+    """
+    path = rendition_path(blob_hash, size, fmt)
+    if os.path.exists(path):
+        metrics.record_cache("thumbnail", True)
+        return path
+    metrics.record_cache("thumbnail", False)
+    if source_path is None or not os.path.exists(source_path):
+        return None
+    with metrics.stage("thumbnail_render"):
+        try:
+            return render(source_path, blob_hash, size, fmt)
+        # ultralytics patches Image.open with a HEIC fallback that raises ImportError
+        # instead when pi_heif is not installed
+        except (UnidentifiedImageError, ImportError):
+            return None
+
+
+def render_all(source_path, blob_hash):
+    """Pre-render every size in the preferred format (run at ingest)"""
+    fmt = "webp" if WEBP_SUPPORTED else "jpg"
+    for size in THUMBNAIL_SIZES:
+        if not os.path.exists(rendition_path(blob_hash, size, fmt)):
+            render(source_path, blob_hash, size, fmt)
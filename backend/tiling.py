@@ -0,0 +1,121 @@
+"""
+Tiled inference helpers for high-resolution bin photos
+Splits large images into overlapping tiles and merges per-tile detections
+with cross-tile non-maximum suppression.
+"""
+
+import os
+
+TILE_ENABLED = os.environ.get("TILE_ENABLED", "1") == "1"
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_BATCH = int(os.environ.get("TILE_BATCH", "8"))
+TILE_NMS_IOU = float(os.environ.get("TILE_NMS_IOU", "0.5"))
+# A box cut by a tile edge overlaps the full box mostly by containment, not IoU
+TILE_NMS_CONTAINMENT = float(os.environ.get("TILE_NMS_CONTAINMENT", "0.8"))
+
+# Resolution alone never triggers tiling: a 12 MP phone photo would pay ~48
+# extra tile passes. Large images are tiled only when the whole-image pass
+# shows at least TILE_MIN_SMALL boxes whose longer side is below
+# TILE_SMALL_FRACTION of the image's (objects near the limit of a 640 px pass)...
+TILE_MIN_SIDE = int(os.environ.get("TILE_MIN_SIDE", "2000"))
+TILE_SMALL_FRACTION = float(os.environ.get("TILE_SMALL_FRACTION", "0.05"))
+TILE_MIN_SMALL = int(os.environ.get("TILE_MIN_SMALL", "3"))
+# ...or when the whole-image pass already finds this many objects (dense bins)
+TILE_MIN_DETECTIONS = int(os.environ.get("TILE_MIN_DETECTIONS", "15"))
+
+
+def tiling_trigger(width, height, detections, min_conf=0.0):
+    """
+    Decide whether an image should be re-detected tile by tile, from the
+    result of the whole-image pass. Only detections with conf >= min_conf
+    count: the pass runs at a very low threshold, and its noise alone would
+    otherwise reach TILE_MIN_DETECTIONS.
+
+    Returns:
+        str or None: "small_objects", "density" or None
+    """
+    if not TILE_ENABLED:
+        return None
+    detections = [d for d in detections if d["conf"] >= min_conf]
+    longest = max(width, height)
+    if longest > TILE_MIN_SIDE:
+        limit = longest * TILE_SMALL_FRACTION
+        small = sum(1 for d in detections if max(d["box"][2] - d["box"][0], d["box"][3] - d["box"][1]) < limit)
+        if small >= TILE_MIN_SMALL:
+            return "small_objects"
+    if len(detections) >= TILE_MIN_DETECTIONS and longest > TILE_SIZE:
+        return "density"
+    return None
+
+
+def _starts(length, tile, stride):
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)  # last tile flush with the edge
+    return starts
+
+
+def make_tiles(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """
+    Overlapping tile grid covering the whole image.
+
+    Returns:
+        list of (x0, y0, x1, y1) in pixel coordinates
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in _starts(height, tile_size, stride)
+        for x0 in _starts(width, tile_size, stride)
+    ]
+
+
+def offset_detections(detections, tile, tile_index):
+    """Shift tile-local boxes into image coordinates and tag their tile"""
+    x0, y0 = tile[0], tile[1]
+    shifted = []
+    for det in detections:
+        bx0, by0, bx1, by1 = det["box"]
+        shifted.append(dict(det, box=[bx0 + x0, by0 + y0, bx1 + x0, by1 + y0], tile=tile_index))
+    return shifted
+
+
+def _overlap(a, b):
+    """(IoU, intersection over the smaller box) of two xyxy boxes"""
+    ix0, iy0 = max(a[0], b[0]), max(a[1], b[1])
+    ix1, iy1 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(ix1 - ix0, 0.0) * max(iy1 - iy0, 0.0)
+    if inter <= 0:
+        return 0.0, 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0, inter / max(min(area_a, area_b), 1e-9)
+
+
+def merge_detections(detections, iou_thresh=TILE_NMS_IOU, containment_thresh=TILE_NMS_CONTAINMENT):
+    """
+    Class-aware greedy NMS across tiles.
+    Boxes from different tiles (or the whole-image pass, tile=None) are also
+    merged when one mostly contains the other, which removes the partial
+    duplicates produced where an object straddles a tile border.
+    """
+    ordered = sorted(detections, key=lambda d: d["conf"], reverse=True)
+    kept = []
+    for det in ordered:
+        duplicate = False
+        for other in kept:
+            if other["name"] != det["name"]:
+                continue
+            iou, containment = _overlap(det["box"], other["box"])
+            if iou > iou_thresh:
+                duplicate = True
+            elif det.get("tile") != other.get("tile") and containment > containment_thresh:
+                duplicate = True
+            if duplicate:
+                break
+        if not duplicate:
+            kept.append(det)
+    return kept
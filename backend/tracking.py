@@ -0,0 +1,134 @@
+"""
+Lightweight multi-object tracker for video analysis
+Greedy IoU / centre-distance association per class, so an object seen in
+many frames is counted once.
+"""
+
+
+def iou(a, b):
+    ix0, iy0 = max(a[0], b[0]), max(a[1], b[1])
+    ix1, iy1 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(ix1 - ix0, 0.0) * max(iy1 - iy0, 0.0)
+    if inter <= 0:
+        return 0.0
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centre_distance_ratio(a, b):
+    """Centre distance divided by the diagonal of box a"""
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    diagonal = ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / max(diagonal, 1e-9)
+
+
+class Track:
+    __slots__ = ("track_id", "name", "box", "best_conf", "hits", "misses", "velocity", "frame_index")
+
+    def __init__(self, track_id, detection, frame_index):
+        self.track_id = track_id
+        self.name = detection["name"]
+        self.box = list(detection["box"])
+        self.best_conf = detection["conf"]
+        self.hits = 1
+        self.misses = 0
+        self.velocity = (0.0, 0.0)     # pixels per source frame
+        self.frame_index = frame_index  # source frame of the last sighting
+
+    def predicted_box(self, frame_index):
+        """
+        Box shifted by the observed motion up to this source frame (objects on
+        a conveyor keep moving). Velocity is per source frame, so it stays valid
+        when the sampling stride changes between updates.
+        """
+        frames = frame_index - self.frame_index
+        dx, dy = self.velocity[0] * frames, self.velocity[1] * frames
+        return [self.box[0] + dx, self.box[1] + dy, self.box[2] + dx, self.box[3] + dy]
+
+    def update(self, detection, frame_index):
+        new_box = detection["box"]
+        frames = max(frame_index - self.frame_index, 1)
+        self.velocity = (
+            ((new_box[0] + new_box[2]) - (self.box[0] + self.box[2])) / 2 / frames,
+            ((new_box[1] + new_box[3]) - (self.box[1] + self.box[3])) / 2 / frames,
+        )
+        self.box = list(new_box)
+        self.frame_index = frame_index
+        self.best_conf = max(self.best_conf, detection["conf"])
+        self.hits += 1
+        self.misses = 0
+
+
+class IoUTracker:
+    """
+    Args:
+        iou_thresh: Minimum IoU with a track's predicted box to associate
+        max_distance: Fallback association when the centre moved less than
+                      this many box diagonals (sparse sampling, fast belts)
+        max_age: Sampled frames a track may go unseen before it is closed
+        min_hits: Sightings needed before a track counts as a real object
+    """
+
+    def __init__(self, iou_thresh=0.3, max_distance=0.75, max_age=3, min_hits=2):
+        self.iou_thresh = iou_thresh
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.active = []
+        self.finished = []
+        self._next_id = 1
+        self._frame_index = -1
+
+    def update(self, detections, frame_index=None):
+        """
+        Associate one frame's detections with the active tracks.
+        frame_index is the frame's position in the source video (sampled
+        frames are not evenly spaced); by default the frames are consecutive.
+        """
+        frame_index = self._frame_index + 1 if frame_index is None else frame_index
+        self._frame_index = frame_index
+        candidates = []
+        for t_index, track in enumerate(self.active):
+            predicted = track.predicted_box(frame_index)
+            for d_index, det in enumerate(detections):
+                if det["name"] != track.name:
+                    continue
+                overlap = iou(predicted, det["box"])
+                if overlap >= self.iou_thresh:
+                    candidates.append((1.0 + overlap, t_index, d_index))
+                else:
+                    distance = _centre_distance_ratio(predicted, det["box"])
+                    if distance <= self.max_distance:
+                        candidates.append((1.0 - distance / (self.max_distance + 1e-9), t_index, d_index))
+
+        # Greedy: strongest pairs first (IoU matches always beat distance matches)
+        used_tracks, used_dets = set(), set()
+        for _, t_index, d_index in sorted(candidates, reverse=True):
+            if t_index in used_tracks or d_index in used_dets:
+                continue
+            self.active[t_index].update(detections[d_index], frame_index)
+            used_tracks.add(t_index)
+            used_dets.add(d_index)
+
+        still_active = []
+        for t_index, track in enumerate(self.active):
+            if t_index not in used_tracks:
+                track.misses += 1
+            if track.misses > self.max_age:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+        for d_index, det in enumerate(detections):
+            if d_index not in used_dets:
+                self.active.append(Track(self._next_id, det, frame_index))
+                self._next_id += 1
+
+    def confirmed_tracks(self, min_conf=0.0):
+        """All tracks (finished and active) seen often and confidently enough"""
+        return [
+            track for track in self.finished + self.active
+            if track.hits >= self.min_hits and track.best_conf >= min_conf
+        ]
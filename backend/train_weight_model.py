@@ -0,0 +1,321 @@
+"""
+Offline batch training of the neural weight estimator (weight_model.py)
+Verified scans are decoded once into a cache of 224x224 uint8 images kept
+in fixed-size memory-mapped NumPy shards (train_cache/shard_*.npy), keyed
+by the upload's content hash. Later runs only decode new scans; labels
+come from the database on every run, so corrections made since the cache
+was built are used.
+
+Training reads the shards through a multi-worker DataLoader, normalizes
+whole mini-batches at once and can freeze the MobileNet backbone so only
+the material embedding and regression head are trained.
+
+Usage:
+    python train_weight_model.py --epochs 5 --batch-size 32 --workers 4
+    python train_weight_model.py --freeze-backbone --lr 1e-3
+    python train_weight_model.py --cache-only            # just update the cache
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, Subset
+
+import blob_store
+from feature_extractor import IMAGENET_MEAN, IMAGENET_STD, INPUT_CROP, INPUT_RESIZE, load_for_embedding
+
+TRAIN_CACHE_DIR = os.environ.get("TRAIN_CACHE_DIR", "train_cache")
+SHARD_ROWS = 1024   # images per shard file (~150 MB)
+# Stored with the cache; a different value means the cached pixels are stale
+PREPROCESS_VERSION = f"resize{INPUT_RESIZE}-crop{INPUT_CROP}-uint8"
+
+
+# ============================================================================
+# PREPROCESSED CACHE
+# ============================================================================
+
+def cache_key(blob_hash, filename):
+    """Cached images are shared by scans of identical uploads"""
+    return blob_hash if blob_hash else f"file:{os.path.basename(filename or '')}"
+
+
+def load_index(cache_dir=None):
+    path = os.path.join(cache_dir or TRAIN_CACHE_DIR, "index.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("preprocess") == PREPROCESS_VERSION:
+            return index
+        print(f"[Train] Cache was built with {index.get('preprocess')}, rebuilding for {PREPROCESS_VERSION}")
+    return {"preprocess": PREPROCESS_VERSION, "shard_rows": SHARD_ROWS, "shards": [], "entries": {}}
+
+
+def _save_index(index, cache_dir):
+    path = os.path.join(cache_dir, "index.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".tmp", path)
+
+
+def _open_shard(cache_dir, shard, mode):
+    return np.load(os.path.join(cache_dir, shard["file"]), mmap_mode=mode)
+
+
+def _load(path):
+    """Worker: decode + resize one image; None when it is gone or unreadable"""
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return load_for_embedding(path)
+    except Exception as e:
+        print(f"[Train] Cannot decode {path}: {e}")
+        return None
+
+
+def build_cache(db, cache_dir=None, workers=None, batch_size=64):
+    """
+    Decode verified scans that are not cached yet into the shards.
+
+    Returns:
+        dict: Counts of cached (before), added and missing images
+    """
+    from database import ScanResult
+
+    cache_dir = cache_dir or TRAIN_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    index = load_index(cache_dir)
+    entries, shards = index["entries"], index["shards"]
+    shard_rows = index["shard_rows"]
+
+    rows = db.query(ScanResult.blob_hash, ScanResult.filename).filter(ScanResult.actual_weight.isnot(None)).all()
+    todo = {}
+    for blob_hash, filename in rows:
+        key = cache_key(blob_hash, filename)
+        if key not in entries and key not in todo:
+            todo[key] = blob_store.original_path(blob_hash, filename)
+
+    cached = len(entries)
+    added = missing = 0
+    start = time.perf_counter()
+    keys = list(todo)
+    data = None   # memmap of the shard being filled
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch_start in range(0, len(keys), batch_size):
+            batch = keys[batch_start:batch_start + batch_size]
+            for key, array in zip(batch, pool.map(_load, [todo[key] for key in batch])):
+                if array is None:
+                    missing += 1
+                    continue
+                if not shards or shards[-1]["rows"] >= shard_rows:
+                    if data is not None:
+                        data.flush()
+                    shards.append({"file": f"shard_{len(shards):05d}.npy", "rows": 0})
+                    data = np.lib.format.open_memmap(
+                        os.path.join(cache_dir, shards[-1]["file"]), mode="w+", dtype=np.uint8,
+                        shape=(shard_rows, INPUT_CROP, INPUT_CROP, 3),
+                    )
+                elif data is None:
+                    data = _open_shard(cache_dir, shards[-1], "r+")
+                shard = shards[-1]
+                data[shard["rows"]] = array
+                entries[key] = [len(shards) - 1, shard["rows"]]
+                shard["rows"] += 1
+                added += 1
+            # Progress survives an interruption: pixels first, then the index that points at them
+            if data is not None:
+                data.flush()
+            _save_index(index, cache_dir)
+            print(f"[Train] Cached {added + missing}/{len(keys)} new images")
+
+    return {
+        "cached": cached,
+        "added": added,
+        "missing": missing,
+        "seconds": round(time.perf_counter() - start, 1),
+    }
+
+
+def training_items(db, index):
+    """(shard, row, material_id, actual_weight) for every verified scan with a cached image"""
+    from database import ScanResult
+    from weight_model import MATERIAL_TO_ID
+
+    items = []
+    query = db.query(ScanResult.blob_hash, ScanResult.filename, ScanResult.material, ScanResult.actual_weight)
+    for blob_hash, filename, material, actual_weight in query.filter(ScanResult.actual_weight.isnot(None)):
+        location = index["entries"].get(cache_key(blob_hash, filename))
+        if location is not None:
+            items.append((location[0], location[1], MATERIAL_TO_ID.get(material, 0), float(actual_weight)))
+    return items
+
+
+# ============================================================================
+# TRAINING
+# ============================================================================
+
+class CachedScans(Dataset):
+    """Rows of the memory-mapped shards; each DataLoader worker maps the files itself"""
+
+    def __init__(self, cache_dir, index, items):
+        self.cache_dir = cache_dir
+        self.shards = index["shards"]
+        self.items = items
+        self._open = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        shard, row, material_id, weight = self.items[i]
+        if shard not in self._open:
+            self._open[shard] = _open_shard(self.cache_dir, self.shards[shard], "r")
+        image = torch.from_numpy(np.array(self._open[shard][row]))
+        return image, material_id, torch.tensor([weight], dtype=torch.float32)
+
+
+def to_input(images):
+    """uint8 NHWC batch -> normalized float NCHW (same as WeightPredictor.transform)"""
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    return (images.permute(0, 3, 1, 2).float().div_(255.0) - mean) / std
+
+
+def _build_model(init_path):
+    import artifact_store
+    from weight_model import WeightEstimator
+
+    if init_path and os.path.exists(init_path):
+        print(f"[Train] Starting from {init_path}")
+        return artifact_store.load_into(lambda: WeightEstimator(pretrained=False), init_path)
+    print("[Train] Starting from the ImageNet backbone")
+    return WeightEstimator()
+
+
+def _run_epoch(model, loader, optimizer=None, freeze_backbone=False):
+    training = optimizer is not None
+    model.train(training)
+    if freeze_backbone:
+        model.backbone.eval()   # keep BatchNorm statistics of the frozen backbone
+
+    criterion = torch.nn.MSELoss(reduction="sum")
+    loss_sum = abs_sum = 0.0
+    samples = 0
+    wait = 0.0
+    start = last = time.perf_counter()
+    for images, material_ids, weights in loader:
+        wait += time.perf_counter() - last
+        with torch.set_grad_enabled(training):
+            predicted = model(to_input(images), material_ids)
+            loss = criterion(predicted, weights)
+        if training:
+            optimizer.zero_grad()
+            (loss / len(weights)).backward()
+            optimizer.step()
+        loss_sum += loss.item()
+        abs_sum += (predicted.detach() - weights).abs().sum().item()
+        samples += len(weights)
+        last = time.perf_counter()
+
+    seconds = time.perf_counter() - start
+    return {
+        "samples": samples,
+        "loss": round(loss_sum / samples, 6) if samples else None,
+        "mae": round(abs_sum / samples, 4) if samples else None,
+        "samples_per_second": round(samples / seconds, 1) if seconds else 0.0,
+        "data_wait_fraction": round(wait / seconds, 3) if seconds else 0.0,
+    }
+
+
+def train(items, index, cache_dir=None, epochs=5, batch_size=32, workers=2, lr=1e-4,
+          freeze_backbone=False, val_fraction=0.1, init_path=None, out_path=None, seed=0):
+    """
+    Mini-batch training on the cached images.
+
+    Returns:
+        dict: Per-epoch train/validation loss, MAE and samples per second
+    """
+    cache_dir = cache_dir or TRAIN_CACHE_DIR
+    torch.manual_seed(seed)
+    order = list(range(len(items)))
+    random.Random(seed).shuffle(order)
+    n_val = int(len(items) * val_fraction) if len(items) > 1 else 0
+    dataset = CachedScans(cache_dir, index, items)
+    loaders = {
+        "train": DataLoader(Subset(dataset, order[n_val:]), batch_size=batch_size, shuffle=True,
+                            num_workers=workers, persistent_workers=workers > 0),
+        "val": DataLoader(Subset(dataset, order[:n_val]), batch_size=batch_size,
+                          num_workers=workers) if n_val else None,
+    }
+
+    model = _build_model(init_path)
+    if freeze_backbone:
+        for parameter in model.backbone.parameters():
+            parameter.requires_grad = False
+    trainable = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.Adam(trainable, lr=lr)
+    print(f"[Train] {len(items) - n_val} train / {n_val} validation samples, "
+          f"{sum(p.numel() for p in trainable):,} trainable parameters")
+
+    history = []
+    for epoch in range(1, epochs + 1):
+        entry = {"epoch": epoch, "train": _run_epoch(model, loaders["train"], optimizer, freeze_backbone)}
+        if loaders["val"] is not None:
+            entry["val"] = _run_epoch(model, loaders["val"])
+        history.append(entry)
+        val = entry.get("val") or {}
+        print(f"[Train] Epoch {epoch}/{epochs}: loss {entry['train']['loss']}, "
+              f"train MAE {entry['train']['mae']} kg, val MAE {val.get('mae', '-')} kg, "
+              f"{entry['train']['samples_per_second']} samples/s "
+              f"({entry['train']['data_wait_fraction'] * 100:.0f}% waiting for data)")
+
+    if out_path:
+        import artifact_store
+        model.eval()
+        artifact_store.save_state_dict(model.state_dict(), out_path)
+        print(f"[Train] Saved {out_path}")
+    return {"epochs": history, "freeze_backbone": freeze_backbone, "batch_size": batch_size, "workers": workers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the neural weight estimator from all verified scans")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="DataLoader worker processes")
+    parser.add_argument("--decode-workers", type=int, default=None, help="Processes decoding new images into the cache")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--freeze-backbone", action="store_true", help="Train only the material embedding and head")
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--init", default="weight_model.pth", help="Checkpoint to start from (if it exists)")
+    parser.add_argument("--out", default="weight_model.pth", help="Where to save the trained checkpoint")
+    parser.add_argument("--cache-dir", default=TRAIN_CACHE_DIR)
+    parser.add_argument("--cache-only", action="store_true", help="Update the image cache and exit")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        print(json.dumps(build_cache(db, args.cache_dir, args.decode_workers)))
+        index = load_index(args.cache_dir)
+        items = training_items(db, index)
+    finally:
+        db.close()
+    if args.cache_only:
+        return
+    if not items:
+        raise SystemExit("No verified scan with a cached image to train on")
+
+    report = train(items, index, args.cache_dir, args.epochs, args.batch_size, args.workers, args.lr,
+                   args.freeze_backbone, args.val_fraction, args.init, args.out)
+    print(json.dumps(report["epochs"][-1], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,19 @@ import os
 import json
 from datetime import datetime
 
+import artifact_store
+import model_manager
+
+# Material type -> embedding index (unknown materials share index 0)
+MATERIAL_TO_ID = {
+    'Mixed Waste': 0,
+    'Plastic': 1,
+    'Paper': 2,
+    'Glass': 3,
+    'Metal': 4,
+    'Organic': 5
+}
+
 # ============================================================================
 # MODEL ARCHITECTURE
 # ============================================================================
@@ -21,12 +34,13 @@ class WeightEstimator(nn.Module):
     Uses MobileNetV3 as backbone with material embeddings.
     """
     
-    def __init__(self, num_materials=6, feature_dim=576, embedding_dim=32):
+    def __init__(self, num_materials=6, feature_dim=576, embedding_dim=32, pretrained=True):
         super().__init__()
         
         # Feature Extractor (MobileNetV3 Small - lightweight)
+        # pretrained=False when a checkpoint will overwrite the weights anyway
         self.backbone = models.mobilenet_v3_small(
-            weights=models.MobileNet_V3_Small_Weights.DEFAULT
+            weights=models.MobileNet_V3_Small_Weights.DEFAULT if pretrained else None
         )
         
         # Remove classifier to get features
@@ -85,15 +99,13 @@ class WeightPredictor:
         
         print(f"[WeightPredictor] Using device: {self.device}")
         
-        # Initialize model
-        self.model = WeightEstimator().to(self.device)
-        
-        # Load pretrained weights if exist
+        # Load pretrained weights if exist (memory-mapped, verified by hash)
+        self.model = None
         if os.path.exists(model_path):
             try:
-                self.model.load_state_dict(
-                    torch.load(model_path, map_location=self.device)
-                )
+                self.model = artifact_store.load_into(
+                    lambda: WeightEstimator(pretrained=False), model_path
+                ).to(self.device)
                 print(f"[WeightPredictor] ✓ Loaded model from {model_path}")
             except Exception as e:
                 print(f"[WeightPredictor] ⚠ Failed to load model: {e}")
@@ -102,6 +114,8 @@ class WeightPredictor:
             print(f"[WeightPredictor] ⚠ No pretrained model found.")
             print(f"[WeightPredictor]   Model will be saved to: {model_path}")
         
+        if self.model is None:
+            self.model = WeightEstimator().to(self.device)
         self.model.eval()
         self.model_path = model_path
         
@@ -117,14 +131,7 @@ class WeightPredictor:
         ])
         
         # Material to ID mapping
-        self.material_to_id = {
-            'Mixed Waste': 0,
-            'Plastic': 1,
-            'Paper': 2,
-            'Glass': 3,
-            'Metal': 4,
-            'Organic': 5
-        }
+        self.material_to_id = dict(MATERIAL_TO_ID)
         
         # Training statistics
         self.training_history = []
@@ -161,6 +168,23 @@ class WeightPredictor:
             # Return a reasonable default
             return 0.1
     
+    def predict_batch(self, images, materials):
+        """
+        Predict weights for several images in one forward pass.
+        
+        Args:
+            images: List of PIL images (RGB)
+            materials: Material type per image
+        
+        Returns:
+            list: Predicted weights in kg
+        """
+        image_tensor = torch.stack([self.transform(image) for image in images]).to(self.device)
+        material_tensor = torch.tensor([self.material_to_id.get(m, 0) for m in materials]).to(self.device)
+        with torch.no_grad():
+            weights = self.model(image_tensor, material_tensor)
+        return [float(w) for w in weights.view(-1)]
+    
     def update_with_correction(self, image_path, material, actual_weight, 
                               lr=0.0001, steps=10, save=True):
         """
@@ -238,7 +262,7 @@ class WeightPredictor:
             path = self.model_path
         
         try:
-            torch.save(self.model.state_dict(), path)
+            artifact_store.save_state_dict(self.model.state_dict(), path)
             print(f"[WeightPredictor] ✓ Model saved to {path}")
         except Exception as e:
             print(f"[WeightPredictor] ✗ Failed to save model: {e}")
@@ -289,15 +313,12 @@ class WeightPredictor:
 # GLOBAL INSTANCE
 # ============================================================================
 
-# Global predictor instance
-_predictor = None
+# Shared predictor, loaded on first use and evictable when idle (see model_manager.py)
+model_manager.manager.register("neural", lambda: WeightPredictor(model_path="weight_model.pth"))
 
 def get_predictor():
-    """Get or create global predictor instance"""
-    global _predictor
-    if _predictor is None:
-        _predictor = WeightPredictor(model_path="weight_model.pth")
-    return _predictor
+    """Get the shared predictor instance (loads it if needed)"""
+    return model_manager.manager.get("neural")
 
 
 # ============================================================================
@@ -317,13 +338,12 @@ def analyze_image(image_path, db=None, user_material=None):
     Returns:
         dict: Analysis results
     """
-    predictor = get_predictor()
-    
     material = user_material or "Mixed Waste"
     
     # Predict weight using neural network
     try:
-        predicted_weight = predictor.predict(image_path, material)
+        with model_manager.manager.acquire("neural") as predictor:
+            predicted_weight = predictor.predict(image_path, material)
         confidence = 85.0
         prediction_method = "Neural Network"
         
@@ -336,9 +356,9 @@ def analyze_image(image_path, db=None, user_material=None):
     # Optional: Extract embedding for analytics
     embedding = None
     try:
-        from feature_extractor import FeatureExtractor
-        extractor = FeatureExtractor()
-        embedding = extractor.get_embedding(image_path)
+        import feature_extractor  # registers the shared "embedding" model
+        with model_manager.manager.acquire("embedding") as extractor:
+            embedding = extractor.get_embedding(image_path)
     except:
         pass
     
@@ -367,21 +387,21 @@ def update_model_with_correction(image_path, material, actual_weight):
     Returns:
         loss: Training loss (or None if failed)
     """
-    predictor = get_predictor()
-    return predictor.update_with_correction(
-        image_path=image_path,
-        material=material,
-        actual_weight=actual_weight,
-        lr=0.0001,
-        steps=10,
-        save=True
-    )
+    with model_manager.manager.acquire("neural") as predictor:
+        return predictor.update_with_correction(
+            image_path=image_path,
+            material=material,
+            actual_weight=actual_weight,
+            lr=0.0001,
+            steps=10,
+            save=True
+        )
 
 
 def get_model_stats():
     """Get model training statistics"""
-    predictor = get_predictor()
-    return predictor.get_stats()
+    with model_manager.manager.acquire("neural") as predictor:
+        return predictor.get_stats()
 
 
 # ============================================================================
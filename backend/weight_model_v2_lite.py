@@ -10,6 +10,8 @@ from datetime import datetime
 from PIL import Image
 import numpy as np
 
+import model_manager
+
 # ============================================================================
 # MATERIAL WEIGHT DATABASE
 # ============================================================================
@@ -108,6 +110,29 @@ class MaterialWeightDB:
     
     def update(self, material, object_type, new_weight):
         """Update database with new weight using running average"""
+        self._apply(material, object_type, new_weight)
+        
+        # Save to disk
+        self.save()
+    
+    def update_many(self, updates):
+        """
+        Apply several corrections with a single save.
+        
+        Args:
+            updates: Iterable of (material, object_type, new_weight)
+        """
+        applied = 0
+        for material, object_type, new_weight in updates:
+            self._apply(material, object_type, new_weight, verbose=False)
+            applied += 1
+        if applied:
+            self.save()
+            print(f"[MaterialWeightDB] Applied {applied} corrections")
+        return applied
+    
+    def _apply(self, material, object_type, new_weight, verbose=True):
+        """Running-average update in memory (no save)"""
         if material: material = material.strip().title()
         if material: material = material.strip().title(); material = {"Plastics": "Plastic", "Papers": "Paper", "Metals": "Metal", "Glass Bottle": "Glass"}.get(material, material)
         if material not in self.weights:
@@ -127,8 +152,8 @@ class MaterialWeightDB:
                     'min': new_weight,
                     'max': new_weight
                 }
-                self.save()
-                print(f"[MaterialWeightDB] Created new entry: {material}/{object_type} = {new_weight:.3f} kg")
+                if verbose:
+                    print(f"[MaterialWeightDB] Created new entry: {material}/{object_type} = {new_weight:.3f} kg")
                 return
         
         entry = material_data[object_type]
@@ -145,10 +170,8 @@ class MaterialWeightDB:
         entry['min'] = min(entry.get('min', new_weight), new_weight)
         entry['max'] = max(entry.get('max', new_weight), new_weight)
         
-        # Save to disk
-        self.save()
-        
-        print(f"[MaterialWeightDB] Updated {material}/{object_type}: {old_avg:.3f} → {new_avg:.3f} kg (n={entry['count']})")
+        if verbose:
+            print(f"[MaterialWeightDB] Updated {material}/{object_type}: {old_avg:.3f} → {new_avg:.3f} kg (n={entry['count']})")
     
     def save(self):
         """Save database to disk"""
@@ -288,14 +311,12 @@ class WeightEstimatorV2Lite:
 # GLOBAL INSTANCE
 # ============================================================================
 
-_estimator_v2_lite = None
+# Shared estimator, loaded on first use (see model_manager.py)
+model_manager.manager.register("lite", WeightEstimatorV2Lite)
 
 def get_estimator_v2_lite():
-    """Get or create global estimator instance"""
-    global _estimator_v2_lite
-    if _estimator_v2_lite is None:
-        _estimator_v2_lite = WeightEstimatorV2Lite()
-    return _estimator_v2_lite
+    """Get the shared estimator instance (loads it if needed)"""
+    return model_manager.manager.get("lite")
 
 
 # ============================================================================
@@ -313,8 +334,8 @@ def analyze_image_v2(image_path, material):
     Returns:
         dict: Analysis results
     """
-    estimator = get_estimator_v2_lite()
-    result = estimator.predict(image_path, material)
+    with model_manager.manager.acquire("lite") as estimator:
+        result = estimator.predict(image_path, material)
     
     return {
         'weight': result['weight'],
@@ -338,14 +359,14 @@ def update_model_v2(image_path, material, actual_weight):
         material: Material type
         actual_weight: Ground truth weight
     """
-    estimator = get_estimator_v2_lite()
-    return estimator.update_from_correction(image_path, material, actual_weight)
+    with model_manager.manager.acquire("lite") as estimator:
+        return estimator.update_from_correction(image_path, material, actual_weight)
 
 
 def get_model_stats_v2():
     """Get model statistics"""
-    estimator = get_estimator_v2_lite()
-    return estimator.get_stats()
+    with model_manager.manager.acquire("lite") as estimator:
+        return estimator.get_stats()
 
 
 # ============================================================================